@@ -0,0 +1,201 @@
+"""Account analysis on the Celery workers, followed stage by stage.
+
+The whole pipeline is applied as a single canvas, so the workers hand
+every result straight to the next stages. Each stage gets its task id
+before the canvas is sent, which lets the backend wait for all of them at
+once and learn about every stage as soon as it finishes. With the Redis
+result backend the results are pushed over pub/sub, nothing is polled.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+from celery import Celery, chain, group, uuid
+from celery.canvas import Signature
+from celery.result import ResultSet
+
+import celery_conf
+from settings import ANALYSIS_CONCURRENCY, ANALYSIS_TIMEOUT
+
+celery_app = Celery()
+celery_app.config_from_object(celery_conf)
+
+STAGE_QUEUES = {
+    'get_tweets': 'tweets',
+    'clean': 'cleaning',
+    'lemmatize': 'cleaning',
+    'stopwords': 'cleaning',
+    'emoji': 'cleaning',
+    'embedding': 'embedding',
+    'topics': 'processing',
+    'words': 'processing',
+    'sentiment': 'processing',
+    'graph': 'processing',
+    'clustering': 'processing'
+}
+
+STAGE_MESSAGES = {
+    'get_tweets': 'Tweets collected',
+    'clean': 'Tweets cleaned',
+    'lemmatize': 'Tweets lemmatized',
+    'stopwords': 'Stop words removed',
+    'emoji': 'Emojis translated',
+    'embedding': 'Account embedding calculated',
+    'topics': 'Topics assigned',
+    'words': 'Words counted',
+    'sentiment': 'Sentiment assigned',
+    'graph': 'Graph position calculated',
+    'clustering': 'Clusters assigned'
+}
+
+# what `clean` reads from the downloaded tweets
+CLEANED_COLUMNS = ['id', 'tweet', 'language']
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+class AnalysisCancelled(Exception):
+    pass
+
+
+def stage(name: str, *args) -> Signature:
+    return celery_app.signature(
+        name, args=args, options={'queue': STAGE_QUEUES[name]})
+
+
+def analysis_canvas(tweets: pd.DataFrame) -> Signature:
+    """clean -> (lemmatize -> stopwords | emoji | embedding) -> the rest.
+
+    Topics and words are computed from the lemmas, sentiment from the
+    tweets with translated emojis, graph position and clusters from the
+    embedding. `clean` stops the chain when no tweets are left.
+    """
+    return chain(
+        stage('clean', tweets[CLEANED_COLUMNS]),
+        group(
+            chain(
+                stage('lemmatize'),
+                stage('stopwords'),
+                group(stage('topics'), stage('words'))
+            ),
+            chain(stage('emoji'), stage('sentiment')),
+            chain(
+                stage('embedding'),
+                group(stage('graph'), stage('clustering'))
+            )
+        )
+    )
+
+
+def assign_task_ids(canvas: Signature) -> Dict[str, str]:
+    """Give every task of `canvas` its id, returns stage names by task id."""
+    if canvas.subtask_type in ('chain', 'group'):
+        stages = {}
+
+        for task in canvas.tasks:
+            stages.update(assign_task_ids(task))
+
+        return stages
+
+    task_id = uuid()
+    canvas.set(task_id=task_id)
+
+    return {task_id: canvas.task}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    # created on first use, so that no thread is started before the fork
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=ANALYSIS_CONCURRENCY,
+            thread_name_prefix='analysis'
+        )
+
+    return _executor
+
+
+class CanvasRun:
+    """Results of the stages of a canvas, in the order they finish.
+
+    Iterating yields `(stage, result)` pairs and raises the exception of
+    the first failed stage. `cancel` stops waiting and revokes the stages
+    that have not finished, call it when the results are no longer needed.
+    """
+
+    def __init__(self, canvas: Signature, timeout: float = ANALYSIS_TIMEOUT):
+        self._stages = assign_task_ids(canvas)
+        self._pending = set(self._stages)
+        self._timeout = timeout
+        self._cancelled = threading.Event()
+        self._events: asyncio.Queue = asyncio.Queue()
+
+        canvas.apply_async()
+
+        loop = asyncio.get_event_loop()
+        loop.run_in_executor(_get_executor(), self._listen, loop)
+
+    def _listen(self, loop: asyncio.AbstractEventLoop):
+        def on_result(task_id: str, result: Any):
+            loop.call_soon_threadsafe(
+                self._events.put_nowait, (task_id, result))
+
+        def on_interval():
+            if self._cancelled.is_set():
+                raise AnalysisCancelled()
+
+        try:
+            # result backends are per thread, so is this subscription
+            results = ResultSet(
+                [celery_app.AsyncResult(task_id) for task_id in self._stages],
+                app=celery_app)
+            results.join_native(
+                timeout=self._timeout, callback=on_result,
+                on_interval=on_interval)
+        except Exception as e:
+            loop.call_soon_threadsafe(self._events.put_nowait, (None, e))
+
+    def __len__(self) -> int:
+        return len(self._stages)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Tuple[str, Any]:
+        if not self._pending:
+            raise StopAsyncIteration
+
+        task_id, result = await self._events.get()
+
+        if task_id is None:
+            self.cancel()
+            raise result
+
+        self._pending.discard(task_id)
+
+        return self._stages[task_id], result
+
+    def cancel(self):
+        self._cancelled.set()
+
+        if self._pending:
+            celery_app.control.revoke(list(self._pending))
+            self._pending.clear()
+
+
+async def download_tweets(username: str) -> pd.DataFrame:
+    run = CanvasRun(stage('get_tweets', username))
+
+    try:
+        async for _, tweets in run:
+            return tweets
+    finally:
+        run.cancel()
+
+
+def analyse_tweets(tweets: pd.DataFrame) -> CanvasRun:
+    return CanvasRun(analysis_canvas(tweets))
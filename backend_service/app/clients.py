@@ -0,0 +1,190 @@
+"""Accounts analysed at runtime, shared by all workers through SQLite."""
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from database import ReadOnlyDatabase
+from dataset import prepare_tweets_table
+from models import User
+from queries import SAMPLE_KEY_COLUMN
+from words import WordCountsStore
+
+CLIENTS_TWEETS_TABLE = 'clients_tweets'
+
+CREATE_CLIENT_USERS = """
+CREATE TABLE IF NOT EXISTS client_users (
+    username TEXT PRIMARY KEY,
+    user TEXT NOT NULL,
+    topics TEXT NOT NULL,
+    sentiment TEXT NOT NULL,
+    words TEXT NOT NULL,
+    added_at REAL NOT NULL
+)
+"""
+
+
+class ClientAccount(NamedTuple):
+    user: User
+    topics: List[Dict[str, Any]]
+    sentiment: List[Tuple[str, float]]
+    words: List[Dict[str, Any]]
+
+
+def to_json(value: Any) -> str:
+    # analysis results may hold NumPy scalars
+    return json.dumps(value, default=lambda v: v.item())
+
+
+class ClientStore:
+    """Client accounts and their tweets, in a database of their own.
+
+    Accounts are rows of `client_users`, keyed by the lower-cased username,
+    and are served from an in-process cache. `sync` reads the accounts added
+    since its last call by any process, including this one. Unless the
+    database changed meanwhile it only runs `PRAGMA data_version`, which in
+    WAL mode never waits for a writer. The tweets are in `clients_tweets`,
+    indexed like the tweets table of the data sets.
+
+    All methods block on the database and are meant to run in an executor,
+    `sync` one call at a time. `add` and `add_tweets` write through
+    connections of their own.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._engine = create_engine(f"sqlite:///{path}")
+
+        with closing(sqlite3.connect(path)) as connection:
+            # readers do not wait for writers, nor writers for readers
+            connection.execute('PRAGMA journal_mode=WAL')
+
+        with self._engine.begin() as connection:
+            connection.execute(text(CREATE_CLIENT_USERS))
+
+        if self._engine.has_table(CLIENTS_TWEETS_TABLE):
+            self._prepare_tweets_table()
+
+        self.tweets_db = ReadOnlyDatabase(path)
+        self.sampled = False
+        self.searchable = False
+        self.words = WordCountsStore()
+
+        self._accounts: Dict[str, ClientAccount] = {}
+        self._last_rowid = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid: Optional[int] = None
+        self._data_version: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._accounts)
+
+    def __iter__(self) -> Iterator[ClientAccount]:
+        return iter(list(self._accounts.values()))
+
+    def get(self, username: str) -> Optional[ClientAccount]:
+        return self._accounts.get(username.lower())
+
+    def _connect(self) -> sqlite3.Connection:
+        # a connection opened before the server forked is not shared
+        if self._connection is None or self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(
+                self._path, check_same_thread=False)
+            self._connection_pid = os.getpid()
+            self._data_version = None
+
+        return self._connection
+
+    def sync(self) -> List[ClientAccount]:
+        """Read changes made by any connection, returns the new accounts."""
+        connection = self._connect()
+        data_version = connection.execute('PRAGMA data_version').fetchone()[0]
+
+        if data_version == self._data_version:
+            return []
+
+        self._data_version = data_version
+
+        return self._read_changes(connection)
+
+    def _prepare_tweets_table(self):
+        prepare_tweets_table(
+            self._engine, CLIENTS_TWEETS_TABLE, f'{self._path}.lock')
+
+    def _check_tweets_table(self, connection: sqlite3.Connection):
+        # the tweets table may have been prepared by another process
+        sample_key_trigger = f'{CLIENTS_TWEETS_TABLE}_{SAMPLE_KEY_COLUMN}'
+        fts_table = f'{CLIENTS_TWEETS_TABLE}_fts'
+        names = {
+            row[0] for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE name IN (?, ?)",
+                (sample_key_trigger, fts_table))
+        }
+
+        self.sampled = sample_key_trigger in names
+        self.searchable = fts_table in names
+
+    def _read_changes(
+            self,
+            connection: sqlite3.Connection
+    ) -> List[ClientAccount]:
+        self._check_tweets_table(connection)
+
+        rows = connection.execute(
+            "SELECT rowid, user, topics, sentiment, words FROM client_users "
+            "WHERE rowid > ? ORDER BY rowid", (self._last_rowid,)).fetchall()
+        added = []
+
+        for rowid, user, topics, sentiment, words in rows:
+            self._last_rowid = rowid
+            account = ClientAccount(
+                user=User.parse_raw(user),
+                topics=json.loads(topics),
+                sentiment=[tuple(entry) for entry in json.loads(sentiment)],
+                words=json.loads(words)
+            )
+            username = account.user.username.lower()
+
+            if username not in self._accounts:
+                self._accounts[username] = account
+                self.words.add(username, account.words)
+                added.append(account)
+
+        return added
+
+    def add(self, account: ClientAccount):
+        """Store `account` unless it exists, `sync` then returns it."""
+        with closing(sqlite3.connect(self._path)) as connection, connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO client_users "
+                "(username, user, topics, sentiment, words, added_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (
+                    account.user.username.lower(),
+                    account.user.json(),
+                    to_json(account.topics),
+                    to_json(account.sentiment),
+                    to_json(account.words),
+                    time.time()
+                ))
+
+    def add_tweets(self, tweets: pd.DataFrame):
+        """Append `tweets`, `sync` then updates `sampled` and `searchable`."""
+        with closing(sqlite3.connect(self._path)) as connection:
+            tweets.to_sql(
+                CLIENTS_TWEETS_TABLE, connection, if_exists='append')
+
+        self._prepare_tweets_table()
+
+    def close(self):
+        self.tweets_db.close()
+        self._engine.dispose()
+
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,216 @@
+"""Membership and aggregated distributions of the user clusters."""
+
+from collections.abc import Mapping
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from models import User
+from words import WordCountsRow, WordCountsStore
+
+CLUSTER_METHODS = {
+    'mean_shift': 'cluster_mean_shift_id',
+    'kmeans': 'cluster_kmeans_id',
+    'gmm': 'cluster_gmm_id'
+}
+
+
+class ClusterAggregate:
+    """Members of one cluster with their topic and sentiment sums.
+
+    Distributions are averaged over the members weighted by their
+    `tweets_count`, so they describe the tweets of the whole cluster.
+    Only the sums are kept, which makes adding a member O(topics).
+    """
+
+    def __init__(self, method: str, cluster_id: int):
+        self.method = method
+        self.cluster_id = cluster_id
+        self.usernames: List[str] = []
+        self._topic_sums: Dict[Any, float] = {}
+        self._topic_weight = 0.0
+        self._sentiment_sums: Dict[str, float] = {}
+        self._sentiment_weight = 0.0
+
+    def __len__(self) -> int:
+        return len(self.usernames)
+
+    def add_member(
+            self,
+            user: User,
+            topics: Optional[List[Dict[str, Any]]],
+            sentiment: Optional[List[Tuple[str, float]]]
+    ):
+        self.usernames.append(user.username)
+        weight = max(user.tweets_count, 1)
+
+        if topics is not None:
+            for entry in topics:
+                self._topic_sums[entry['topic']] = \
+                    self._topic_sums.get(entry['topic'], 0.0) + \
+                    weight * float(entry['part'])
+            self._topic_weight += weight
+
+        if sentiment is not None:
+            for label, value in sentiment:
+                self._sentiment_sums[label] = \
+                    self._sentiment_sums.get(label, 0.0) + weight * float(value)
+            self._sentiment_weight += weight
+
+    def topics(self) -> List[Dict[str, Any]]:
+        return [
+            {'topic': topic, 'part': part / self._topic_weight}
+            for topic, part in self._topic_sums.items()
+        ]
+
+    def sentiment(self) -> List[Tuple[str, float]]:
+        return [
+            (label, value / self._sentiment_weight)
+            for label, value in self._sentiment_sums.items()
+        ]
+
+
+def sum_word_counts(
+        rows: List[WordCountsRow],
+        groups: np.ndarray,
+        vocabulary_size: int
+) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """Word counts of `rows` summed per group, sorted by descending count.
+
+    All rows must share one vocabulary; `groups[i]` is the group of
+    `rows[i]`. The sums are computed over vocabulary ids, so no word is
+    decoded.
+    """
+    if not rows:
+        return {}
+
+    lengths = np.array([len(row) for row in rows], dtype=np.int64)
+    ids = np.concatenate([row.ids for row in rows]).astype(np.int64)
+    values = np.concatenate([row.values for row in rows]).astype(np.float64)
+    entry_groups = np.repeat(np.asarray(groups, dtype=np.int64), lengths)
+
+    keys, inverse = np.unique(
+        entry_groups * vocabulary_size + ids, return_inverse=True)
+    sums = np.bincount(inverse, weights=values)
+    key_groups = keys // vocabulary_size
+    boundaries = np.flatnonzero(np.diff(key_groups)) + 1
+
+    summed = {}
+    for group_keys, group_sums in zip(
+            np.split(keys, boundaries), np.split(sums, boundaries)):
+        order = np.argsort(-group_sums, kind='stable')
+        summed[int(group_keys[0] // vocabulary_size)] = (
+            (group_keys[order] % vocabulary_size).astype(np.int32),
+            group_sums[order].astype(np.float32)
+        )
+
+    return summed
+
+
+class ClusterIndex:
+    """Clusters of every clustering method, built from the per user data.
+
+    Word counts of the initial users are summed over vocabulary ids at
+    build time. Adding the words of a client user re-sums the words of its
+    clusters by text, as client words use a vocabulary of their own. If the per user
+    word counts are truncated to `WORDS_TOP_K`, so are the sums.
+    """
+
+    def __init__(
+            self,
+            users: List[User],
+            topics_per_user: Mapping,
+            sentiment_per_user: Mapping,
+            words_per_user: Mapping
+    ):
+        self._clusters: Dict[str, Dict[int, ClusterAggregate]] = {
+            method: {} for method in CLUSTER_METHODS
+        }
+        self._words: Dict[str, Dict[int, WordCountsRow]] = {
+            method: {} for method in CLUSTER_METHODS
+        }
+        self._client_words = WordCountsStore(top_k=None)
+
+        for user in users:
+            self._add_member(
+                user,
+                topics_per_user.get(user.username),
+                sentiment_per_user.get(user.username)
+            )
+
+        with_words = [user for user in users if user.username in words_per_user]
+        rows = [words_per_user[user.username] for user in with_words]
+
+        if rows:
+            vocabulary = rows[0].vocabulary
+
+            for method, attribute in CLUSTER_METHODS.items():
+                groups = np.array(
+                    [getattr(user, attribute) for user in with_words])
+                summed = sum_word_counts(rows, groups, len(vocabulary))
+
+                self._words[method] = {
+                    cluster_id: WordCountsRow(vocabulary, ids, values)
+                    for cluster_id, (ids, values) in summed.items()
+                }
+
+    def _add_member(
+            self,
+            user: User,
+            topics: Optional[List[Dict[str, Any]]],
+            sentiment: Optional[List[Tuple[str, float]]]
+    ):
+        for method, attribute in CLUSTER_METHODS.items():
+            cluster_id = getattr(user, attribute)
+            clusters = self._clusters[method]
+
+            if cluster_id not in clusters:
+                clusters[cluster_id] = ClusterAggregate(method, cluster_id)
+
+            clusters[cluster_id].add_member(user, topics, sentiment)
+
+    def add_user(
+            self,
+            user: User,
+            topics: List[Dict[str, Any]],
+            sentiment: List[Tuple[str, float]]
+    ):
+        self._add_member(user, topics, sentiment)
+
+    def add_user_words(self, user: User, words: List[Dict[str, Any]]):
+        """Add the words of `user` to those of its clusters.
+
+        The words of a cluster are replaced by a new row at once, so this
+        can run in another thread while the index is read, though not
+        concurrently with itself.
+        """
+        for method, attribute in CLUSTER_METHODS.items():
+            cluster_id = getattr(user, attribute)
+            summed: Dict[str, float] = {}
+
+            for entry in self.get_words(method, cluster_id)[:] + words:
+                summed[entry['text']] = \
+                    summed.get(entry['text'], 0.0) + float(entry['value'])
+
+            self._client_words.add((method, cluster_id), [
+                {'text': text, 'value': value}
+                for text, value in summed.items()
+            ])
+            self._words[method][cluster_id] = \
+                self._client_words[(method, cluster_id)]
+
+    def get_clusters(self, method: str) -> Optional[List[ClusterAggregate]]:
+        clusters = self._clusters.get(method)
+
+        return None if clusters is None else \
+            sorted(clusters.values(), key=lambda c: c.cluster_id)
+
+    def get_cluster(
+            self,
+            method: str,
+            cluster_id: int
+    ) -> Optional[ClusterAggregate]:
+        return self._clusters.get(method, {}).get(cluster_id)
+
+    def get_words(self, method: str, cluster_id: int) -> List:
+        return self._words[method].get(cluster_id, [])
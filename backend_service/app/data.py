@@ -1,17 +1,22 @@
 import pandas as pd
 import pickle as pkl
+from functools import lru_cache
 
 from sqlalchemy import create_engine
 
-from settings import DATA_DIRECTORY
+from pydantic import BaseModel
+from settings import DATA_DIRECTORY, SNAPSHOT_DIRNAME, TWEETS_DB_FILE, \
+    VALIDATE_DATA
 from os.path import join
-from typing import List, Dict, Union
+from typing import Any, List, Dict, Mapping, Optional, Sequence, Type, Union
 from models import Coalition, Party, User
+from snapshot import Snapshot, open_snapshot
+from words import InternedVocabulary, WordCountsStore
 from random import randint
 
 
-def load_coalitions() -> List[Coalition]:
-    df = pd.read_csv(join(DATA_DIRECTORY, "coalitions.csv"))
+def load_coalitions(directory: str = DATA_DIRECTORY) -> List[Coalition]:
+    df = pd.read_csv(join(directory, "coalitions.csv"))
 
     coalitions = []
 
@@ -21,82 +26,152 @@ def load_coalitions() -> List[Coalition]:
     return coalitions
 
 
-def load_parties() -> List[Party]:
-    df = pd.read_csv(
-        join(DATA_DIRECTORY, 'parties.csv'),
-        names=['id', 'party', 'coalition'], header=0)
+def str_values(column: pd.Series) -> List[Optional[str]]:
+    """Column values coerced the way pydantic coerces `str` fields."""
+    return [
+        value if value is None or isinstance(value, str) else str(value)
+        for value in column.tolist()
+    ]
+
+
+def int_values(column: pd.Series) -> List[int]:
+    return column.astype(int).tolist()
+
+
+def float_values(column: pd.Series) -> List[float]:
+    return column.astype(float).tolist()
+
+
+def models_from_columns(
+        model: Type[BaseModel],
+        columns: Dict[str, List],
+        validate: bool = VALIDATE_DATA
+) -> List[BaseModel]:
+    """Build one `model` per row of equally long `columns`.
+
+    Without `validate` the models are created with `construct`, skipping
+    pydantic validation, so the columns must already hold values of the
+    field types.
+    """
+    build = model if validate else model.construct
+    fields = list(columns.keys())
+
+    return [build(**dict(zip(fields, row))) for row in zip(*columns.values())]
 
-    def party_from_row(row: pd.Series) -> Party:
-        return Party(
-            party_id=row['id'],
-            name=row['party'],
-            coalition=row['coalition'])
 
-    parties = df.apply(party_from_row, axis=1).tolist()
+def load_parties(
+        validate: bool = VALIDATE_DATA,
+        directory: str = DATA_DIRECTORY
+) -> List[Party]:
+    df = pd.read_csv(
+        join(directory, 'parties.csv'),
+        names=['id', 'party', 'coalition'], header=0)
 
-    return parties
+    return models_from_columns(Party, {
+        'party_id': int_values(df['id']),
+        'name': str_values(df['party']),
+        'coalition': str_values(df['coalition'])
+    }, validate)
 
 
-def load_users() -> List[User]:
-    users = pd.read_csv(join(DATA_DIRECTORY, "users.csv"))
-    graph = pd.read_csv(join(DATA_DIRECTORY, "graph_umap.csv"))
-    clusters = pd.read_csv(join(DATA_DIRECTORY, "clusters.csv"))
+def load_users(
+        validate: bool = VALIDATE_DATA,
+        directory: str = DATA_DIRECTORY
+) -> List[User]:
+    users = pd.read_csv(join(directory, "users.csv"))
+    graph = pd.read_csv(join(directory, "graph_umap.csv"))
+    clusters = pd.read_csv(join(directory, "clusters.csv"))
 
     users['username'] = users['username'].str.lower()
 
     df = users.merge(graph, on='username', how='right')
     df = df.merge(clusters, on='username')
 
-    def user_from_row(row: pd.Series) -> User:
-        return User(
-            username=row['username'],
-            party=row['party'],
-            coalition=row['coalition'],
-            role=row['pozycja'],
-            name=row['name'],
-            tweets_count=row['tweets_count'],
-            x_graph2d=row['2D_x'],
-            y_graph2d=row['2D_y'],
-            x_graph3d=row['3D_x'],
-            y_graph3d=row['3D_y'],
-            z_graph3d=row['3D_z'],
-            cluster_mean_shift_id=row['mean_shift_cluster'],
-            cluster_kmeans_id=row['kmeans_cluster'],
-            cluster_gmm_id=row['gmm_cluster']
-        )
+    return models_from_columns(User, {
+        'username': str_values(df['username']),
+        'party': str_values(df['party']),
+        'coalition': str_values(df['coalition']),
+        'role': str_values(df['pozycja']),
+        'name': str_values(df['name']),
+        'tweets_count': int_values(df['tweets_count']),
+        'x_graph2d': float_values(df['2D_x']),
+        'y_graph2d': float_values(df['2D_y']),
+        'x_graph3d': float_values(df['3D_x']),
+        'y_graph3d': float_values(df['3D_y']),
+        'z_graph3d': float_values(df['3D_z']),
+        'cluster_mean_shift_id': int_values(df['mean_shift_cluster']),
+        'cluster_kmeans_id': int_values(df['kmeans_cluster']),
+        'cluster_gmm_id': int_values(df['gmm_cluster'])
+    }, validate)
+
+
+def load_pickled(filename: str, directory: str = DATA_DIRECTORY) -> Any:
+    with open(join(directory, filename), 'rb') as f:
+        return pkl.load(f)
+
+
+# only the data directory being loaded is cached, so reloading another
+# version does not keep the previous snapshot open
+@lru_cache(maxsize=1)
+def get_snapshot(directory: str = DATA_DIRECTORY) -> Optional[Snapshot]:
+    return open_snapshot(join(directory, SNAPSHOT_DIRNAME))
+
+
+def load_topics_distributions(
+        directory: str = DATA_DIRECTORY
+) -> Dict[str, Mapping[str, List]]:
+    snapshot = get_snapshot(directory)
+
+    if snapshot is not None:
+        return snapshot.topics_distributions()
+
+    return load_pickled('topics_distributions.pkl.gz', directory)
 
-    users = df.apply(user_from_row, axis=1).tolist()
 
-    return users
+def load_sentiment_distributions(
+        directory: str = DATA_DIRECTORY
+) -> Dict[str, Mapping[Union[str, int], List]]:
+    snapshot = get_snapshot(directory)
 
+    if snapshot is not None:
+        return snapshot.sentiment_distributions()
 
-def load_topics_distributions() -> Dict[str, Dict[str, List]]:
-    with open(join(DATA_DIRECTORY, 'topics_distributions.pkl.gz'), 'rb') as f:
-        topics_dist = pkl.load(f)
+    return load_pickled('sentiment_distributions.pkl.gz', directory)
 
-    return topics_dist
 
+@lru_cache(maxsize=1)
+def get_vocabulary(directory: str = DATA_DIRECTORY) -> InternedVocabulary:
+    return InternedVocabulary()
 
-def load_sentiment_distributions() -> Dict[str, Dict[Union[str, int], List]]:
-    with open(join(DATA_DIRECTORY, 'sentiment_distributions.pkl.gz'), 'rb') as f:
-        sentiment_dist = pkl.load(f)
 
-    return sentiment_dist
+def load_words_per_topic(
+        directory: str = DATA_DIRECTORY
+) -> Mapping[int, Sequence]:
+    snapshot = get_snapshot(directory)
 
+    if snapshot is not None:
+        return snapshot.words_per_topic()
 
-def load_words_per_topic() -> Dict[int, List]:
-    with open(join(DATA_DIRECTORY, 'words_per_topic.pkl.gz'), 'rb') as f:
-        words_per_topic = pkl.load(f)
+    return WordCountsStore.from_lists(
+        load_pickled('words_per_topic.pkl.gz', directory),
+        get_vocabulary(directory))
 
-    return words_per_topic
 
+def load_words_counts(
+        directory: str = DATA_DIRECTORY
+) -> Dict[str, Mapping[str, Sequence]]:
+    snapshot = get_snapshot(directory)
 
-def load_words_counts() -> Dict[str, Dict[str, List]]:
-    with open(join(DATA_DIRECTORY, 'words_counts.pkl.gz'), 'rb') as f:
-        words_counts = pkl.load(f)
+    if snapshot is not None:
+        return snapshot.words_counts()
 
-    return words_counts
+    return {
+        group: WordCountsStore.from_lists(
+            per_entity, get_vocabulary(directory))
+        for group, per_entity
+        in load_pickled('words_counts.pkl.gz', directory).items()
+    }
 
 
-def get_db_engine():
-    return create_engine(f"sqlite:///{join(DATA_DIRECTORY, 'tweets.sqlite')}")
+def get_db_engine(directory: str = DATA_DIRECTORY):
+    return create_engine(f"sqlite:///{join(directory, TWEETS_DB_FILE)}")
@@ -0,0 +1,72 @@
+"""Non-blocking access to the tweets database for async handlers."""
+
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from queue import Empty, LifoQueue
+from typing import Callable, Optional, TypeVar
+
+from settings import DB_POOL_SIZE
+
+T = TypeVar('T')
+
+
+class ReadOnlyDatabase:
+    """Runs queries on a bounded thread pool with reusable connections.
+
+    Every worker thread takes a read-only sqlite connection from the pool
+    for the duration of a call, so at most `pool_size` connections are
+    ever open. The executor is created on first use, which keeps the
+    object safe to build before the server forks its workers.
+    """
+
+    def __init__(self, path: str, pool_size: int = DB_POOL_SIZE):
+        self._uri = f"{Path(path).absolute().as_uri()}?mode=ro"
+        self._pool_size = pool_size
+        self._connections: LifoQueue = LifoQueue()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+
+    def _call(self, func: Callable[..., T]) -> T:
+        try:
+            connection = self._connections.get_nowait()
+        except Empty:
+            connection = self._connect()
+
+        try:
+            return func(connection)
+        finally:
+            self._connections.put(connection)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._pool_size,
+                thread_name_prefix='db'
+            )
+
+        return self._executor
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Await `func(connection, *args, **kwargs)` run on the pool."""
+        loop = asyncio.get_event_loop()
+
+        return await loop.run_in_executor(
+            self._get_executor(),
+            self._call,
+            lambda connection: func(connection, *args, **kwargs)
+        )
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except Empty:
+                break
@@ -0,0 +1,292 @@
+"""Versions of the data served by the API and their atomic swapping."""
+
+import fcntl
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from os.path import isdir, join
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from clusters import ClusterIndex
+from data import load_users, load_parties, load_coalitions, \
+    load_topics_distributions, load_sentiment_distributions, \
+    load_words_per_topic, load_words_counts, get_db_engine
+from database import ReadOnlyDatabase
+from metrics import DATA_SETS_LOADED, startup_phase
+from models import User
+from queries import SAMPLE_KEY_COLUMN, TEXT_COLUMN, add_sample_keys, \
+    create_tweets_fts, create_tweets_indexes, get_table_columns
+from registry import EntityRegistry
+from response_cache import ResponseCache
+from settings import DATA_DIRECTORY, DATA_VERSION_FILE, \
+    DATA_VERSIONS_DIRECTORY, TWEETS_DB_FILE, TWEETS_STORE
+from spatial import UserGraphIndex
+from tweets_store import ColumnarTweetStore
+
+LOG = logging.getLogger('BACKEND')
+
+
+def read_current_version() -> Optional[str]:
+    """Version named in `DATA_VERSION_FILE`, None without the file."""
+    try:
+        with open(DATA_VERSION_FILE) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_current_version(version: str):
+    tmp_path = f'{DATA_VERSION_FILE}.{os.getpid()}.tmp'
+
+    with open(tmp_path, 'w') as f:
+        f.write(f'{version}\n')
+
+    os.replace(tmp_path, DATA_VERSION_FILE)
+
+
+def version_directory(version: Optional[str]) -> str:
+    if version is None:
+        return DATA_DIRECTORY
+
+    directory = join(DATA_VERSIONS_DIRECTORY, version)
+
+    if version in ('.', '..') or os.sep in version or not isdir(directory):
+        raise ValueError(f'Data version not found: {version}')
+
+    return directory
+
+
+def get_table_features(engine, table: str) -> Tuple[bool, bool]:
+    """Whether `table` has sample keys and a full-text index already."""
+    with engine.connect() as connection:
+        sampled = SAMPLE_KEY_COLUMN in get_table_columns(connection, table)
+        searchable = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+            {'name': f'{table}_fts'}
+        ).fetchone() is not None
+
+    return sampled, searchable
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Exclusive lock on `path` shared by all processes of the host."""
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def prepare_tweets_table(
+        engine,
+        table: str,
+        lock_path: str
+) -> Tuple[bool, bool]:
+    """Add sample keys, indexes and the full-text index to `table`.
+
+    Workers loading the same database take turns on the lock at
+    `lock_path`, the first one prepares the table and the others find it
+    prepared. Returns whether the table can be sampled by key and searched
+    by text. This needs write access to the database and its directory;
+    without it a warning is logged and the table is used as it is, e.g.
+    prepared beforehand or with the slower unindexed queries.
+    """
+    try:
+        with file_lock(lock_path):
+            add_sample_keys(engine, table)
+            created_indexes = create_tweets_indexes(engine, table)
+            fts_table = create_tweets_fts(engine, table)
+    except (OSError, OperationalError) as e:
+        sampled, searchable = get_table_features(engine, table)
+        LOG.warning(f'Could not prepare {table}, sampling by key is '
+                    f'{"on" if sampled else "off"} and full-text search '
+                    f'{"on" if searchable else "off"}: {e}')
+        return sampled, searchable
+
+    if created_indexes:
+        LOG.info(f'Created indexes: {", ".join(created_indexes)}')
+
+    if fts_table is None:
+        LOG.warning(f'No {TEXT_COLUMN} column in {table}, '
+                    f'full-text search is disabled for it')
+
+    return True, fts_table is not None
+
+
+class Dataset:
+    """Everything the API serves from one version of the data directory.
+
+    The tweets table is indexed on load when the database of the version
+    is writable, see `prepare_tweets_table`. Client accounts are not part of any version,
+    they are added to every newly loaded data set from the `ClientStore`.
+    """
+
+    def __init__(self, version: Optional[str], directory: str):
+        self.version = version
+        self.directory = directory
+        self.loaded_at = time.time()
+
+        self.users = startup_phase(load_users, directory=directory)
+        self.parties = startup_phase(load_parties, directory=directory)
+        self.coalitions = startup_phase(load_coalitions, directory)
+        self.registry = EntityRegistry(
+            self.users, self.parties, self.coalitions)
+        self.graph_index = startup_phase(UserGraphIndex, self.users)
+
+        self.topics_dist = startup_phase(load_topics_distributions, directory)
+        self.sentiment_dist = startup_phase(
+            load_sentiment_distributions, directory)
+        self.words_per_topic = startup_phase(load_words_per_topic, directory)
+        self.words_counts = startup_phase(load_words_counts, directory)
+        self.clusters = startup_phase(
+            ClusterIndex, self.users, self.topics_dist['per_user'],
+            self.sentiment_dist['per_user'], self.words_counts['per_user'])
+
+        self.response_cache = ResponseCache()
+
+        self.db_engine = startup_phase(get_db_engine, directory)
+        self.sampled = False
+        self.searchable = False
+
+        if self.db_engine.has_table('tweets'):
+            self.sampled, self.searchable = prepare_tweets_table(
+                self.db_engine, 'tweets',
+                join(directory, f'{TWEETS_DB_FILE}.lock'))
+
+        self.tweets_db = ReadOnlyDatabase(join(directory, TWEETS_DB_FILE))
+
+        if TWEETS_STORE == 'memory':
+            self.tweets_store = startup_phase(
+                ColumnarTweetStore.from_sql, self.db_engine)
+            LOG.info(f'Loaded {len(self.tweets_store)} tweets into memory')
+        else:
+            self.tweets_store = None
+
+        # requests currently using this data set, see `DatasetManager`
+        self.requests = 0
+
+    def add_client_user(
+            self,
+            user: User,
+            topics_distribution: List[Dict[str, Any]],
+            sentiment_distribution: List[Tuple[str, float]],
+            words: List[Dict[str, Any]]
+    ):
+        self.add_client_words(user, words)
+        self.add_client_member(
+            user, topics_distribution, sentiment_distribution)
+
+    def add_client_words(self, user: User, words: List[Dict[str, Any]]):
+        """The slow part of `add_client_user`, safe outside the event loop."""
+        self.clusters.add_user_words(user, words)
+
+    def add_client_member(
+            self,
+            user: User,
+            topics_distribution: List[Dict[str, Any]],
+            sentiment_distribution: List[Tuple[str, float]]
+    ):
+        """The rest of `add_client_user`, which makes the user visible."""
+        self.registry.add_client_user(user)
+        self.graph_index.add(user)
+        self.clusters.add_user(
+            user, topics_distribution, sentiment_distribution)
+
+    def close(self):
+        self.tweets_db.close()
+        self.db_engine.dispose()
+
+
+class DatasetManager:
+    """Holds the current data set and retires replaced ones.
+
+    Every request acquires the current data set when it starts and keeps
+    using it until it releases it, even if another one was swapped in
+    meanwhile. A replaced data set is closed, and so can be freed, once its
+    last request releases it. All methods must be called from the event
+    loop thread.
+    """
+
+    def __init__(self, current: Dataset):
+        self._current = current
+        self._retired: List[Dataset] = []
+        DATA_SETS_LOADED.set(1)
+
+    @property
+    def current(self) -> Dataset:
+        return self._current
+
+    @property
+    def draining(self) -> int:
+        """Number of replaced data sets still used by requests."""
+        return len(self._retired)
+
+    def acquire(self) -> Dataset:
+        dataset = self._current
+        dataset.requests += 1
+
+        return dataset
+
+    def release(self, dataset: Dataset):
+        dataset.requests -= 1
+
+        if dataset is not self._current and dataset.requests == 0:
+            self._close(dataset)
+
+    def swap(self, dataset: Dataset) -> Dataset:
+        previous = self._current
+        self._current = dataset
+
+        if previous.requests == 0:
+            self._close(previous)
+        else:
+            self._retired.append(previous)
+
+        DATA_SETS_LOADED.set(1 + len(self._retired))
+
+        return previous
+
+    def _close(self, dataset: Dataset):
+        if dataset in self._retired:
+            self._retired.remove(dataset)
+
+        dataset.close()
+        DATA_SETS_LOADED.set(1 + len(self._retired))
+        LOG.info(f'Released data version {dataset.version}')
+
+
+CURRENT_DATASET: ContextVar[Dataset] = ContextVar('current_dataset')
+
+
+class DatasetMiddleware:
+    """ASGI middleware pinning every request to the current data set.
+
+    The data set is available to handlers through `CURRENT_DATASET` until
+    the response, including a streamed body, has been sent.
+    """
+
+    def __init__(self, app, manager: DatasetManager):
+        self.app = app
+        self.manager = manager
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] not in ('http', 'websocket'):
+            await self.app(scope, receive, send)
+            return
+
+        dataset = self.manager.acquire()
+        token = CURRENT_DATASET.set(dataset)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            CURRENT_DATASET.reset(token)
+            self.manager.release(dataset)
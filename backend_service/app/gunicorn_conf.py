@@ -0,0 +1,69 @@
+"""Gunicorn settings picked up by the uvicorn-gunicorn image from /app.
+
+The worker count follows the image defaults (`WORKERS_PER_CORE`,
+`MAX_WORKERS`, `WEB_CONCURRENCY`). With `PRELOAD_APP=1`, the default, the
+app and its data are loaded once in the master process and the workers
+share them copy-on-write after the fork instead of each loading a copy.
+This covers the data loaded at startup only, a version reloaded later is
+loaded by every worker on its own (see `reload_data` in main.py), and the
+memory is shared again after the next restart.
+
+The workers write their metrics to `METRICS_DIRECTORY`, so that `/metrics`
+reports the whole server whichever worker serves the scrape.
+"""
+
+import gc
+import multiprocessing
+import os
+import shutil
+
+workers_per_core = float(os.getenv('WORKERS_PER_CORE', 1))
+max_workers = int(os.getenv('MAX_WORKERS', 0)) or None
+web_concurrency = int(os.getenv('WEB_CONCURRENCY', 0)) or None
+preload = os.getenv('PRELOAD_APP', '1') == '1'
+
+if web_concurrency is None:
+    web_concurrency = max(int(workers_per_core * multiprocessing.cpu_count()), 2)
+
+    if max_workers is not None:
+        web_concurrency = min(web_concurrency, max_workers)
+
+bind = os.getenv('BIND') or \
+    f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '80')}"
+workers = web_concurrency
+worker_class = 'uvicorn.workers.UvicornWorker'
+worker_tmp_dir = '/dev/shm'
+loglevel = os.getenv('LOG_LEVEL', 'info')
+accesslog = os.getenv('ACCESS_LOG', '-') or None
+errorlog = os.getenv('ERROR_LOG', '-') or None
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', 120))
+timeout = int(os.getenv('TIMEOUT', 120))
+keepalive = int(os.getenv('KEEP_ALIVE', 5))
+preload_app = preload
+
+metrics_directory = os.environ.setdefault(
+    'METRICS_DIRECTORY', os.path.join(worker_tmp_dir, 'sma-metrics'))
+# values of the workers of a previous run
+shutil.rmtree(metrics_directory, ignore_errors=True)
+
+if preload:
+    # no collections while loading, so no freed holes are left in the
+    # pages the workers are going to share
+    gc.disable()
+
+
+def when_ready(server):
+    if preload:
+        # the loaded objects are moved out of the collector's reach, a
+        # collection in a worker would otherwise write to every one of
+        # them and copy all shared pages
+        gc.freeze()
+        gc.enable()
+
+
+def post_fork(server, worker):
+    if preload:
+        from metrics import REGISTRY
+
+        # requests are counted by the workers only, once each
+        REGISTRY.reset_after_fork()
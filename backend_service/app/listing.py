@@ -0,0 +1,74 @@
+"""Cursor pagination, field projection and NDJSON output for collections."""
+
+import base64
+from itertools import islice
+from typing import Iterator, List, Optional, Sequence, Tuple, Type
+
+from pydantic import BaseModel
+
+from response_cache import encode_json
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(str(offset).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """Offset encoded in `cursor`, raises `ValueError` on malformed ones."""
+    if cursor is None:
+        return 0
+
+    try:
+        offset = int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except ValueError:
+        offset = -1
+
+    if offset < 0:
+        raise ValueError(f'Invalid cursor: {cursor}')
+
+    return offset
+
+
+def parse_fields(
+        fields: Optional[str],
+        model: Type[BaseModel]
+) -> Optional[List[str]]:
+    """Field names from a comma separated `fields` parameter."""
+    if fields is None:
+        return None
+
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in names if name not in model.__fields__]
+
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    return names
+
+
+def project(item: BaseModel, fields: Optional[List[str]]) -> dict:
+    return item.dict(include=set(fields) if fields is not None else None)
+
+
+def page_bounds(
+        total: int,
+        offset: int,
+        limit: Optional[int]
+) -> Tuple[int, Optional[str]]:
+    """End of the page starting at `offset` and the cursor of the next one."""
+    end = total if limit is None else min(total, offset + limit)
+    next_cursor = encode_cursor(end) if end < total else None
+
+    return end, next_cursor
+
+
+def ndjson_lines(
+        items: Sequence[BaseModel],
+        start: int,
+        end: int,
+        fields: Optional[List[str]]
+) -> Iterator[bytes]:
+    for item in islice(items, start, end):
+        yield encode_json(project(item, fields)) + b'\n'
@@ -1,45 +1,36 @@
 import asyncio
+import hmac
 import logging
-from typing import List, Dict, Union
+from typing import Any, List, Dict, Type, Union
 
+import numpy as np
 import pandas as pd
-from celery import Celery, signature, chain
-from fastapi import FastAPI, status, HTTPException, WebSocket
+from fastapi import FastAPI, status, HTTPException, Header, Query, Request, \
+    WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-
-import celery_conf
-from data import load_users, load_parties, load_coalitions, \
-    load_topics_distributions, load_sentiment_distributions, \
-    load_words_per_topic, load_words_counts, get_db_engine
+from fastapi.responses import Response, StreamingResponse
+
+from analysis import STAGE_MESSAGES, analyse_tweets, download_tweets
+from clients import CLIENTS_TWEETS_TABLE, ClientAccount, ClientStore
+from clusters import CLUSTER_METHODS, ClusterAggregate
+from dataset import CURRENT_DATASET, Dataset, DatasetManager, \
+    DatasetMiddleware, read_current_version, version_directory, \
+    write_current_version
 from exceptions import WrongUsernameException, NoTweetsLeftException
+from metrics import CONTENT_TYPE, DATA_RELOADS, DB_QUERY_DURATION, \
+    DB_QUERY_ROWS, REGISTRY, MetricsMiddleware
+from listing import NDJSON_MEDIA_TYPE, decode_cursor, ndjson_lines, \
+    page_bounds, parse_fields, project
 from models import *
-from response import TopicDistribution, WordsCounts, ProfileImage
-from settings import STATUS_OK, STATUS_ERROR
-from twitter import get_twitter_api_instance, get_profile_photo
-
-app = FastAPI()
-
-# celery_app = Celery()
-# celery_app.config_from_object(celery_conf)
-
-app.add_middleware(CORSMiddleware, allow_origins=["*"])
-
-users = load_users()
-clients_users = []
-parties = load_parties()
-coalitions = load_coalitions()
-
-topics_dist = load_topics_distributions()
-clients_topic_dist = {}
-sentiment_dist = load_sentiment_distributions()
-client_sentiment_dist = {}
-words_per_topic = load_words_per_topic()
-words_counts = load_words_counts()
-clients_words_counts = {}
-
-twitterAPI = get_twitter_api_instance()
-
-db_engine = get_db_engine()
+from photos import ProfilePhotoCache
+from queries import TEXT_COLUMN, search_tweets, select_tweets, \
+    select_batch_tweets
+from response import TopicDistribution, WordsCounts, ProfileImage, \
+    BatchEntity, BatchResponse, DataVersion, GraphViewport
+from settings import ADMIN_TOKEN, ANALYSIS_ENABLED, CLIENTS_DB_PATH, \
+    CLIENTS_SYNC_INTERVAL, DATA_WATCH_INTERVAL, STATUS_OK, STATUS_ERROR
+from spatial import GRAPH_AXES
+from twitter import get_twitter_client
 
 
 def get_logger(mod_name):
@@ -56,6 +47,210 @@ def get_logger(mod_name):
 
 LOG = get_logger('BACKEND')
 
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware, allow_origins=["*"], expose_headers=["X-Next-Cursor"])
+app.add_middleware(MetricsMiddleware)
+
+twitter_client = get_twitter_client()
+photo_cache = ProfilePhotoCache(twitter_client.get_profile_photo)
+
+clients = ClientStore(CLIENTS_DB_PATH)
+
+initial_version = read_current_version()
+datasets = DatasetManager(
+    Dataset(initial_version, version_directory(initial_version)))
+
+
+for client_account in clients.sync():
+    datasets.current.add_client_user(*client_account)
+
+app.add_middleware(DatasetMiddleware, manager=datasets)
+
+# created on first use, so that they belong to the worker's event loop
+reload_lock: Optional[asyncio.Lock] = None
+clients_lock: Optional[asyncio.Lock] = None
+data_watcher: Optional[asyncio.Future] = None
+clients_watcher: Optional[asyncio.Future] = None
+
+
+def get_clients_lock() -> asyncio.Lock:
+    global clients_lock
+
+    if clients_lock is None:
+        clients_lock = asyncio.Lock()
+
+    return clients_lock
+
+
+def read_client_changes(dataset: Dataset) -> List[ClientAccount]:
+    """New client accounts, with their words already added to `dataset`."""
+    accounts = clients.sync()
+
+    for account in accounts:
+        dataset.add_client_words(account.user, account.words)
+
+    return accounts
+
+
+def add_client_accounts(dataset: Dataset):
+    """Add every client account to `dataset`, before it is swapped in."""
+    clients.sync()
+
+    for account in clients:
+        dataset.add_client_user(*account)
+
+
+async def sync_clients():
+    """Add the client accounts stored by any worker to the data set.
+
+    The accounts are read and their words summed in the executor, only
+    making them visible runs on the event loop.
+    """
+    async with get_clients_lock():
+        dataset = datasets.current
+        loop = asyncio.get_event_loop()
+        accounts = await loop.run_in_executor(
+            None, read_client_changes, dataset)
+
+        for account in accounts:
+            dataset.add_client_member(
+                account.user, account.topics, account.sentiment)
+
+
+def current_data() -> Dataset:
+    """Data set of the request being handled, outside requests the current."""
+    return CURRENT_DATASET.get(datasets.current)
+
+
+async def reload_data(version: Optional[str], force: bool = False) -> Dataset:
+    """Load `version` in a background thread and swap it in.
+
+    Requests keep being served from the current data set while the new one
+    loads. Without `force` nothing is loaded if `version` is already the
+    current one.
+
+    Every worker loads the version on its own, so unlike the data loaded
+    before the fork it is not shared between them: after a reload each
+    worker holds a full copy until the server is restarted.
+    """
+    global reload_lock
+
+    if reload_lock is None:
+        reload_lock = asyncio.Lock()
+
+    async with reload_lock:
+        if not force and version == datasets.current.version:
+            return datasets.current
+
+        directory = version_directory(version)
+        loop = asyncio.get_event_loop()
+
+        try:
+            dataset = await loop.run_in_executor(
+                None, Dataset, version, directory)
+        except Exception:
+            DATA_RELOADS.inc(outcome='error')
+            raise
+
+        # no sync may add accounts to the previous data set meanwhile
+        async with get_clients_lock():
+            await loop.run_in_executor(None, add_client_accounts, dataset)
+            previous = datasets.swap(dataset)
+
+        DATA_RELOADS.inc(outcome='success')
+        LOG.info(f'Swapped data version {previous.version} for {version}')
+
+        return dataset
+
+
+async def watch_data_version():
+    failed_version = None
+
+    while True:
+        await asyncio.sleep(DATA_WATCH_INTERVAL)
+        version = read_current_version()
+
+        if version in (datasets.current.version, failed_version):
+            continue
+
+        try:
+            await reload_data(version)
+            failed_version = None
+        except Exception as e:
+            failed_version = version
+            LOG.error(f'Could not load data version {version}: {e}')
+
+
+async def watch_clients():
+    while True:
+        await asyncio.sleep(CLIENTS_SYNC_INTERVAL)
+
+        try:
+            await sync_clients()
+        except Exception as e:
+            LOG.error(f'Could not read client accounts: {e}')
+
+
+@app.on_event("startup")
+def start_data_watcher():
+    global data_watcher, clients_watcher
+
+    if DATA_WATCH_INTERVAL > 0:
+        data_watcher = asyncio.ensure_future(watch_data_version())
+
+    if CLIENTS_SYNC_INTERVAL > 0:
+        clients_watcher = asyncio.ensure_future(watch_clients())
+
+
+@app.on_event("shutdown")
+def close_data():
+    for watcher in (data_watcher, clients_watcher):
+        if watcher is not None:
+            watcher.cancel()
+
+    datasets.current.close()
+    clients.close()
+
+
+async def add_client_user(
+        user: User,
+        topics_distribution: List[Dict],
+        sentiment_distribution: List,
+        words: List[Dict]
+):
+    account = ClientAccount(
+        user, topics_distribution, sentiment_distribution, words)
+    loop = asyncio.get_event_loop()
+
+    await loop.run_in_executor(None, clients.add, account)
+    await sync_clients()
+
+
+async def store_client_tweets(tweets: pd.DataFrame):
+    loop = asyncio.get_event_loop()
+
+    await loop.run_in_executor(None, clients.add_tweets, tweets)
+    await sync_clients()
+
+
+def select_from_store(
+        column_name: str,
+        column_value: Union[str, int],
+        limit: int,
+        sentiment: Optional[str],
+        topic: Optional[int],
+        seed: Optional[int]
+) -> pd.DataFrame:
+    with DB_QUERY_DURATION.time(query='store_select'):
+        selected = current_data().tweets_store.select(
+            column_name, column_value, limit, sentiment, topic, seed)
+
+    DB_QUERY_ROWS.inc(len(selected), query='store_select')
+
+    return selected
+
 
 async def get_tweets_by_column(
         column_name: str,
@@ -63,25 +258,71 @@ async def get_tweets_by_column(
         limit: int = 5,
         sentiment: Optional[str] = None,
         topic: Optional[int] = None,
-        table: str = 'tweets'
+        table: str = 'tweets',
+        seed: Optional[int] = None
 ):
-    selected = pd.read_sql(
-        f"SELECT DISTINCT * FROM {table} WHERE {column_name} = \"{column_value}\"",
-        db_engine
+    data = current_data()
+
+    if table == CLIENTS_TWEETS_TABLE:
+        database, sample_keys = clients.tweets_db, clients.sampled
+    elif data.tweets_store is not None:
+        return select_from_store(
+            column_name, column_value, limit, sentiment, topic, seed)
+    else:
+        database, sample_keys = data.tweets_db, data.sampled
+
+    return await database.run(
+        select_tweets,
+        column_name=column_name,
+        column_value=column_value,
+        limit=limit,
+        sentiment=sentiment,
+        topic=topic,
+        table=table,
+        seed=seed,
+        sample_keys=sample_keys
     )
 
-    if sentiment is not None:
-        selected = selected[selected['sentiment'] == sentiment]
 
-    if topic is not None:
-        selected = selected[selected['topic'] == topic]
+async def get_tweets_by_columns(
+        values_by_column: Dict[str, List[Union[str, int]]],
+        client_usernames: List[str],
+        limit: int = 5,
+        sentiment: Optional[str] = None,
+        topic: Optional[int] = None,
+        seed: Optional[int] = None
+) -> pd.DataFrame:
+    """Tweets of many entities, at most `limit` per entity.
 
-    if len(selected) < limit:
-        return selected
-    elif topic is None:
-        return selected.sample(limit)
-    else:
-        return selected.nlargest(limit, 'topic_proba')
+    Rows are labelled with `entity_column` and `entity_value`. All entities
+    of one table are fetched with a single query.
+    """
+    data = current_data()
+    queries = []
+
+    if data.tweets_store is None:
+        queries.append(data.tweets_db.run(
+            select_batch_tweets, values_by_column, limit, sentiment, topic,
+            seed=seed, sample_keys=data.sampled))
+
+    if client_usernames:
+        queries.append(clients.tweets_db.run(
+            select_batch_tweets, {'username': client_usernames}, limit,
+            sentiment, topic, table=CLIENTS_TWEETS_TABLE, seed=seed,
+            sample_keys=clients.sampled))
+
+    frames = list(await asyncio.gather(*queries))
+
+    if data.tweets_store is not None:
+        for column_name, values in values_by_column.items():
+            for value in values:
+                selected = select_from_store(
+                    column_name, value, limit, sentiment, topic, seed)
+                frames.append(selected.assign(
+                    entity_column=column_name, entity_value=value))
+
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=['entity_column', 'entity_value'])
 
 
 def tweets_from_rows(row: pd.Series) -> Tweet:
@@ -89,81 +330,248 @@ def tweets_from_rows(row: pd.Series) -> Tweet:
         tweet_id=row['id'],
         twitter_link=row['link'],
         username=row['username'],
-        tweet_text="x",
+        tweet_text=row.get(TEXT_COLUMN, "x"),
         topic=row['topic'],
         topic_proba=row['topic_proba'],
         sentiment=row['sentiment']
     )
 
 
-@app.get("/user", response_model=List[User])
-async def get_all_users() -> List[User]:
-    return users
+def find_user(username: str) -> User:
+    user = current_data().registry.get_user(username)
+
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='User not found')
 
+    return user
 
-@app.get("/user/{username}", response_model=User)
-async def get_user(username: str) -> User:
-    user = next((user for user in users if user.username == username), None)
-    client_user = next((user for user in clients_users
-                        if user.username == username.lower()), None)
 
-    if user is None and client_user is None:
+def find_user_topics(username: str) -> List:
+    username = find_user(username).username
+    topics_per_user = current_data().topics_dist['per_user']
+
+    if username in topics_per_user:
+        return topics_per_user[username]
+
+    account = clients.get(username)
+
+    if account is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User not found')
     else:
-        return user if user is not None else client_user
+        return account.topics
 
 
-@app.get("/user/{username}/topic", response_model=List[TopicDistribution])
-async def get_topics_by_username(username: str):
+def find_user_sentiment(username: str) -> List:
+    username = find_user(username).username
+    sentiment_per_user = current_data().sentiment_dist['per_user']
 
-    topics_per_user = topics_dist['per_user']
+    if username in sentiment_per_user:
+        return sentiment_per_user[username]
 
-    if username not in topics_per_user.keys():
-        if username.lower() not in clients_topic_dist.keys():
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail='User not found')
-        else:
-            return clients_topic_dist[username.lower()]
+    account = clients.get(username)
+
+    if account is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='User not found')
     else:
-        return topics_per_user[username]
+        return account.sentiment
 
 
-@app.get("/user/{username}/sentiment")
-async def get_sentiment_by_username(username: str):
-    sentiment_per_user = sentiment_dist['per_user']
+def find_user_words(username: str, limit: int) -> List:
+    username = find_user(username).username
+    words_per_user = current_data().words_counts['per_user']
 
-    if username not in sentiment_per_user.keys():
-        if username.lower() not in client_sentiment_dist.keys():
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail='User not found')
-        else:
-            return client_sentiment_dist[username.lower()]
+    if username in words_per_user:
+        return words_per_user[username][:limit]
+
+    if clients.get(username) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='User not found')
     else:
-        return sentiment_per_user[username]
+        return clients.words[username.lower()][:limit]
+
+
+def list_collection(
+        request: Request,
+        name: str,
+        items: List[BaseModel],
+        model: Type[BaseModel],
+        cursor: Optional[str],
+        limit: Optional[int],
+        fields: Optional[str],
+        output: str
+) -> Response:
+    data = current_data()
+
+    if limit is not None and limit < 1:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail='Limit must be positive integer'
+        )
+    elif output not in ('json', 'ndjson'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Format must be json or ndjson'
+        )
+
+    try:
+        offset = decode_cursor(cursor)
+        field_names = parse_fields(fields, model)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
 
+    end, next_cursor = page_bounds(len(items), offset, limit)
 
-@app.get("/user/{username}/word", response_model=List[WordsCounts])
-async def get_words_by_username(username: str, limit: int = 100):
-    words_per_user = words_counts['per_user']
+    if output == 'ndjson':
+        response = StreamingResponse(
+            ndjson_lines(items, offset, end, field_names),
+            media_type=NDJSON_MEDIA_TYPE
+        )
+    elif field_names is None:
+        response = data.response_cache.respond(
+            request, (name, offset, end), lambda: items[offset:end],
+            List[model])
+    else:
+        response = data.response_cache.respond(
+            request, (name, offset, end, tuple(field_names)),
+            lambda: [project(item, field_names) for item in items[offset:end]])
+
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = next_cursor
+
+    return response
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
 
+
+def check_admin_token(token: Optional[str]):
+    if ADMIN_TOKEN is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Not Found')
+    elif token is None or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='Invalid admin token')
+
+
+def data_version(dataset: Dataset) -> DataVersion:
+    return DataVersion(
+        version=dataset.version,
+        loaded_at=dataset.loaded_at,
+        draining=datasets.draining
+    )
+
+
+@app.get("/admin/data", response_model=DataVersion, include_in_schema=False)
+async def get_data_version(x_admin_token: Optional[str] = Header(None)):
+    check_admin_token(x_admin_token)
+
+    return data_version(datasets.current)
+
+
+@app.post("/admin/data/reload", response_model=DataVersion,
+          include_in_schema=False)
+async def reload_data_version(
+        version: Optional[str] = None,
+        x_admin_token: Optional[str] = Header(None)
+):
+    """Load `version` and swap it in, by default the one in the version file.
+
+    The version file is updated once the version has loaded, so the other
+    workers pick it up on their next check.
+    """
+    check_admin_token(x_admin_token)
+
+    if version is None:
+        version = read_current_version()
+
+    try:
+        version_directory(version)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e))
+
+    try:
+        dataset = await reload_data(version, force=True)
+    except Exception as e:
+        LOG.exception(f'Could not load data version {version}')
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f'Could not load data version {version}: {e}')
+
+    if version is not None and version != read_current_version():
+        write_current_version(version)
+
+    return data_version(dataset)
+
+
+@app.get("/user", response_model=List[User])
+async def get_all_users(
+        request: Request,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        fields: Optional[str] = None,
+        output: str = Query('json', alias='format')
+):
+    return list_collection(
+        request, 'user', current_data().users, User, cursor, limit, fields,
+        output)
+
+
+@app.get("/user/{username}", response_model=User)
+async def get_user(username: str) -> User:
+    return find_user(username)
+
+
+@app.get("/user/{username}/topic", response_model=List[TopicDistribution])
+async def get_topics_by_username(request: Request, username: str):
+    username = find_user(username).username
+
+    return current_data().response_cache.respond(
+        request, ('user_topic', username), lambda: find_user_topics(username),
+        List[TopicDistribution])
+
+
+@app.get("/user/{username}/sentiment")
+async def get_sentiment_by_username(request: Request, username: str):
+    username = find_user(username).username
+
+    return current_data().response_cache.respond(
+        request, ('user_sentiment', username),
+        lambda: find_user_sentiment(username))
+
+
+@app.get("/user/{username}/word", response_model=List[WordsCounts])
+async def get_words_by_username(
+        request: Request,
+        username: str,
+        limit: int = 100
+):
     if limit < 1:
         raise HTTPException(
             status_code=status.HTTP_406_NOT_ACCEPTABLE,
             detail='Limit must be positive integer'
         )
-    elif username not in words_per_user.keys():
-        if username.lower() not in clients_words_counts.keys():
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail='User not found')
-        else:
-            return clients_words_counts[username.lower()][:limit]
-    else:
-        return words_per_user[username][:limit]
+
+    username = find_user(username).username
+
+    return current_data().response_cache.respond(
+        request, ('user_word', username, limit),
+        lambda: find_user_words(username, limit), List[WordsCounts])
 
 
 @app.get("/user/{username}/tweets", response_model=List[Tweet])
@@ -171,67 +579,104 @@ async def get_tweets_by_username(
         username: str,
         limit: int = 5,
         topic: Optional[int] = None,
-        sentiment: Optional[str] = None
+        sentiment: Optional[str] = None,
+        seed: Optional[int] = None
 ) -> List[Tweet]:
-    user = next((user for user in users if user.username == username), None)
-    client_user = next((user for user in clients_users
-                        if user.username == username.lower()), None)
+    data = current_data()
+
+    user = data.registry.get_user(username)
 
     if user is None:
-        if client_user is None:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail='User not found'
-            )
-        else:
-            user_tweets = await get_tweets_by_column(
-                column_name='username',
-                column_value=username.lower(),
-                limit=limit,
-                topic=topic,
-                sentiment=sentiment,
-                table='clients_tweets'
-            )
-            return user_tweets.apply(tweets_from_rows, axis=1).tolist() if len(
-                user_tweets) > 0 else []
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='User not found'
+        )
+    elif limit < 1:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail='Limit must be positive integer'
+        )
+    elif data.registry.is_client_user(username):
+        user_tweets = await get_tweets_by_column(
+            column_name='username',
+            column_value=username.lower(),
+            limit=limit,
+            topic=topic,
+            sentiment=sentiment,
+            table=CLIENTS_TWEETS_TABLE,
+            seed=seed
+        )
+        return user_tweets.apply(tweets_from_rows, axis=1).tolist() if len(
+            user_tweets) > 0 else []
     else:
         user_tweets = await get_tweets_by_column(
             column_name='username',
-            column_value=username,
+            column_value=user.username,
             limit=limit,
             topic=topic,
-            sentiment=sentiment
+            sentiment=sentiment,
+            seed=seed
         )
         return user_tweets.apply(tweets_from_rows, axis=1).tolist() if len(
             user_tweets) > 0 else []
 
 
+@app.get("/user/{username}/neighbors", response_model=List[User])
+async def get_user_neighbors(username: str, dimensions: int = 2, k: int = 10):
+    data = current_data()
+
+    user = data.registry.get_user(username)
+
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='User not found'
+        )
+    elif dimensions not in GRAPH_AXES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Dimensions must be 2 or 3'
+        )
+    elif k < 1:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail='K must be positive integer'
+        )
+    else:
+        return data.graph_index.neighbors(user, dimensions, k)
+
+
 @app.get("/user/{username}/photo", response_model=ProfileImage)
 async def get_user_photo(username: str):
-    user = next((user for user in users if user.username == username), None)
-    client_user = next((user for user in clients_users
-                        if user.username == username.lower()), None)
+    user = current_data().registry.get_user(username)
 
-    if user is None and client_user is None:
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User not found'
         )
     else:
-        url = get_profile_photo(twitterAPI, username)
+        url = await photo_cache.get(user.username)
 
         return {"url": url}
 
 
 @app.get("/party", response_model=List[Party])
-async def get_all_parties() -> List[Party]:
-    return parties
+async def get_all_parties(
+        request: Request,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        fields: Optional[str] = None,
+        output: str = Query('json', alias='format')
+):
+    return list_collection(
+        request, 'party', current_data().parties, Party, cursor, limit,
+        fields, output)
 
 
 @app.get("/party/{party_id}", response_model=Party)
 async def get_party(party_id: int) -> Party:
-    party = next((party for party in parties if party.party_id == party_id),
-                 None)
+    party = current_data().registry.get_party(party_id)
 
     if party is None:
         raise HTTPException(
@@ -242,41 +687,52 @@ async def get_party(party_id: int) -> Party:
 
 
 @app.get("/party/{party_id}/topic", response_model=List[TopicDistribution])
-async def get_topics_by_party(party_id: int):
-    topics_per_party = topics_dist['per_party']
+async def get_topics_by_party(request: Request, party_id: int):
+    data = current_data()
 
-    party = next((party for party in parties if party.party_id == party_id),
-                 None)
+    topics_per_party = data.topics_dist['per_party']
+
+    party = data.registry.get_party(party_id)
 
     if party is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='Party not found')
     else:
-        return topics_per_party[party.name]
+        return data.response_cache.respond(
+            request, ('party_topic', party_id),
+            lambda: topics_per_party[party.name], List[TopicDistribution])
 
 
 @app.get("/party/{party_id}/sentiment")
-async def get_sentiment_by_party(party_id: int):
-    sentiment_per_party = sentiment_dist['per_party']
+async def get_sentiment_by_party(request: Request, party_id: int):
+    data = current_data()
+
+    sentiment_per_party = data.sentiment_dist['per_party']
 
-    party = next((party for party in parties if party.party_id == party_id),
-                 None)
+    party = data.registry.get_party(party_id)
 
     if party is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='Party not found')
     else:
-        return sentiment_per_party[party.name]
+        return data.response_cache.respond(
+            request, ('party_sentiment', party_id),
+            lambda: sentiment_per_party[party.name])
 
 
 @app.get("/party/{party_id}/word", response_model=List[WordsCounts])
-async def get_words_by_party(party_id: int, limit: int = 100):
-    words_per_party = words_counts['per_party']
+async def get_words_by_party(
+        request: Request,
+        party_id: int,
+        limit: int = 100
+):
+    data = current_data()
+
+    words_per_party = data.words_counts['per_party']
 
-    party = next((party for party in parties if party.party_id == party_id),
-                 None)
+    party = data.registry.get_party(party_id)
 
     if party is None:
         raise HTTPException(
@@ -288,7 +744,9 @@ async def get_words_by_party(party_id: int, limit: int = 100):
             detail='Limit must be positive integer'
         )
     else:
-        return words_per_party[party.name][:limit]
+        return data.response_cache.respond(
+            request, ('party_word', party_id, limit),
+            lambda: words_per_party[party.name][:limit], List[WordsCounts])
 
 
 @app.get("/party/{party_id}/tweets", response_model=List[Tweet])
@@ -296,37 +754,50 @@ async def get_tweets_by_party(
         party_id: int,
         limit: int = 5,
         topic: Optional[int] = None,
-        sentiment: Optional[str] = None
+        sentiment: Optional[str] = None,
+        seed: Optional[int] = None
 ) -> List[Tweet]:
-    party = next((party for party in parties if party.party_id == party_id),
-                 None)
+    party = current_data().registry.get_party(party_id)
 
     if party is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User not found'
         )
+    elif limit < 1:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail='Limit must be positive integer'
+        )
     else:
         party_tweets = await get_tweets_by_column(
             column_name='party',
             column_value=party.name,
             limit=limit,
             topic=topic,
-            sentiment=sentiment
+            sentiment=sentiment,
+            seed=seed
         )
         return party_tweets.apply(tweets_from_rows, axis=1).tolist() if len(
             party_tweets) > 0 else []
 
 
 @app.get("/coalition", response_model=List[Coalition])
-async def get_all_coalitions() -> List[Coalition]:
-    return coalitions
+async def get_all_coalitions(
+        request: Request,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        fields: Optional[str] = None,
+        output: str = Query('json', alias='format')
+):
+    return list_collection(
+        request, 'coalition', current_data().coalitions, Coalition, cursor,
+        limit, fields, output)
 
 
 @app.get("/coalition/{coalition_id}", response_model=Coalition)
 async def get_coalition(coalition_id: int) -> Coalition:
-    coalition = next((coalition for coalition in coalitions if
-                      coalition.coalition_id == coalition_id), None)
+    coalition = current_data().registry.get_coalition(coalition_id)
 
     if coalition is None:
         raise HTTPException(
@@ -338,41 +809,53 @@ async def get_coalition(coalition_id: int) -> Coalition:
 
 @app.get("/coalition/{coalition_id}/topic",
          response_model=List[TopicDistribution])
-async def get_topics_by_coalition(coalition_id: int):
-    topics_per_coalition = topics_dist['per_coalition']
+async def get_topics_by_coalition(request: Request, coalition_id: int):
+    data = current_data()
+
+    topics_per_coalition = data.topics_dist['per_coalition']
 
-    coalition = next((coalition for coalition in coalitions if
-                      coalition.coalition_id == coalition_id), None)
+    coalition = data.registry.get_coalition(coalition_id)
 
     if coalition is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='Party not found')
     else:
-        return topics_per_coalition[coalition.name]
+        return data.response_cache.respond(
+            request, ('coalition_topic', coalition_id),
+            lambda: topics_per_coalition[coalition.name],
+            List[TopicDistribution])
 
 
 @app.get("/coalition/{coalition_id}/sentiment")
-async def get_sentiment_by_coalition(coalition_id: int):
-    sentiment_per_coalition = sentiment_dist['per_coalition']
+async def get_sentiment_by_coalition(request: Request, coalition_id: int):
+    data = current_data()
+
+    sentiment_per_coalition = data.sentiment_dist['per_coalition']
 
-    coalition = next((coalition for coalition in coalitions if
-                      coalition.coalition_id == coalition_id), None)
+    coalition = data.registry.get_coalition(coalition_id)
 
     if coalition is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='Party not found')
     else:
-        return sentiment_per_coalition[coalition.name]
+        return data.response_cache.respond(
+            request, ('coalition_sentiment', coalition_id),
+            lambda: sentiment_per_coalition[coalition.name])
 
 
 @app.get("/coalition/{coalition_id}/word", response_model=List[WordsCounts])
-async def get_words_by_coalition(coalition_id: int, limit: int = 100):
-    words_per_coalition = words_counts['per_coalition']
+async def get_words_by_coalition(
+        request: Request,
+        coalition_id: int,
+        limit: int = 100
+):
+    data = current_data()
+
+    words_per_coalition = data.words_counts['per_coalition']
 
-    coalition = next((coalition for coalition in coalitions if
-                      coalition.coalition_id == coalition_id), None)
+    coalition = data.registry.get_coalition(coalition_id)
 
     if coalition is None:
         raise HTTPException(
@@ -384,7 +867,10 @@ async def get_words_by_coalition(coalition_id: int, limit: int = 100):
             detail='Limit must be positive integer'
         )
     else:
-        return words_per_coalition[coalition.name][:limit]
+        return data.response_cache.respond(
+            request, ('coalition_word', coalition_id, limit),
+            lambda: words_per_coalition[coalition.name][:limit],
+            List[WordsCounts])
 
 
 @app.get("/coalition/{coalition_id}/tweets", response_model=List[Tweet])
@@ -392,50 +878,67 @@ async def get_tweets_by_coalition(
         coalition_id: int,
         limit: int = 5,
         topic: Optional[int] = None,
-        sentiment: Optional[str] = None
+        sentiment: Optional[str] = None,
+        seed: Optional[int] = None
 ) -> List[Tweet]:
-    coalition = next((coalition for coalition in coalitions if
-                      coalition.coalition_id == coalition_id), None)
+    coalition = current_data().registry.get_coalition(coalition_id)
 
     if coalition is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User not found'
         )
+    elif limit < 1:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail='Limit must be positive integer'
+        )
     else:
         coalition_tweets = await get_tweets_by_column(
             column_name='coalition',
             column_value=coalition.name,
             limit=limit,
             topic=topic,
-            sentiment=sentiment
+            sentiment=sentiment,
+            seed=seed
         )
         return coalition_tweets.apply(tweets_from_rows, axis=1).tolist() if len(
             coalition_tweets) > 0 else []
 
 
 @app.get("/topic")
-async def get_topics() -> List[int]:
-    topics = words_per_topic.keys()
+async def get_topics(request: Request):
+    data = current_data()
 
-    return list(topics)
+    return data.response_cache.respond(
+        request, ('topic',), lambda: list(data.words_per_topic.keys()))
 
 
 @app.get("/topic/{topic_id}/sentiment")
-async def get_sentiment_by_topic(topic_id: int):
-    sentiment_per_topic = sentiment_dist['per_topic']
+async def get_sentiment_by_topic(request: Request, topic_id: int):
+    data = current_data()
+
+    sentiment_per_topic = data.sentiment_dist['per_topic']
 
     if topic_id not in sentiment_per_topic.keys():
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User not found')
     else:
-        return sentiment_per_topic[topic_id]
+        return data.response_cache.respond(
+            request, ('topic_sentiment', topic_id),
+            lambda: sentiment_per_topic[topic_id])
 
 
 @app.get("/topic/{topic_id}/word", response_model=List[WordsCounts])
-async def get_words_by_topic(topic_id: int, limit: int = 100):
-    if topic_id not in words_per_topic.keys():
+async def get_words_by_topic(
+        request: Request,
+        topic_id: int,
+        limit: int = 100
+):
+    data = current_data()
+
+    if topic_id not in data.words_per_topic.keys():
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User not found')
@@ -445,12 +948,15 @@ async def get_words_by_topic(topic_id: int, limit: int = 100):
             detail='Limit must be positive integer'
         )
     else:
-        return words_per_topic[topic_id][:limit]
+        return data.response_cache.respond(
+            request, ('topic_word', topic_id, limit),
+            lambda: data.words_per_topic[topic_id][:limit],
+            List[WordsCounts])
 
 
 @app.get("/topic/{topic_id}/tweets", response_model=List[Tweet])
 async def get_tweets_by_topic(topic_id: int, limit: int = 5):
-    if topic_id not in words_per_topic.keys():
+    if topic_id not in current_data().words_per_topic.keys():
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User not found')
@@ -470,191 +976,451 @@ async def get_tweets_by_topic(topic_id: int, limit: int = 5):
             topic_tweets) > 0 else []
 
 
-# def get_response(curr_status: str, text: str) -> Dict[str, str]:
-#     return {
-#         "status": curr_status,
-#         "text": text
-#     }
-#
-#
-# async def download_tweets(username: str) -> pd.DataFrame:
-#     tweets_getting = signature('get_tweets', args=(username,),
-#                                options={'queue': 'tweets'}).delay()
-#
-#     while not tweets_getting.ready():
-#         await asyncio.sleep(2)
-#
-#     if tweets_getting.failed():
-#         raise WrongUsernameException()
-#     else:
-#         return tweets_getting.get()
-#
-#
-# async def analyze(tweets: pd.DataFrame):
-#     cleaning = signature('clean', args=(tweets,),
-#                          options={'queue': 'cleaning'}).delay()
-#
-#     while not cleaning.ready():
-#         await asyncio.sleep(1)
-#
-#     cleaned = cleaning.get()
-#
-#     if len(cleaned) == 0:
-#         raise NoTweetsLeftException()
-#
-#     await asyncio.sleep(1)
-#
-#     lemmatization = chain(
-#         signature('lemmatize', args=(cleaned,), options={'queue': 'cleaning'}),
-#         signature('stopwords', options={'queue': 'cleaning'})
-#     ).delay()
-#
-#     emoji_removal = signature('emoji', args=(cleaned,),
-#                               options={'queue': 'cleaning'}).delay()
-#
-#     emb_calc = signature('embedding', args=(cleaned, ),
-#                          options={'queue': 'embedding'}).delay()
-#
-#     while not emoji_removal.ready():
-#         await asyncio.sleep(1)
-#
-#     emojied = emoji_removal.get()
-#
-#     sentiment = signature('sentiment', args=(emojied, ),
-#                           options={'queue': 'processing'}).delay()
-#
-#     while not lemmatization.ready():
-#         await asyncio.sleep(1)
-#
-#     lemmas_df = lemmatization.get()
-#
-#     topics = signature('topics', args=(lemmas_df, ),
-#                        options={'queue': 'processing'}).delay()
-#
-#     words = signature('words', args=(lemmas_df,),
-#                       options={'queue': 'processing'}).delay()
-#
-#     while not words.ready():
-#         await asyncio.sleep(1)
-#
-#     words_dict = words.get()
-#
-#     while not topics.ready():
-#         await asyncio.sleep(1)
-#
-#     topics_df, topics_distribution = topics.get()
-#
-#     while not sentiment.ready():
-#         await asyncio.sleep(1)
-#
-#     sentiment_df, sentiment_distribution = sentiment.get()
-#
-#     while not emb_calc.ready():
-#         await asyncio.sleep(1)
-#
-#     emb_res = emb_calc.get()
-#
-#     graph = signature('graph', options={'queue': 'processing'}).delay(emb_res)
-#
-#     clustering = signature('clustering', args=(emb_res, ),
-#                            options={'queue': 'processing'}).delay()
-#
-#     while not clustering.ready() and not graph.ready():
-#         await asyncio.sleep(1)
-#
-#     clustering_res = clustering.get()
-#     graph_res = graph.get()
-#
-#     return clustering_res, graph_res, len(cleaned), topics_df, topics_distribution, sentiment_df, sentiment_distribution, words_dict
-#
-#
-# @app.websocket("/new")
-# async def analyze_new_username(websocket: WebSocket):
-#     await websocket.accept()
-#
-#     username = await websocket.receive_text()
-#
-#     username = username.lower()
-#
-#     try:
-#         if username in [user.username.lower() for user in users + clients_users]:
-#             await websocket.send_json(
-#                 get_response(STATUS_ERROR,
-#                              "This account is already available"))
-#             await websocket.close()
-#         else:
-#             await websocket.send_json(
-#                 get_response(STATUS_OK,
-#                              f"Collecting tweets from {username} account"))
-#
-#             await asyncio.sleep(1)
-#
-#             tweets = await download_tweets(username)
-#
-#             if len(tweets) == 0:
-#                 await websocket.send_json(
-#                     get_response(STATUS_ERROR,
-#                                  f"No tweets found for {username} account")
-#                 )
-#                 await websocket.close()
-#             else:
-#                 await websocket.send_json(
-#                     get_response(STATUS_OK,
-#                                  f"Analyzing tweets for {username}"))
-#
-#                 await asyncio.sleep(1)
-#
-#                 cluster, graph, tweets_count, topics, topics_distribution, sentiment, sentiment_distribution, words = await analyze(tweets)
-#
-#                 user = User(
-#                     username=username,
-#                     party=None,
-#                     coalition=None,
-#                     role=None,
-#                     name=None,
-#                     tweets_count=tweets_count,
-#                     x_graph2d=graph['2D_x'],
-#                     y_graph2d=graph['2D_y'],
-#                     x_graph3d=graph['3D_x'],
-#                     y_graph3d=graph['3D_y'],
-#                     z_graph3d=graph['3D_z'],
-#                     cluster_mean_shift_id=cluster['mean_shift_cluster'],
-#                     cluster_kmeans_id=cluster['kmeans_cluster'],
-#                     cluster_gmm_id=cluster['gmm_cluster']
-#                 )
-#                 clients_users.append(user)
-#
-#                 clients_topic_dist[username] = topics_distribution
-#                 client_sentiment_dist[username] = sentiment_distribution
-#                 clients_words_counts[username] = words
-#
-#                 full_df = tweets.merge(topics, on='id', how='right')
-#                 full_df = full_df.merge(sentiment, on='id', how='right')
-#                 full_df.loc[:, 'username'] = full_df['username'].apply(str.lower)
-#                 full_df.to_sql('clients_tweets', db_engine, if_exists='append')
-#
-#                 await websocket.send_json(
-#                     get_response(STATUS_OK,
-#                                  f'Finished for {username}')
-#                 )
-#
-#                 await websocket.close()
-#     except WrongUsernameException:
-#         await websocket.send_json(
-#             get_response(STATUS_ERROR,
-#                          f"Can't find {username} account")
-#         )
-#         await websocket.close()
-#     except NoTweetsLeftException:
-#         await websocket.send_json(
-#             get_response(STATUS_ERROR,
-#                          f"No tweets found for {username} account")
-#         )
-#         await websocket.close()
-#     # except Exception as e:
-#     #     # FIXME - this one needs fixing,
-#     #     #  but I don't know how to cache exception while in await state :(
-#     #     #  Should just catch WebSocketDisconnect
-#     #     # TODO - try to find a way to stop running task on disconnection
-#     #     print(e)
-#     #     print("disconnected")
+@app.get("/graph/{dimensions}/viewport", response_model=GraphViewport)
+async def get_graph_viewport(
+        dimensions: int,
+        x_min: Optional[float] = None,
+        x_max: Optional[float] = None,
+        y_min: Optional[float] = None,
+        y_max: Optional[float] = None,
+        z_min: Optional[float] = None,
+        z_max: Optional[float] = None,
+        limit: Optional[int] = 1000
+):
+    """Users inside the box, thinned out to `limit` users when zoomed out."""
+    if dimensions not in GRAPH_AXES:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Graph not found')
+    elif limit is not None and limit < 1:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail='Limit must be positive integer'
+        )
+
+    bounds = [(x_min, x_max), (y_min, y_max), (z_min, z_max)][:dimensions]
+    lower = [-np.inf if low is None else low for low, _ in bounds]
+    upper = [np.inf if high is None else high for _, high in bounds]
+
+    total, selected = current_data().graph_index.viewport(
+        dimensions, lower, upper, limit)
+
+    return GraphViewport(total=total, users=selected)
+
+
+@app.get("/tweets/search", response_model=List[Tweet])
+async def search_tweets_by_text(
+        q: str,
+        username: Optional[str] = None,
+        party_id: Optional[int] = None,
+        coalition_id: Optional[int] = None,
+        topic: Optional[int] = None,
+        sentiment: Optional[str] = None,
+        limit: int = 20
+) -> List[Tweet]:
+    """Tweets containing all words of `q`, most relevant first."""
+    data = current_data()
+
+    if limit < 1:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail='Limit must be positive integer'
+        )
+
+    filters = {}
+    tables = ['tweets', CLIENTS_TWEETS_TABLE]
+
+    if username is not None:
+        user = data.registry.get_user(username)
+
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='User not found')
+        elif data.registry.is_client_user(username):
+            filters['username'] = username.lower()
+            tables = [CLIENTS_TWEETS_TABLE]
+        else:
+            filters['username'] = user.username
+            tables = ['tweets']
+
+    if party_id is not None:
+        party = data.registry.get_party(party_id)
+
+        if party is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='Party not found')
+        filters['party'] = party.name
+        tables = [table for table in tables if table == 'tweets']
+
+    if coalition_id is not None:
+        coalition = data.registry.get_coalition(coalition_id)
+
+        if coalition is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='Coalition not found')
+        filters['coalition'] = coalition.name
+        tables = [table for table in tables if table == 'tweets']
+
+    if topic is not None:
+        filters['topic'] = topic
+
+    databases = {
+        'tweets': (data.tweets_db, data.searchable),
+        CLIENTS_TWEETS_TABLE: (clients.tweets_db, clients.searchable)
+    }
+    queries = [
+        databases[table][0].run(
+            search_tweets, q, filters, limit, sentiment, table)
+        for table in tables if databases[table][1]
+    ]
+
+    try:
+        frames = await asyncio.gather(*queries)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    if not frames:
+        return []
+
+    found = pd.concat(frames, ignore_index=True) \
+        .sort_values('rank', kind='stable').head(limit)
+
+    return found.apply(tweets_from_rows, axis=1).tolist() if len(
+        found) > 0 else []
+
+
+def find_cluster(method: str, cluster_id: int) -> ClusterAggregate:
+    if method not in CLUSTER_METHODS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Clustering method not found')
+
+    cluster = current_data().clusters.get_cluster(method, cluster_id)
+
+    if cluster is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Cluster not found')
+    else:
+        return cluster
+
+
+def cluster_from_aggregate(cluster: ClusterAggregate) -> Cluster:
+    return Cluster(
+        method=cluster.method,
+        cluster_id=cluster.cluster_id,
+        users_count=len(cluster),
+        usernames=cluster.usernames
+    )
+
+
+@app.get("/cluster/{method}", response_model=List[Cluster])
+async def get_all_clusters(method: str):
+    method_clusters = current_data().clusters.get_clusters(method)
+
+    if method_clusters is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Clustering method not found')
+    else:
+        return [cluster_from_aggregate(cluster) for cluster in method_clusters]
+
+
+@app.get("/cluster/{method}/{cluster_id}", response_model=Cluster)
+async def get_cluster(method: str, cluster_id: int):
+    return cluster_from_aggregate(find_cluster(method, cluster_id))
+
+
+# Cluster keys include the member count, so entries cached before a client
+# user joined the cluster are never served again.
+@app.get("/cluster/{method}/{cluster_id}/topic",
+         response_model=List[TopicDistribution])
+async def get_topics_by_cluster(request: Request, method: str, cluster_id: int):
+    cluster = find_cluster(method, cluster_id)
+
+    return current_data().response_cache.respond(
+        request, ('cluster_topic', method, cluster_id, len(cluster)),
+        cluster.topics, List[TopicDistribution])
+
+
+@app.get("/cluster/{method}/{cluster_id}/sentiment")
+async def get_sentiment_by_cluster(
+        request: Request,
+        method: str,
+        cluster_id: int
+):
+    cluster = find_cluster(method, cluster_id)
+
+    return current_data().response_cache.respond(
+        request, ('cluster_sentiment', method, cluster_id, len(cluster)),
+        cluster.sentiment)
+
+
+@app.get("/cluster/{method}/{cluster_id}/word",
+         response_model=List[WordsCounts])
+async def get_words_by_cluster(
+        request: Request,
+        method: str,
+        cluster_id: int,
+        limit: int = 100
+):
+    data = current_data()
+
+    cluster = find_cluster(method, cluster_id)
+
+    if limit < 1:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail='Limit must be positive integer'
+        )
+    else:
+        return data.response_cache.respond(
+            request, ('cluster_word', method, cluster_id, len(cluster), limit),
+            lambda: data.clusters.get_words(method, cluster_id)[:limit],
+            List[WordsCounts])
+
+
+def find_group_aspects(
+        group: str,
+        name: str,
+        aspects: List[str],
+        words_limit: int
+) -> BatchEntity:
+    data = current_data()
+
+    entity = BatchEntity()
+
+    if 'topic' in aspects:
+        entity.topic = data.topics_dist[group][name]
+    if 'sentiment' in aspects:
+        entity.sentiment = data.sentiment_dist[group][name]
+    if 'word' in aspects:
+        entity.word = data.words_counts[group][name][:words_limit]
+
+    return entity
+
+
+@app.post("/batch", response_model=BatchResponse,
+          response_model_exclude_none=True)
+async def get_batch(batch: BatchRequest):
+    data = current_data()
+
+    if batch.words_limit < 1 or batch.tweets_limit < 1:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail='Limit must be positive integer'
+        )
+
+    batch_users = {}
+    for username in batch.usernames:
+        user = data.registry.get_user(username)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f'User not found: {username}')
+        batch_users[username] = user
+
+    batch_parties = []
+    for party_id in batch.party_ids:
+        party = data.registry.get_party(party_id)
+        if party is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f'Party not found: {party_id}')
+        batch_parties.append(party)
+
+    batch_coalitions = []
+    for coalition_id in batch.coalition_ids:
+        coalition = data.registry.get_coalition(coalition_id)
+        if coalition is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f'Coalition not found: {coalition_id}')
+        batch_coalitions.append(coalition)
+
+    response = BatchResponse()
+
+    for username, user in batch_users.items():
+        entity = response.users[username] = BatchEntity()
+
+        if 'topic' in batch.aspects:
+            entity.topic = find_user_topics(user.username)
+        if 'sentiment' in batch.aspects:
+            entity.sentiment = find_user_sentiment(user.username)
+        if 'word' in batch.aspects:
+            entity.word = find_user_words(user.username, batch.words_limit)
+
+    for party in batch_parties:
+        response.parties[party.party_id] = find_group_aspects(
+            'per_party', party.name, batch.aspects, batch.words_limit)
+
+    for coalition in batch_coalitions:
+        response.coalitions[coalition.coalition_id] = find_group_aspects(
+            'per_coalition', coalition.name, batch.aspects, batch.words_limit)
+
+    if 'tweets' in batch.aspects:
+        client_usernames = {
+            username: username.lower() for username in batch_users
+            if data.registry.is_client_user(username)
+        }
+
+        selected = await get_tweets_by_columns(
+            values_by_column={
+                'username': [
+                    user.username for username, user in batch_users.items()
+                    if username not in client_usernames
+                ],
+                'party': [party.name for party in batch_parties],
+                'coalition': [coalition.name for coalition in batch_coalitions]
+            },
+            client_usernames=list(client_usernames.values()),
+            limit=batch.tweets_limit,
+            sentiment=batch.sentiment,
+            topic=batch.topic,
+            seed=batch.seed
+        )
+
+        tweets = {
+            entity: rows.apply(tweets_from_rows, axis=1).tolist()
+            for entity, rows in selected.groupby(
+                ['entity_column', 'entity_value'])
+        }
+
+        for username, user in batch_users.items():
+            response.users[username].tweets = tweets.get(
+                ('username', client_usernames.get(username, user.username)), [])
+        for party in batch_parties:
+            response.parties[party.party_id].tweets = tweets.get(
+                ('party', party.name), [])
+        for coalition in batch_coalitions:
+            response.coalitions[coalition.coalition_id].tweets = tweets.get(
+                ('coalition', coalition.name), [])
+
+    return response
+
+
+def get_response(curr_status: str, text: str) -> Dict[str, str]:
+    return {
+        "status": curr_status,
+        "text": text
+    }
+
+
+async def analyze(
+        tweets: pd.DataFrame,
+        websocket: WebSocket
+) -> Dict[str, Any]:
+    """Results of the analysis by stage, reported as each stage finishes."""
+    results = {}
+    run = analyse_tweets(tweets)
+
+    try:
+        async for stage, result in run:
+            if stage == 'clean' and len(result) == 0:
+                raise NoTweetsLeftException()
+
+            results[stage] = result
+            await websocket.send_json(
+                get_response(STATUS_OK,
+                             f'{STAGE_MESSAGES[stage]} '
+                             f'({len(results)}/{len(run)})'))
+    finally:
+        # revokes the remaining stages when the client has gone away
+        run.cancel()
+
+    return results
+
+
+async def analyze_new_username(websocket: WebSocket):
+    await websocket.accept()
+
+    username = await websocket.receive_text()
+
+    username = username.lower()
+
+    try:
+        if current_data().registry.get_user(username) is not None:
+            await websocket.send_json(
+                get_response(STATUS_ERROR,
+                             "This account is already available"))
+            await websocket.close()
+            return
+
+        await websocket.send_json(
+            get_response(STATUS_OK,
+                         f"Collecting tweets from {username} account"))
+
+        try:
+            tweets = await download_tweets(username)
+        except Exception as e:
+            LOG.warning(f'Could not collect tweets of {username}: {e}')
+            raise WrongUsernameException()
+
+        if len(tweets) == 0:
+            raise NoTweetsLeftException()
+
+        await websocket.send_json(
+            get_response(STATUS_OK,
+                         f"Analyzing tweets for {username}"))
+
+        results = await analyze(tweets, websocket)
+        topics, topics_distribution = results['topics']
+        sentiment, sentiment_distribution = results['sentiment']
+        graph = results['graph']
+        cluster = results['clustering']
+
+        user = User(
+            username=username,
+            party=None,
+            coalition=None,
+            role=None,
+            name=None,
+            tweets_count=len(results['clean']),
+            x_graph2d=graph['2D_x'],
+            y_graph2d=graph['2D_y'],
+            x_graph3d=graph['3D_x'],
+            y_graph3d=graph['3D_y'],
+            z_graph3d=graph['3D_z'],
+            cluster_mean_shift_id=cluster['mean_shift_cluster'],
+            cluster_kmeans_id=cluster['kmeans_cluster'],
+            cluster_gmm_id=cluster['gmm_cluster']
+        )
+        full_df = tweets.merge(topics, on='id', how='right')
+        full_df = full_df.merge(sentiment, on='id', how='right')
+        full_df.loc[:, 'username'] = full_df['username'].apply(str.lower)
+        # the tweets are in place before any worker can find the account
+        await store_client_tweets(full_df)
+
+        await add_client_user(
+            user, topics_distribution, sentiment_distribution,
+            results['words'])
+
+        await websocket.send_json(
+            get_response(STATUS_OK,
+                         f'Finished for {username}')
+        )
+
+        await websocket.close()
+    except WrongUsernameException:
+        await websocket.send_json(
+            get_response(STATUS_ERROR,
+                         f"Can't find {username} account")
+        )
+        await websocket.close()
+    except NoTweetsLeftException:
+        await websocket.send_json(
+            get_response(STATUS_ERROR,
+                         f"No tweets found for {username} account")
+        )
+        await websocket.close()
+
+
+# needs the Celery workers, see ANALYSIS_ENABLED
+if ANALYSIS_ENABLED:
+    app.add_api_websocket_route("/new", analyze_new_username)
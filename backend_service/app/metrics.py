@@ -0,0 +1,456 @@
+"""Counters and histograms exposed in the Prometheus text format.
+
+Recording a value is a dict lookup and a few additions under a lock, all
+formatting happens only when `/metrics` is scraped.
+
+Every process counts on its own. With `METRICS_DIRECTORY` set, e.g. by the
+gunicorn config, each worker also writes its values to a file there every
+`METRICS_FLUSH_INTERVAL` seconds, and `/metrics` answers with the values
+of all workers merged: counters and histograms are summed, gauges are the
+maximum over the live workers. Without it a scrape only sees the worker
+that served it.
+"""
+
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, \
+    Tuple, TypeVar
+
+from settings import METRICS_DIRECTORY, METRICS_FLUSH_INTERVAL
+
+T = TypeVar('T')
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+    10.0
+)
+
+# starlette appends the charset to text media types
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+
+    escaped = (
+        str(value).replace('\\', '\\\\').replace('"', '\\"')
+        .replace('\n', '\\n')
+        for value in values
+    )
+
+    return '{' + ','.join(
+        f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(ABC):
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str,
+                 labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    @abstractmethod
+    def snapshot(self) -> Dict[Tuple[str, ...], Any]:
+        """Values of this process, as written to the metrics file."""
+
+    @abstractmethod
+    def merge(self, snapshots: List[Dict[Tuple[str, ...], Any]],
+              live: List[bool]) -> Dict[Tuple[str, ...], Any]:
+        """Values of several processes, `live` tells which still run."""
+
+    @abstractmethod
+    def samples(self, values: Dict[Tuple[str, ...], Any]) -> Iterator[str]:
+        """Lines of the text format for `values`."""
+
+    def clear(self):
+        pass
+
+    def render(self, values: Optional[Dict[Tuple[str, ...], Any]] = None
+               ) -> str:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}'
+        ]
+        lines.extend(self.samples(
+            self.snapshot() if values is None else values))
+
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str,
+                 labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    snapshot = values
+
+    def merge(self, snapshots: List[Dict[Tuple[str, ...], float]],
+              live: List[bool]) -> Dict[Tuple[str, ...], float]:
+        merged: Dict[Tuple[str, ...], float] = {}
+
+        for values in snapshots:
+            for key, value in values.items():
+                merged[key] = merged.get(key, 0) + value
+
+        return merged
+
+    def samples(self, values: Dict[Tuple[str, ...], float]) -> Iterator[str]:
+        for key, value in values.items():
+            yield f'{self.name}{format_labels(self.labels, key)} ' \
+                  f'{format_value(value)}'
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = value
+
+    def merge(self, snapshots: List[Dict[Tuple[str, ...], float]],
+              live: List[bool]) -> Dict[Tuple[str, ...], float]:
+        merged: Dict[Tuple[str, ...], float] = {}
+
+        for values, running in zip(snapshots, live):
+            if running:
+                for key, value in values.items():
+                    merged[key] = max(merged.get(key, value), value)
+
+        return merged
+
+    def clear(self):
+        # set once, e.g. while loading, and inherited by forked workers
+        pass
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str,
+                 labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label values: count of every bucket plus +Inf, and the sum
+        self._values: Dict[
+            Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        position = bisect_left(self.buckets, value)
+
+        with self._lock:
+            entry = self._values.get(key)
+
+            if entry is None:
+                entry = ([0] * (len(self.buckets) + 1), [0.0])
+                self._values[key] = entry
+
+            entry[0][position] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+
+        return 0 if entry is None else sum(entry[0])
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Tuple[List[int], float]]:
+        with self._lock:
+            return {
+                key: (list(counts), total[0])
+                for key, (counts, total) in self._values.items()
+            }
+
+    def merge(self, snapshots: List[Dict[Tuple[str, ...], Any]],
+              live: List[bool]
+              ) -> Dict[Tuple[str, ...], Tuple[List[int], float]]:
+        merged: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+
+        for values in snapshots:
+            for key, (counts, total) in values.items():
+                merged_counts, merged_total = merged.get(
+                    key, ([0] * len(counts), 0.0))
+                merged[key] = (
+                    [a + b for a, b in zip(merged_counts, counts)],
+                    merged_total + total)
+
+        return merged
+
+    def samples(self, values: Dict[Tuple[str, ...], Any]) -> Iterator[str]:
+        names = self.labels + ('le',)
+
+        for key, (counts, total) in values.items():
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = format_labels(names, key + (format_value(bound),))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+
+            labels = format_labels(self.labels, key)
+            yield f'{self.name}_sum{labels} {format_value(total)}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+def process_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+class MetricsRegistry:
+    def __init__(self, directory: Optional[str] = METRICS_DIRECTORY,
+                 flush_interval: float = METRICS_FLUSH_INTERVAL):
+        self._metrics: List[Metric] = []
+        self._directory = directory
+        self._flush_interval = flush_interval
+        self._flusher_pid: Optional[int] = None
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+
+        return metric
+
+    def reset_after_fork(self):
+        """Drop the counts a forked worker inherited, keep the gauges."""
+        for metric in self._metrics:
+            metric.clear()
+
+    def flush(self):
+        if self._directory is None:
+            return
+
+        pid = os.getpid()
+        path = os.path.join(self._directory, f'{pid}.json')
+        snapshot = {
+            metric.name: [
+                [list(key), value]
+                for key, value in metric.snapshot().items()
+            ]
+            for metric in self._metrics
+        }
+
+        os.makedirs(self._directory, exist_ok=True)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(f'{path}.tmp', path)
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(self._flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def start_flushing(self):
+        """Keep writing this process's values for the other workers."""
+        if self._directory is None or self._flusher_pid == os.getpid():
+            return
+
+        self._flusher_pid = os.getpid()
+        threading.Thread(
+            target=self._flush_forever, name='metrics-flush',
+            daemon=True).start()
+
+    def _read_snapshots(self) -> List[Tuple[bool, Dict[str, List]]]:
+        snapshots = []
+
+        for name in os.listdir(self._directory):
+            if not name.endswith('.json'):
+                continue
+
+            try:
+                with open(os.path.join(self._directory, name)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+
+            snapshots.append(
+                (process_running(int(name[:-len('.json')])), snapshot))
+
+        return snapshots
+
+    def render(self) -> str:
+        if self._directory is None:
+            return '\n'.join(
+                metric.render() for metric in self._metrics) + '\n'
+
+        self.flush()
+        snapshots = self._read_snapshots()
+        live = [running for running, _ in snapshots]
+        rendered = []
+
+        for metric in self._metrics:
+            values = [
+                {tuple(key): value for key, value in snapshot.get(
+                    metric.name, [])}
+                for _, snapshot in snapshots
+            ]
+            rendered.append(metric.render(metric.merge(values, live)))
+
+        return '\n'.join(rendered) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'http_request_duration_seconds',
+    'Time spent handling requests, by route template.',
+    ('method', 'route', 'status')))
+DB_QUERY_DURATION = REGISTRY.register(Histogram(
+    'tweets_query_duration_seconds',
+    'Time spent running tweets queries.',
+    ('query',)))
+DB_QUERY_ROWS = REGISTRY.register(Counter(
+    'tweets_query_rows_total',
+    'Rows returned by tweets queries.',
+    ('query',)))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'cache_requests_total',
+    'Cache lookups by cache and result (hit or miss).',
+    ('cache', 'result')))
+OUTBOUND_DURATION = REGISTRY.register(Histogram(
+    'outbound_request_duration_seconds',
+    'Time spent in calls to external services.',
+    ('service', 'operation', 'outcome')))
+STARTUP_PHASE_DURATION = REGISTRY.register(Gauge(
+    'startup_phase_duration_seconds',
+    'Time spent in each data loading phase at startup.',
+    ('phase',)))
+DATA_RELOADS = REGISTRY.register(Counter(
+    'data_reloads_total',
+    'Reloads of the data set, by outcome.',
+    ('outcome',)))
+DATA_SETS_LOADED = REGISTRY.register(Gauge(
+    'data_sets_loaded',
+    'Loaded data sets, including retired ones still serving requests.'))
+
+
+def startup_phase(load: Callable[..., T], *args, **kwargs) -> T:
+    """Call `load`, recording its duration under its function name."""
+    start = time.perf_counter()
+
+    try:
+        return load(*args, **kwargs)
+    finally:
+        STARTUP_PHASE_DURATION.set(
+            time.perf_counter() - start, phase=load.__name__)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request.
+
+    Requests are labelled with the path template of the matched route,
+    e.g. `/user/{username}`, so the number of series stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: Dict[Callable, str] = {}
+
+    def _route_path(self, scope) -> str:
+        endpoint = scope.get('endpoint')
+
+        if endpoint is None:
+            return 'unmatched'
+
+        path = self._route_paths.get(endpoint)
+
+        if path is None:
+            router = scope['app'].router
+            self._route_paths.update(
+                (route.endpoint, route.path) for route in router.routes
+                if hasattr(route, 'endpoint'))
+            path = self._route_paths.get(endpoint, 'unmatched')
+
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        REGISTRY.start_flushing()
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                method=scope['method'],
+                route=self._route_path(scope),
+                status=str(status))
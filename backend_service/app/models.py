@@ -1,6 +1,8 @@
-from typing import Optional
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, conlist
+
+from settings import BATCH_MAX_ENTITIES
 
 
 class User(BaseModel):
@@ -31,6 +33,13 @@ class Coalition(BaseModel):
     name: str
 
 
+class Cluster(BaseModel):
+    method: str
+    cluster_id: int
+    users_count: int
+    usernames: List[str]
+
+
 class Tweet(BaseModel):
     tweet_id: int
     twitter_link: str
@@ -39,3 +48,16 @@ class Tweet(BaseModel):
     topic: int
     topic_proba: float
     sentiment: str
+
+
+class BatchRequest(BaseModel):
+    usernames: conlist(str, max_items=BATCH_MAX_ENTITIES) = []
+    party_ids: conlist(int, max_items=BATCH_MAX_ENTITIES) = []
+    coalition_ids: conlist(int, max_items=BATCH_MAX_ENTITIES) = []
+    aspects: List[Literal['topic', 'sentiment', 'word', 'tweets']] = [
+        'topic', 'sentiment', 'word', 'tweets']
+    words_limit: int = 100
+    tweets_limit: int = 5
+    topic: Optional[int] = None
+    sentiment: Optional[str] = None
+    seed: Optional[int] = None
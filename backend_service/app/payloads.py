@@ -0,0 +1,73 @@
+"""Celery serializer sending data frames as Arrow IPC streams.
+
+Messages and results are pickled as before, except for pandas data frames,
+which are written as compressed Arrow streams. Text columns take a fraction
+of their pickled size and numeric ones are read back without conversion.
+Data frames Arrow cannot represent, e.g. with mixed types in one column,
+fall back to pickle. The backend and every worker register the serializer,
+a message can be read whichever of them sent it.
+
+Both services keep an identical copy of this module, which the backend
+tests check.
+"""
+
+import io
+import pickle
+
+import pandas as pd
+from kombu.serialization import register
+
+ARROW_SERIALIZER = 'arrow'
+ARROW_CONTENT_TYPE = 'application/x-python-arrow'
+ARROW_COMPRESSION = 'zstd'
+
+
+def frame_to_arrow(df: pd.DataFrame) -> bytes:
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df)
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression=ARROW_COMPRESSION)
+
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+
+    return sink.getvalue().to_pybytes()
+
+
+def arrow_to_frame(data: bytes) -> pd.DataFrame:
+    import pyarrow as pa
+
+    return pa.ipc.open_stream(pa.py_buffer(data)).read_all().to_pandas()
+
+
+class ArrowPickler(pickle.Pickler):
+    def persistent_id(self, obj):
+        if not isinstance(obj, pd.DataFrame):
+            return None
+
+        try:
+            return frame_to_arrow(obj)
+        except (TypeError, ValueError, NotImplementedError):
+            # pyarrow errors derive from these, the frame gets pickled
+            return None
+
+
+class ArrowUnpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        return arrow_to_frame(pid)
+
+
+def dumps(obj) -> bytes:
+    buffer = io.BytesIO()
+    ArrowPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(obj)
+
+    return buffer.getvalue()
+
+
+def loads(data: bytes):
+    return ArrowUnpickler(io.BytesIO(data)).load()
+
+
+register(ARROW_SERIALIZER, dumps, loads,
+         content_type=ARROW_CONTENT_TYPE, content_encoding='binary')
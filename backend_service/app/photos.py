@@ -0,0 +1,143 @@
+"""Cache for profile photo URLs fetched from Twitter."""
+
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from metrics import record_cache
+from settings import PHOTO_CACHE_PATH, PHOTO_CACHE_SAVE_DELAY, \
+    PHOTO_CACHE_SIZE, PHOTO_CACHE_TTL
+
+LOG = logging.getLogger('BACKEND')
+
+
+class ProfilePhotoCache:
+    """TTL + LRU cache in front of a blocking `fetch(username) -> url`.
+
+    Fetches run in the event loop's default executor. Concurrent misses
+    for the same username share one fetch, and when `path` is given the
+    entries are restored from a JSON file on startup. The file is rewritten
+    at most once per `save_delay` seconds, with all URLs fetched meanwhile.
+    """
+
+    def __init__(
+            self,
+            fetch: Callable[[str], str],
+            ttl: float = PHOTO_CACHE_TTL,
+            max_size: int = PHOTO_CACHE_SIZE,
+            path: Optional[str] = PHOTO_CACHE_PATH,
+            save_delay: float = PHOTO_CACHE_SAVE_DELAY
+    ):
+        self._fetch = fetch
+        self._ttl = ttl
+        self._max_size = max_size
+        self._path = path
+        self._save_delay = save_delay
+        self._entries: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._saving: Optional[asyncio.Future] = None
+        self._save_lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self):
+        with open(self._path) as f:
+            entries = json.load(f)
+
+        now = time.time()
+        valid = sorted(
+            (expires_at, key, url)
+            for key, (url, expires_at) in entries.items() if expires_at > now
+        )
+
+        for expires_at, key, url in valid[-self._max_size:]:
+            self._entries[key] = (url, expires_at)
+
+    def _save(self, entries: Dict[str, Tuple[str, float]]):
+        # one save at a time per process, each through a file of its own
+        with self._save_lock, tempfile.NamedTemporaryFile(
+                'w', dir=os.path.dirname(os.path.abspath(self._path)),
+                suffix='.tmp', delete=False) as f:
+            try:
+                json.dump(entries, f)
+                f.close()
+                os.replace(f.name, self._path)
+            except BaseException:
+                os.unlink(f.name)
+                raise
+
+    async def _save_later(self):
+        await asyncio.sleep(self._save_delay)
+        # URLs stored from now on are saved by the next call
+        self._saving = None
+        loop = asyncio.get_event_loop()
+
+        try:
+            await loop.run_in_executor(None, self._save, dict(self._entries))
+        except OSError as e:
+            LOG.warning(f'Could not save profile photos to {self._path}: {e}')
+
+    def _schedule_save(self):
+        if self._path is not None and self._saving is None:
+            self._saving = asyncio.ensure_future(self._save_later())
+
+    def _lookup(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return None
+        elif entry[1] <= time.time():
+            del self._entries[key]
+            return None
+        else:
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _store(self, key: str, url: str):
+        self._entries[key] = (url, time.time() + self._ttl)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    async def _resolve(self, username: str, key: str) -> str:
+        loop = asyncio.get_event_loop()
+
+        try:
+            url = await loop.run_in_executor(None, self._fetch, username)
+            self._store(key, url)
+        finally:
+            del self._pending[key]
+
+        self._schedule_save()
+
+        return url
+
+    async def get(self, username: str) -> str:
+        key = username.lower()
+        url = self._lookup(key)
+        record_cache('photo', url is not None)
+
+        if url is not None:
+            return url
+
+        pending = self._pending.get(key)
+
+        if pending is None:
+            pending = asyncio.ensure_future(self._resolve(username, key))
+            self._pending[key] = pending
+
+        return await asyncio.shield(pending)
+
+    def invalidate(self, username: str):
+        self._entries.pop(username.lower(), None)
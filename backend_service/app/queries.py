@@ -0,0 +1,425 @@
+"""Parametrized queries and indexes for the tweets tables."""
+
+import random
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+from sqlalchemy import text
+
+from metrics import DB_QUERY_DURATION, DB_QUERY_ROWS
+
+TWEETS_TABLES = ('tweets', 'clients_tweets')
+TWEETS_COLUMNS = ['id', 'link', 'username', 'topic', 'topic_proba', 'sentiment']
+FILTER_COLUMNS = ('username', 'party', 'coalition', 'topic')
+TEXT_COLUMN = 'tweet'
+
+SAMPLE_KEY_COLUMN = 'sample_key'
+SAMPLE_KEY_RANGE = 2 ** 32
+
+# entities of one batch statement, SQLite joins at most 500 SELECTs with
+# UNION ALL
+BATCH_QUERY_ENTITIES = 200
+
+TWEETS_INDEXES = [
+    ('username', 'sentiment', 'topic_proba'),
+    ('username', 'topic', 'topic_proba'),
+    ('party', 'sentiment', 'topic_proba'),
+    ('party', 'topic', 'topic_proba'),
+    ('coalition', 'sentiment', 'topic_proba'),
+    ('coalition', 'topic', 'topic_proba'),
+    ('topic', 'sentiment', 'topic_proba'),
+    ('topic', 'topic_proba'),
+    ('username', 'sample_key'),
+    ('username', 'sentiment', 'sample_key'),
+    ('party', 'sample_key'),
+    ('party', 'sentiment', 'sample_key'),
+    ('coalition', 'sample_key'),
+    ('coalition', 'sentiment', 'sample_key'),
+]
+
+
+def get_table_columns(connection, table: str) -> List[str]:
+    rows = connection.execute(text(f"PRAGMA table_info({table})")).fetchall()
+
+    return [row[1] for row in rows]
+
+
+def add_sample_keys(engine, table: str = 'tweets'):
+    """Give every row of `table` a fixed random `SAMPLE_KEY_COLUMN`.
+
+    Random samples are then read as a range of keys through an index
+    instead of sorting all matching rows. Rows inserted later get their
+    key from a trigger.
+    """
+    if table not in TWEETS_TABLES:
+        raise ValueError(f'Unknown tweets table: {table}')
+
+    random_key = f"abs(random() % {SAMPLE_KEY_RANGE})"
+
+    with engine.begin() as connection:
+        if SAMPLE_KEY_COLUMN not in get_table_columns(connection, table):
+            connection.execute(text(
+                f"ALTER TABLE {table} ADD COLUMN {SAMPLE_KEY_COLUMN} INTEGER"))
+            connection.execute(text(
+                f"UPDATE {table} SET {SAMPLE_KEY_COLUMN} = {random_key}"))
+
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_{SAMPLE_KEY_COLUMN} "
+            f"AFTER INSERT ON {table} WHEN new.{SAMPLE_KEY_COLUMN} IS NULL "
+            f"BEGIN UPDATE {table} SET {SAMPLE_KEY_COLUMN} = {random_key} "
+            f"WHERE rowid = new.rowid; END"
+        ))
+
+
+def sample_start(seed: Optional[int] = None) -> int:
+    """First sample key of a sample, random unless `seed` is given.
+
+    A sample consists of the rows with the smallest keys at or after the
+    start, wrapping around to the beginning of the key range.
+    """
+    if seed is None:
+        return random.randrange(SAMPLE_KEY_RANGE)
+
+    return (seed * 2654435761) % SAMPLE_KEY_RANGE
+
+
+def create_tweets_indexes(engine, table: str = 'tweets') -> List[str]:
+    """Create missing indexes on `table`, returns names of the created ones."""
+    if table not in TWEETS_TABLES:
+        raise ValueError(f'Unknown tweets table: {table}')
+
+    created = []
+
+    with engine.begin() as connection:
+        columns = set(get_table_columns(connection, table))
+        existing = {
+            row[0] for row in connection.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'index' "
+                     "AND tbl_name = :table"),
+                {'table': table}
+            )
+        }
+
+        for index_columns in TWEETS_INDEXES:
+            name = f"ix_{table}_{'_'.join(index_columns)}"
+
+            if name in existing or not columns.issuperset(index_columns):
+                continue
+
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {name} "
+                f"ON {table} ({', '.join(index_columns)})"
+            ))
+            created.append(name)
+
+        if created:
+            connection.execute(text(f"ANALYZE {table}"))
+
+    return created
+
+
+def create_tweets_fts(engine, table: str = 'tweets') -> Optional[str]:
+    """Create a full-text index over the text of `table` if it is missing.
+
+    The FTS5 table `{table}_fts` indexes `TEXT_COLUMN` without storing a
+    copy of it, and triggers keep it in sync with inserts, updates and
+    deletes, so appended tweets are searchable right away. Returns the name
+    of the index, or None when `table` has no text column.
+    """
+    if table not in TWEETS_TABLES:
+        raise ValueError(f'Unknown tweets table: {table}')
+
+    fts_table = f'{table}_fts'
+
+    with engine.begin() as connection:
+        if TEXT_COLUMN not in get_table_columns(connection, table):
+            return None
+
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+            {'name': fts_table}
+        ).fetchone()
+
+        if exists is not None:
+            return fts_table
+
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE {fts_table} USING fts5("
+            f"{TEXT_COLUMN}, content='{table}', content_rowid='rowid', "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        ))
+        connection.execute(text(
+            f"CREATE TRIGGER {fts_table}_insert AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts_table} (rowid, {TEXT_COLUMN}) "
+            f"VALUES (new.rowid, new.{TEXT_COLUMN}); END"
+        ))
+        connection.execute(text(
+            f"CREATE TRIGGER {fts_table}_delete AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts_table} ({fts_table}, rowid, {TEXT_COLUMN}) "
+            f"VALUES ('delete', old.rowid, old.{TEXT_COLUMN}); END"
+        ))
+        connection.execute(text(
+            f"CREATE TRIGGER {fts_table}_update "
+            f"AFTER UPDATE OF {TEXT_COLUMN} ON {table} BEGIN "
+            f"INSERT INTO {fts_table} ({fts_table}, rowid, {TEXT_COLUMN}) "
+            f"VALUES ('delete', old.rowid, old.{TEXT_COLUMN}); "
+            f"INSERT INTO {fts_table} (rowid, {TEXT_COLUMN}) "
+            f"VALUES (new.rowid, new.{TEXT_COLUMN}); END"
+        ))
+        connection.execute(text(
+            f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')"))
+
+    return fts_table
+
+
+def to_match_expression(search: str) -> str:
+    """FTS5 query matching all words of `search`, `word*` matches a prefix.
+
+    Every word is quoted, so user input can never be a syntax error.
+    """
+    terms = []
+
+    for word in search.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*').replace('"', '""')
+
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+
+    if not terms:
+        raise ValueError('Search query must contain a word')
+
+    return ' '.join(terms)
+
+
+def build_search_query(
+        search: str,
+        filters: Dict[str, Union[str, int]],
+        limit: int = 20,
+        sentiment: Optional[str] = None,
+        table: str = 'tweets'
+) -> Tuple[str, Dict[str, Union[str, int]]]:
+    """Query for tweets matching `search`, best BM25 rank first.
+
+    `filters` maps columns of `FILTER_COLUMNS` to the required value.
+    """
+    if table not in TWEETS_TABLES:
+        raise ValueError(f'Unknown tweets table: {table}')
+
+    fts_table = f'{table}_fts'
+    conditions = [f"{fts_table} MATCH :search"]
+    params = {'search': to_match_expression(search), 'limit': limit}
+
+    for column_name, value in filters.items():
+        if column_name not in FILTER_COLUMNS:
+            raise ValueError(f'Tweets can not be filtered by {column_name}')
+
+        conditions.append(f"t.{column_name} = :{column_name}")
+        params[column_name] = value
+
+    if sentiment is not None:
+        conditions.append("t.sentiment = :sentiment")
+        params['sentiment'] = sentiment
+
+    columns = ', '.join(f't.{column}' for column in TWEETS_COLUMNS)
+
+    query = (
+        f"SELECT DISTINCT {columns}, t.{TEXT_COLUMN}, "
+        f"bm25({fts_table}) AS rank "
+        f"FROM {fts_table} JOIN {table} AS t ON t.rowid = {fts_table}.rowid "
+        f"WHERE {' AND '.join(conditions)} "
+        f"ORDER BY rank LIMIT :limit"
+    )
+
+    return query, params
+
+
+def build_tweets_query(
+        column_name: str,
+        column_value: Union[str, int],
+        limit: int = 5,
+        sentiment: Optional[str] = None,
+        topic: Optional[int] = None,
+        table: str = 'tweets',
+        seed: Optional[int] = None,
+        sample_keys: bool = True,
+        value_param: str = 'value'
+) -> Tuple[str, Dict[str, Union[str, int]]]:
+    """Query for up to `limit` tweets with `column_name = column_value`.
+
+    With a `topic` the tweets most likely about it come first. Otherwise a
+    random sample is taken, the same one for the same `seed`; with
+    `sample_keys` it is read as a range of the indexed sample keys. The
+    value is bound as `value_param`, the other parameters do not depend on
+    the value.
+    """
+    if table not in TWEETS_TABLES:
+        raise ValueError(f'Unknown tweets table: {table}')
+    if column_name not in FILTER_COLUMNS:
+        raise ValueError(f'Tweets can not be filtered by {column_name}')
+
+    conditions = [f"{column_name} = :{value_param}"]
+    params = {value_param: column_value, 'limit': limit}
+
+    if sentiment is not None:
+        conditions.append("sentiment = :sentiment")
+        params['sentiment'] = sentiment
+
+    if topic is not None and column_name != 'topic':
+        conditions.append("topic = :topic")
+        params['topic'] = topic
+
+    columns = ', '.join(TWEETS_COLUMNS)
+    where = ' AND '.join(conditions)
+
+    if topic is not None or not sample_keys:
+        order = "topic_proba DESC" if topic is not None else "RANDOM()"
+
+        query = (
+            f"SELECT DISTINCT {columns} FROM {table} "
+            f"WHERE {where} "
+            f"ORDER BY {order} LIMIT :limit"
+        )
+    else:
+        params['start'] = sample_start(seed)
+        selected = (
+            f"SELECT {columns}, {SAMPLE_KEY_COLUMN} FROM {table} "
+            f"WHERE {where} AND {SAMPLE_KEY_COLUMN}"
+        )
+        ordered = f"ORDER BY {SAMPLE_KEY_COLUMN} LIMIT :limit"
+
+        query = (
+            f"SELECT DISTINCT {columns} FROM ("
+            f"SELECT * FROM ({selected} >= :start {ordered}) UNION ALL "
+            f"SELECT * FROM ({selected} < :start {ordered})) "
+            f"ORDER BY {SAMPLE_KEY_COLUMN} < :start, {SAMPLE_KEY_COLUMN} "
+            f"LIMIT :limit"
+        )
+
+    return query, params
+
+
+def build_batch_tweets_query(
+        values_by_column: Dict[str, List[Union[str, int]]],
+        limit: int = 5,
+        sentiment: Optional[str] = None,
+        topic: Optional[int] = None,
+        table: str = 'tweets',
+        seed: Optional[int] = None,
+        sample_keys: bool = True
+) -> Tuple[str, Dict[str, Union[str, int]]]:
+    """Query for up to `limit` tweets of every given entity at once.
+
+    Each row of the result carries `entity_column` and `entity_value`
+    naming the entity it was selected for. Every entity is a query of
+    `build_tweets_query` of its own, so each reads only its `limit` rows
+    through the indexes, and the queries are joined with UNION ALL.
+    """
+    params = {}
+    parts = []
+
+    for column_name, values in values_by_column.items():
+        for i, value in enumerate(values):
+            value_param = f'{column_name}_{i}'
+            query, entity_params = build_tweets_query(
+                column_name, value, limit, sentiment, topic, table, seed,
+                sample_keys, value_param)
+            # the random sample start is the same for all entities
+            params.update(entity_params)
+            parts.append(
+                f"SELECT '{column_name}' AS entity_column, "
+                f":{value_param} AS entity_value, * FROM ({query})")
+
+    return ' UNION ALL '.join(parts), params
+
+
+def chunk_entities(
+        values_by_column: Dict[str, List[Union[str, int]]],
+        size: int = BATCH_QUERY_ENTITIES
+) -> Iterator[Dict[str, List[Union[str, int]]]]:
+    """Split `values_by_column` in parts of at most `size` values."""
+    chunk: Dict[str, List[Union[str, int]]] = {}
+    count = 0
+
+    for column_name, values in values_by_column.items():
+        for value in values:
+            if count == size:
+                yield chunk
+                chunk, count = {}, 0
+
+            chunk.setdefault(column_name, []).append(value)
+            count += 1
+
+    if chunk:
+        yield chunk
+
+
+def read_tweets(
+        name: str,
+        query: str,
+        connection,
+        params: Dict[str, Union[str, int]]
+) -> pd.DataFrame:
+    with DB_QUERY_DURATION.time(query=name):
+        selected = pd.read_sql(query, connection, params=params)
+
+    DB_QUERY_ROWS.inc(len(selected), query=name)
+
+    return selected
+
+
+def select_tweets(
+        connection,
+        column_name: str,
+        column_value: Union[str, int],
+        limit: int = 5,
+        sentiment: Optional[str] = None,
+        topic: Optional[int] = None,
+        table: str = 'tweets',
+        seed: Optional[int] = None,
+        sample_keys: bool = True
+) -> pd.DataFrame:
+    query, params = build_tweets_query(
+        column_name, column_value, limit, sentiment, topic, table, seed,
+        sample_keys)
+
+    return read_tweets('select_tweets', query, connection, params)
+
+
+def search_tweets(
+        connection,
+        search: str,
+        filters: Dict[str, Union[str, int]],
+        limit: int = 20,
+        sentiment: Optional[str] = None,
+        table: str = 'tweets'
+) -> pd.DataFrame:
+    query, params = build_search_query(
+        search, filters, limit, sentiment, table)
+
+    return read_tweets('search_tweets', query, connection, params)
+
+
+def select_batch_tweets(
+        connection,
+        values_by_column: Dict[str, List[Union[str, int]]],
+        limit: int = 5,
+        sentiment: Optional[str] = None,
+        topic: Optional[int] = None,
+        table: str = 'tweets',
+        seed: Optional[int] = None,
+        sample_keys: bool = True
+) -> pd.DataFrame:
+    frames = []
+
+    for chunk in chunk_entities(values_by_column):
+        query, params = build_batch_tweets_query(
+            chunk, limit, sentiment, topic, table, seed, sample_keys)
+        frames.append(
+            read_tweets('select_batch_tweets', query, connection, params))
+
+    if not frames:
+        return pd.DataFrame(
+            columns=['entity_column', 'entity_value'] + TWEETS_COLUMNS)
+
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,62 @@
+"""In-memory lookup tables for users, parties and coalitions."""
+
+from typing import Dict, List, Optional
+
+from models import Coalition, Party, User
+
+
+class EntityRegistry:
+    def __init__(
+            self,
+            users: List[User],
+            parties: List[Party],
+            coalitions: List[Coalition]
+    ):
+        self._users: Dict[str, User] = {
+            user.username.lower(): user for user in users
+        }
+        self._client_users: Dict[str, User] = {}
+
+        self._parties_by_id: Dict[int, Party] = {
+            party.party_id: party for party in parties
+        }
+        self._parties_by_name: Dict[str, Party] = {
+            party.name: party for party in parties
+        }
+
+        self._coalitions_by_id: Dict[int, Coalition] = {
+            coalition.coalition_id: coalition for coalition in coalitions
+        }
+        self._coalitions_by_name: Dict[str, Coalition] = {
+            coalition.name: coalition for coalition in coalitions
+        }
+
+    @property
+    def client_users(self) -> List[User]:
+        return list(self._client_users.values())
+
+    def get_user(self, username: str) -> Optional[User]:
+        key = username.lower()
+        user = self._users.get(key)
+
+        return user if user is not None else self._client_users.get(key)
+
+    def is_client_user(self, username: str) -> bool:
+        key = username.lower()
+
+        return key not in self._users and key in self._client_users
+
+    def add_client_user(self, user: User):
+        self._client_users[user.username.lower()] = user
+
+    def get_party(self, party_id: int) -> Optional[Party]:
+        return self._parties_by_id.get(party_id)
+
+    def get_party_by_name(self, name: str) -> Optional[Party]:
+        return self._parties_by_name.get(name)
+
+    def get_coalition(self, coalition_id: int) -> Optional[Coalition]:
+        return self._coalitions_by_id.get(coalition_id)
+
+    def get_coalition_by_name(self, name: str) -> Optional[Coalition]:
+        return self._coalitions_by_name.get(name)
@@ -1,8 +1,12 @@
 """Classes used for API documentation purposes. Values are examples"""
 
 
+from typing import Dict, List, Optional, Tuple
+
 from pydantic.main import BaseModel
 
+from models import Tweet, User
+
 
 class TopicDistribution(BaseModel):
     topic: int = 0
@@ -16,3 +20,27 @@ class WordsCounts(BaseModel):
 
 class ProfileImage(BaseModel):
     url: str = 'url_to_pic'
+
+
+class BatchEntity(BaseModel):
+    topic: Optional[List[TopicDistribution]] = None
+    sentiment: Optional[List[Tuple[str, float]]] = None
+    word: Optional[List[WordsCounts]] = None
+    tweets: Optional[List[Tweet]] = None
+
+
+class BatchResponse(BaseModel):
+    users: Dict[str, BatchEntity] = {}
+    parties: Dict[int, BatchEntity] = {}
+    coalitions: Dict[int, BatchEntity] = {}
+
+
+class GraphViewport(BaseModel):
+    total: int = 1200
+    users: List[User] = []
+
+
+class DataVersion(BaseModel):
+    version: Optional[str] = '2021-03-01'
+    loaded_at: float = 1614556800.0
+    draining: int = 0
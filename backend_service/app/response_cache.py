@@ -0,0 +1,133 @@
+"""Cache of encoded JSON responses for endpoints serving static data."""
+
+import gzip
+import json
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Any, Hashable, NamedTuple, Optional
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import parse_obj_as
+from starlette.requests import Request
+from starlette.responses import Response
+
+from metrics import record_cache
+from settings import RESPONSE_CACHE_GZIP_MIN_SIZE, RESPONSE_CACHE_SIZE
+
+
+class EncodedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    gzipped: Optional[bytes]
+
+
+def encode_json(content: Any, model: Any = None) -> bytes:
+    """Encode `content` the same way FastAPI renders a response model."""
+    if model is not None:
+        content = parse_obj_as(model, content)
+
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == '*':
+        return True
+
+    candidates = (tag.strip() for tag in if_none_match.split(','))
+
+    return any(
+        (tag[2:] if tag.startswith('W/') else tag) == etag
+        for tag in candidates
+    )
+
+
+class ResponseCache:
+    """LRU cache of serialized (and optionally gzipped) JSON bodies.
+
+    Entries are keyed by whatever identifies the response, usually the
+    route name and its parameters. Cached bodies are served with a strong
+    ETag, and requests whose `If-None-Match` matches get a 304.
+    """
+
+    def __init__(
+            self,
+            max_size: int = RESPONSE_CACHE_SIZE,
+            gzip_min_size: Optional[int] = RESPONSE_CACHE_GZIP_MIN_SIZE
+    ):
+        self._max_size = max_size
+        self._gzip_min_size = gzip_min_size
+        self._entries: 'OrderedDict[Hashable, EncodedResponse]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _encode(self, content: Any, model: Any) -> EncodedResponse:
+        body = encode_json(content, model)
+        etag = f'"{blake2b(body, digest_size=16).hexdigest()}"'
+
+        if self._gzip_min_size is not None and len(body) >= self._gzip_min_size:
+            gzipped = gzip.compress(body)
+        else:
+            gzipped = None
+
+        return EncodedResponse(body, etag, gzipped)
+
+    def get(self, key: Hashable, content: Any, model: Any = None) -> EncodedResponse:
+        """Cached entry for `key`, encoding `content` on a miss.
+
+        `content` may also be a callable producing the content, so that
+        building it is skipped when the entry is cached.
+        """
+        entry = self._entries.get(key)
+        record_cache('response', entry is not None)
+
+        if entry is None:
+            if callable(content):
+                content = content()
+
+            entry = self._encode(content, model)
+            self._entries[key] = entry
+
+            if len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+
+        return entry
+
+    def respond(
+            self,
+            request: Request,
+            key: Hashable,
+            content: Any,
+            model: Any = None
+    ) -> Response:
+        entry = self.get(key, content, model)
+
+        use_gzip = entry.gzipped is not None and \
+            'gzip' in request.headers.get('accept-encoding', '')
+        etag = f'{entry.etag[:-1]}-gzip"' if use_gzip else entry.etag
+        headers = {'ETag': etag, 'Vary': 'Accept-Encoding'}
+
+        if_none_match = request.headers.get('if-none-match')
+
+        if if_none_match is not None and etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+
+        if use_gzip:
+            headers['Content-Encoding'] = 'gzip'
+
+        return Response(
+            content=entry.gzipped if use_gzip else entry.body,
+            media_type='application/json',
+            headers=headers
+        )
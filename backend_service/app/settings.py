@@ -1,7 +1,64 @@
+import os
 from os.path import normpath, dirname, join
 
 PROJECT_DIRECTORY = normpath(join(dirname(__file__)))
-DATA_DIRECTORY = join(PROJECT_DIRECTORY, "data")
+DATA_DIRECTORY = os.getenv('DATA_DIRECTORY', join(PROJECT_DIRECTORY, "data"))
+TWEETS_DB_FILE = "tweets.sqlite"
+TWEETS_DB_PATH = join(DATA_DIRECTORY, TWEETS_DB_FILE)
+SNAPSHOT_DIRNAME = "snapshot"
+SNAPSHOT_DIRECTORY = join(DATA_DIRECTORY, SNAPSHOT_DIRNAME)
+# accounts analysed at runtime and their tweets, shared by all versions
+CLIENTS_DB_PATH = os.getenv(
+    'CLIENTS_DB_PATH', join(DATA_DIRECTORY, "clients.sqlite"))
+# versions of the data are kept in DATA_VERSIONS_DIRECTORY/<version>, laid
+# out like DATA_DIRECTORY; the one served is named in DATA_VERSION_FILE and
+# DATA_DIRECTORY itself is served when that file does not exist
+DATA_VERSIONS_DIRECTORY = join(DATA_DIRECTORY, "versions")
+DATA_VERSION_FILE = join(DATA_DIRECTORY, "CURRENT")
+# seconds between checks of DATA_VERSION_FILE for a new version, 0 disables
+DATA_WATCH_INTERVAL = float(os.getenv('DATA_WATCH_INTERVAL', 10))
+# seconds between checks for client accounts added by other workers, 0
+# disables them
+CLIENTS_SYNC_INTERVAL = float(os.getenv('CLIENTS_SYNC_INTERVAL', 1))
+# token expected in the X-Admin-Token header, admin endpoints are disabled
+# when it is not set
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+# run pydantic validation on models built from the data files at startup
+VALIDATE_DATA = os.getenv('VALIDATE_DATA', '0') == '1'
+# number of most frequent words kept per entity, 0 keeps all of them
+WORDS_TOP_K = int(os.getenv('WORDS_TOP_K', 0)) or None
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 4))
+# 'sqlite' queries the database per request, 'memory' serves the tweets
+# table from a columnar in-memory copy loaded at startup
+TWEETS_STORE = os.getenv('TWEETS_STORE', 'sqlite')
+
+# users, parties and coalitions of a /batch request, each; the tweets of
+# larger requests are read in several queries
+BATCH_MAX_ENTITIES = int(os.getenv('BATCH_MAX_ENTITIES', 250))
+
+# shared by the workers of one server, see metrics.py; unset, every worker
+# reports only its own values
+METRICS_DIRECTORY = os.getenv('METRICS_DIRECTORY')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+
+PHOTO_CACHE_TTL = float(os.getenv('PHOTO_CACHE_TTL', 24 * 60 * 60))
+PHOTO_CACHE_SIZE = int(os.getenv('PHOTO_CACHE_SIZE', 4096))
+PHOTO_CACHE_PATH = os.getenv('PHOTO_CACHE_PATH')
+# seconds new photo URLs wait before the cache file is rewritten with them
+PHOTO_CACHE_SAVE_DELAY = float(os.getenv('PHOTO_CACHE_SAVE_DELAY', 10))
+
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 10000))
+# bodies of at least this many bytes are also stored gzipped, 0 disables it
+RESPONSE_CACHE_GZIP_MIN_SIZE = \
+    int(os.getenv('RESPONSE_CACHE_GZIP_MIN_SIZE', 1024)) or None
+
+# the /new websocket analysing accounts on the Celery workers
+ANALYSIS_ENABLED = os.getenv('ANALYSIS_ENABLED', '0') == '1'
+# seconds to wait for the workers to finish downloading or analysing
+ANALYSIS_TIMEOUT = float(os.getenv('ANALYSIS_TIMEOUT', 15 * 60))
+# analyses followed at the same time, every one holds a thread
+ANALYSIS_CONCURRENCY = int(os.getenv('ANALYSIS_CONCURRENCY', 8))
 
 STATUS_OK = "OK"
 STATUS_ERROR = "ERROR"
@@ -0,0 +1,317 @@
+"""Compact, memory-mapped snapshot of the distribution and word count data.
+
+The snapshot replaces the pickled `topics_distributions`,
+`sentiment_distributions`, `words_per_topic` and `words_counts` dicts with
+flat NumPy arrays which are memory-mapped on first use, so they are cheap
+to open and their pages are shared by every process reading them. The
+format is described in `data/files_info.md`.
+
+Run as a script to convert the pickles from the data directory:
+
+    python snapshot.py [--output DIRECTORY] [--top-k K]
+"""
+
+import json
+import os
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional
+
+import numpy as np
+
+from settings import WORDS_TOP_K
+from words import WordCountsRow, to_float
+
+SNAPSHOT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+
+WORDS_GROUPS = ('per_user', 'per_party', 'per_coalition', 'per_topic')
+
+
+def to_builtin(value: Any) -> Any:
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class LazyArrays:
+    """Opens `.npy` files from a directory with mmap on first access."""
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        array = self._arrays.get(name)
+
+        if array is None:
+            array = np.load(
+                os.path.join(self._directory, f'{name}.npy'), mmap_mode='r')
+            self._arrays[name] = array
+
+        return array
+
+
+class Vocabulary:
+    def __init__(self, arrays: LazyArrays):
+        self._arrays = arrays
+
+    def __len__(self) -> int:
+        return len(self._arrays['vocab_offsets']) - 1
+
+    def __getitem__(self, word_id: int) -> str:
+        offsets = self._arrays['vocab_offsets']
+        data = self._arrays['vocab_data']
+
+        return data[offsets[word_id]:offsets[word_id + 1]].tobytes() \
+            .decode('utf-8')
+
+
+class MatrixView(Mapping):
+    """Read-only mapping from entity key to a row of a float32 matrix."""
+
+    def __init__(
+            self,
+            keys: List[Hashable],
+            load: Callable[[], np.ndarray],
+            to_entry: Callable[[Any, float], Any],
+            columns: List[Any]
+    ):
+        self._rows = {key: row for row, key in enumerate(keys)}
+        self._load = load
+        self._to_entry = to_entry
+        self._columns = columns
+
+    def __getitem__(self, key: Hashable) -> List:
+        values = self._load()[self._rows[key]]
+
+        return [
+            self._to_entry(column, to_float(value))
+            for column, value in zip(self._columns, values)
+            if not np.isnan(value)
+        ]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._rows
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+class WordCountsView(Mapping):
+    """Mapping from entity key to its `WordCountsRow`, stored CSR-style.
+
+    With `top_k` only the first `top_k` words of each row are exposed; the
+    rest of the memory-mapped arrays is then never paged in.
+    """
+
+    def __init__(self, keys: List[Hashable], arrays: LazyArrays, group: str,
+                 vocabulary: Vocabulary, top_k: Optional[int] = WORDS_TOP_K):
+        self._rows = {key: row for row, key in enumerate(keys)}
+        self._arrays = arrays
+        self._group = group
+        self._vocabulary = vocabulary
+        self._top_k = top_k
+
+    def __getitem__(self, key: Hashable) -> WordCountsRow:
+        row = self._rows[key]
+        indptr = self._arrays[f'words_{self._group}_indptr']
+        start, end = indptr[row], indptr[row + 1]
+
+        if self._top_k is not None:
+            end = min(end, start + self._top_k)
+
+        return WordCountsRow(
+            self._vocabulary,
+            self._arrays[f'words_{self._group}_ids'][start:end],
+            self._arrays[f'words_{self._group}_values'][start:end]
+        )
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._rows
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+class Snapshot:
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+
+        if self.manifest['version'] != SNAPSHOT_VERSION:
+            raise ValueError(
+                f"Unsupported snapshot version {self.manifest['version']}")
+
+        self.directory = directory
+        self.arrays = LazyArrays(directory)
+        self.vocabulary = Vocabulary(self.arrays)
+
+    def _matrix_views(self, kind: str, to_entry: Callable) -> Dict[str, MatrixView]:
+        views = {}
+
+        for group, info in self.manifest[kind].items():
+            views[group] = MatrixView(
+                info['keys'],
+                lambda name=f'{kind}_{group}': self.arrays[name],
+                to_entry,
+                info['columns']
+            )
+
+        return views
+
+    def topics_distributions(self) -> Dict[str, MatrixView]:
+        return self._matrix_views(
+            'topics', lambda topic, part: {'topic': topic, 'part': part})
+
+    def sentiment_distributions(self) -> Dict[str, MatrixView]:
+        return self._matrix_views(
+            'sentiment', lambda label, value: (label, value))
+
+    def _words_view(self, group: str, top_k: Optional[int]) -> WordCountsView:
+        return WordCountsView(
+            self.manifest['words'][group]['keys'], self.arrays, group,
+            self.vocabulary, top_k)
+
+    def words_per_topic(
+            self,
+            top_k: Optional[int] = WORDS_TOP_K
+    ) -> WordCountsView:
+        return self._words_view('per_topic', top_k)
+
+    def words_counts(
+            self,
+            top_k: Optional[int] = WORDS_TOP_K
+    ) -> Dict[str, WordCountsView]:
+        return {
+            group: self._words_view(group, top_k)
+            for group in self.manifest['words'] if group != 'per_topic'
+        }
+
+
+def open_snapshot(directory: str) -> Optional[Snapshot]:
+    if not os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+        return None
+
+    return Snapshot(directory)
+
+
+def _distribution_matrix(
+        per_entity: Dict[Hashable, List],
+        get_column: Callable[[Any], Any],
+        get_value: Callable[[Any], float]
+) -> Dict[str, Any]:
+    columns = []
+    for entries in per_entity.values():
+        for entry in entries:
+            column = to_builtin(get_column(entry))
+            if column not in columns:
+                columns.append(column)
+
+    positions = {column: i for i, column in enumerate(columns)}
+    matrix = np.full((len(per_entity), len(columns)), np.nan, dtype=np.float32)
+
+    for row, entries in enumerate(per_entity.values()):
+        for entry in entries:
+            matrix[row, positions[to_builtin(get_column(entry))]] = \
+                get_value(entry)
+
+    return {
+        'keys': [to_builtin(key) for key in per_entity.keys()],
+        'columns': columns,
+        'matrix': matrix
+    }
+
+
+def write_snapshot(
+        directory: str,
+        topics_dist: Dict[str, Dict[Hashable, List]],
+        sentiment_dist: Dict[str, Dict[Hashable, List]],
+        words_per_topic: Dict[int, List[Dict[str, Any]]],
+        words_counts: Dict[str, Dict[Hashable, List[Dict[str, Any]]]],
+        top_k: Optional[int] = None
+):
+    os.makedirs(directory, exist_ok=True)
+
+    def save(name: str, array: np.ndarray):
+        np.save(os.path.join(directory, f'{name}.npy'), array)
+
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'topics': {},
+        'sentiment': {},
+        'words': {}
+    }
+
+    for kind, distributions, get_column, get_value in (
+            ('topics', topics_dist, lambda e: e['topic'], lambda e: e['part']),
+            ('sentiment', sentiment_dist, lambda e: e[0], lambda e: e[1])
+    ):
+        for group, per_entity in distributions.items():
+            converted = _distribution_matrix(per_entity, get_column, get_value)
+            save(f'{kind}_{group}', converted.pop('matrix'))
+            manifest[kind][group] = converted
+
+    words_groups = dict(words_counts)
+    words_groups['per_topic'] = words_per_topic
+
+    words = sorted({
+        entry['text']
+        for per_entity in words_groups.values()
+        for entries in per_entity.values()
+        for entry in sorted(
+            entries, key=lambda e: e['value'], reverse=True)[:top_k]
+    })
+    word_ids = {word: i for i, word in enumerate(words)}
+
+    encoded = [word.encode('utf-8') for word in words]
+    save('vocab_offsets', np.cumsum(
+        [0] + [len(word) for word in encoded], dtype=np.int64))
+    save('vocab_data', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+    for group, per_entity in words_groups.items():
+        ordered = [
+            sorted(entries, key=lambda e: e['value'], reverse=True)[:top_k]
+            for entries in per_entity.values()
+        ]
+        save(f'words_{group}_indptr', np.cumsum(
+            [0] + [len(entries) for entries in ordered], dtype=np.int64))
+        save(f'words_{group}_ids', np.array(
+            [word_ids[e['text']] for entries in ordered for e in entries],
+            dtype=np.int32))
+        save(f'words_{group}_values', np.array(
+            [e['value'] for entries in ordered for e in entries],
+            dtype=np.float32))
+        manifest['words'][group] = {
+            'keys': [to_builtin(key) for key in per_entity.keys()]
+        }
+
+    with open(os.path.join(directory, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from data import load_pickled
+    from settings import SNAPSHOT_DIRECTORY
+
+    parser = argparse.ArgumentParser(
+        description='Convert pickled distributions into a snapshot')
+    parser.add_argument('--output', default=SNAPSHOT_DIRECTORY)
+    parser.add_argument(
+        '--top-k', type=int, default=None,
+        help='keep only this many most frequent words of every entity')
+    args = parser.parse_args()
+
+    write_snapshot(
+        args.output,
+        topics_dist=load_pickled('topics_distributions.pkl.gz'),
+        sentiment_dist=load_pickled('sentiment_distributions.pkl.gz'),
+        words_per_topic=load_pickled('words_per_topic.pkl.gz'),
+        words_counts=load_pickled('words_counts.pkl.gz'),
+        top_k=args.top_k
+    )
@@ -0,0 +1,300 @@
+"""Uniform grid index over the graph coordinates of users."""
+
+import itertools
+from collections import defaultdict
+from typing import Callable, Dict, Generic, Iterator, List, Optional, \
+    Sequence, Tuple, TypeVar
+
+import numpy as np
+
+from models import User
+
+T = TypeVar('T')
+
+POINTS_PER_CELL = 8
+
+
+class GridIndex(Generic[T]):
+    """Points of a fixed dimension bucketed into equally sized cells.
+
+    The cell size is picked at build time so that a cell holds about
+    `POINTS_PER_CELL` points. Box queries only test points of overlapping
+    cells and nearest neighbour queries search rings of cells outwards from
+    the query point until no closer point can exist.
+    """
+
+    def __init__(
+            self,
+            points: np.ndarray,
+            items: Sequence[T],
+            cell_size: Optional[float] = None
+    ):
+        points = np.asarray(points, dtype=np.float64)
+        self.dimensions = points.shape[1]
+
+        if cell_size is None:
+            cell_size = self._pick_cell_size(points)
+
+        self._cell_size = cell_size
+        self._points = points
+        self._size = len(items)
+        self._items: List[T] = list(items)
+        self._cells: Dict[Tuple[int, ...], List[int]] = defaultdict(list)
+
+        for position, cell in enumerate(self._cell_of_many(points)):
+            self._cells[cell].append(position)
+
+    @staticmethod
+    def _pick_cell_size(points: np.ndarray) -> float:
+        if len(points) < 2:
+            return 1.0
+
+        extent = float(np.max(points.max(axis=0) - points.min(axis=0)))
+        cells_per_axis = max(
+            1.0, (len(points) / POINTS_PER_CELL) ** (1 / points.shape[1]))
+
+        return extent / cells_per_axis if extent > 0 else 1.0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _cell_of_many(self, points: np.ndarray) -> Iterator[Tuple[int, ...]]:
+        cells = np.floor(points / self._cell_size).astype(np.int64)
+
+        return (tuple(cell) for cell in cells.tolist())
+
+    def _cell_of(self, point: Sequence[float]) -> Tuple[int, ...]:
+        return next(self._cell_of_many(np.asarray([point], dtype=np.float64)))
+
+    def add(self, point: Sequence[float], item: T):
+        if self._size == len(self._points):
+            grown = np.empty(
+                (max(8, 2 * len(self._points)), self.dimensions))
+            grown[:self._size] = self._points[:self._size]
+            self._points = grown
+
+        self._points[self._size] = point
+        self._items.append(item)
+        self._cells[self._cell_of(point)].append(self._size)
+        self._size += 1
+
+    def _candidates(self, cells: Iterator[Tuple[int, ...]]) -> np.ndarray:
+        positions = [
+            position
+            for cell in cells
+            for position in self._cells.get(cell, ())
+        ]
+
+        return np.array(positions, dtype=np.int64)
+
+    def query_box(
+            self,
+            lower: Sequence[float],
+            upper: Sequence[float]
+    ) -> List[T]:
+        """Items with `lower <= point <= upper` on every axis."""
+        lower = np.asarray(lower, dtype=np.float64)
+        upper = np.asarray(upper, dtype=np.float64)
+
+        # unbounded or very large boxes are answered from the occupied cells
+        low_cell = np.floor(np.clip(lower, -1e300, 1e300) / self._cell_size)
+        high_cell = np.floor(np.clip(upper, -1e300, 1e300) / self._cell_size)
+
+        with np.errstate(over='ignore'):
+            box_cells = np.prod(high_cell - low_cell + 1)
+
+        if box_cells > len(self._cells):
+            cells = (
+                cell for cell in self._cells
+                if all(low <= c <= high for c, low, high
+                       in zip(cell, low_cell, high_cell))
+            )
+        else:
+            cells = itertools.product(*(
+                range(int(low), int(high) + 1)
+                for low, high in zip(low_cell, high_cell)
+            ))
+
+        candidates = self._candidates(cells)
+
+        if len(candidates) == 0:
+            return []
+
+        points = self._points[candidates]
+        inside = np.all((points >= lower) & (points <= upper), axis=1)
+
+        return [self._items[position] for position in candidates[inside]]
+
+    def _ring(self, center: Tuple[int, ...], radius: int) -> Iterator[Tuple[int, ...]]:
+        for offset in itertools.product(
+                range(-radius, radius + 1), repeat=self.dimensions):
+            if max(abs(o) for o in offset) == radius:
+                yield tuple(c + o for c, o in zip(center, offset))
+
+    def _rings(self, center: Tuple[int, ...]) -> Iterator[Tuple[int, list]]:
+        """Radius and cells of the rings around `center`, innermost first.
+
+        Small rings are enumerated cell by cell. Once a ring has more cells
+        than there are occupied ones, the occupied cells are grouped by their
+        distance instead, which also skips empty rings far from the data.
+        """
+        occupied = list(self._cells.keys())
+        radius = 0
+
+        while (2 * radius + 1) ** self.dimensions - \
+                max(2 * radius - 1, 0) ** self.dimensions <= len(occupied):
+            yield radius, list(self._ring(center, radius))
+            radius += 1
+
+        if radius == 0:
+            return
+
+        distances = np.max(np.abs(
+            np.array(occupied, dtype=np.int64) - np.array(center)), axis=1)
+        order = np.argsort(distances, kind='stable')
+        sorted_distances = distances[order]
+        boundaries = np.flatnonzero(np.diff(sorted_distances)) + 1
+
+        for group in np.split(order, boundaries):
+            group_radius = int(distances[group[0]])
+
+            if group_radius >= radius:
+                yield group_radius, [occupied[i] for i in group]
+
+    def nearest(
+            self,
+            point: Sequence[float],
+            k: int,
+            exclude: Optional[Callable[[T], bool]] = None
+    ) -> List[T]:
+        """The `k` items closest to `point`, nearest first."""
+        point = np.asarray(point, dtype=np.float64)
+
+        positions = np.empty(0, dtype=np.int64)
+        distances = np.empty(0, dtype=np.float64)
+
+        for radius, cells in self._rings(self._cell_of(point)):
+            ring = self._candidates(iter(cells))
+
+            if exclude is not None and len(ring) > 0:
+                ring = ring[[not exclude(self._items[p]) for p in ring]]
+
+            if len(ring) > 0:
+                positions = np.concatenate((positions, ring))
+                distances = np.concatenate((
+                    distances,
+                    np.linalg.norm(self._points[ring] - point, axis=1)
+                ))
+
+            # points outside the rings seen so far are at least this far away
+            if len(positions) >= k and np.partition(distances, k - 1)[k - 1] \
+                    <= radius * self._cell_size:
+                break
+
+        order = np.argsort(distances, kind='stable')[:k]
+
+        return [self._items[position] for position in positions[order]]
+
+
+def downsample(
+        items: List[T],
+        points: np.ndarray,
+        lower: Sequence[float],
+        upper: Sequence[float],
+        limit: int,
+        priority: Callable[[T], float]
+) -> List[T]:
+    """At most `limit` items spread over the box `lower`..`upper`.
+
+    The box is split into about `limit` equal cells and the item with the
+    highest `priority` represents each cell, so dense areas are thinned out
+    while sparse ones keep all their points.
+    """
+    if len(items) <= limit:
+        return items
+
+    points = np.asarray(points, dtype=np.float64)
+    lower = np.asarray(lower, dtype=np.float64)
+    upper = np.asarray(upper, dtype=np.float64)
+
+    # bin only the part of the box actually covered by points
+    lower = np.maximum(lower, points.min(axis=0))
+    upper = np.minimum(upper, points.max(axis=0))
+
+    per_axis = max(1, int(limit ** (1 / points.shape[1])))
+    span = np.where(upper > lower, upper - lower, 1.0)
+    cells = np.clip(
+        ((points - lower) / span * per_axis).astype(np.int64), 0, per_axis - 1)
+
+    best: Dict[Tuple[int, ...], int] = {}
+    for position, cell in enumerate(map(tuple, cells.tolist())):
+        current = best.get(cell)
+        if current is None or priority(items[position]) > priority(items[current]):
+            best[cell] = position
+
+    chosen = sorted(best.values(), key=lambda p: priority(items[p]), reverse=True)
+
+    return [items[position] for position in sorted(chosen[:limit])]
+
+
+GRAPH_AXES = {
+    2: ('x_graph2d', 'y_graph2d'),
+    3: ('x_graph3d', 'y_graph3d', 'z_graph3d')
+}
+
+
+def graph_point(user: User, dimensions: int) -> List[float]:
+    return [getattr(user, axis) for axis in GRAPH_AXES[dimensions]]
+
+
+class UserGraphIndex:
+    """Grid indexes of users over the 2D and 3D graph coordinates."""
+
+    def __init__(self, users: List[User]):
+        self._indexes: Dict[int, GridIndex[User]] = {
+            dimensions: GridIndex(
+                np.array(
+                    [graph_point(user, dimensions) for user in users],
+                    dtype=np.float64
+                ).reshape(-1, dimensions),
+                users)
+            for dimensions in GRAPH_AXES
+        }
+
+    def __len__(self) -> int:
+        return len(self._indexes[2])
+
+    def add(self, user: User):
+        for dimensions, index in self._indexes.items():
+            index.add(graph_point(user, dimensions), user)
+
+    def viewport(
+            self,
+            dimensions: int,
+            lower: Sequence[float],
+            upper: Sequence[float],
+            limit: Optional[int] = None
+    ) -> Tuple[int, List[User]]:
+        """Number of users inside the box and at most `limit` of them.
+
+        Above `limit` users the box is thinned out to the most active
+        account of every area, see `downsample`.
+        """
+        found = self._indexes[dimensions].query_box(lower, upper)
+
+        if limit is not None and len(found) > limit:
+            selected = downsample(
+                found,
+                np.array([graph_point(user, dimensions) for user in found]),
+                lower, upper, limit, lambda user: user.tweets_count)
+        else:
+            selected = found
+
+        return len(found), selected
+
+    def neighbors(self, user: User, dimensions: int, k: int) -> List[User]:
+        username = user.username.lower()
+
+        return self._indexes[dimensions].nearest(
+            graph_point(user, dimensions), k,
+            exclude=lambda other: other.username.lower() == username)
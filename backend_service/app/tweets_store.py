@@ -0,0 +1,117 @@
+"""Columnar in-memory copy of the tweets table."""
+
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from queries import SAMPLE_KEY_COLUMN, SAMPLE_KEY_RANGE, TWEETS_COLUMNS, \
+    FILTER_COLUMNS, get_table_columns, sample_start
+
+STORE_COLUMNS = TWEETS_COLUMNS + ['party', 'coalition']
+
+
+class ColumnarTweetStore:
+    """Tweets kept as NumPy arrays with one sorted index per filter column.
+
+    For every column in `FILTER_COLUMNS` the rows are ordered by that
+    column and then by descending `topic_proba`, and each value maps to a
+    `(start, end)` slice of that ordering. A lookup is then one dict access
+    plus array slicing, and the first rows of a slice are already the
+    top-k tweets by `topic_proba`.
+
+    Random samples take the rows with the smallest sample keys from the
+    start given by `sample_start`, so for the same seed they match the
+    samples read from the database.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self._columns: Dict[str, np.ndarray] = {
+            column: df[column].to_numpy() for column in TWEETS_COLUMNS
+        }
+
+        sentiment_codes, self._sentiments = pd.factorize(df['sentiment'])
+        self._sentiment_codes = sentiment_codes.astype(np.int8)
+
+        proba = df['topic_proba'].to_numpy()
+        self._indexes: Dict[str, Tuple[np.ndarray, Dict]] = {}
+
+        for column in FILTER_COLUMNS:
+            codes, values = pd.factorize(df[column])
+            order = np.lexsort((-proba, codes)).astype(np.int32)
+            sorted_codes = codes[order]
+
+            bounds = np.flatnonzero(np.diff(sorted_codes)) + 1
+            starts = np.concatenate(([0], bounds))
+            ends = np.concatenate((bounds, [len(order)]))
+
+            offsets = {
+                values[sorted_codes[start]]: (int(start), int(end))
+                for start, end in zip(starts, ends)
+                if sorted_codes[start] >= 0
+            }
+            self._indexes[column] = (order, offsets)
+
+        if SAMPLE_KEY_COLUMN in df:
+            self._sample_keys = df[SAMPLE_KEY_COLUMN].to_numpy(dtype=np.int64)
+        else:
+            self._sample_keys = np.random.default_rng().integers(
+                SAMPLE_KEY_RANGE, size=len(df), dtype=np.int64)
+
+    @classmethod
+    def from_sql(cls, connectable, table: str = 'tweets') -> 'ColumnarTweetStore':
+        columns = ', '.join(STORE_COLUMNS)
+
+        with connectable.connect() as connection:
+            has_keys = SAMPLE_KEY_COLUMN in get_table_columns(connection, table)
+
+        if has_keys:
+            query = (
+                f"SELECT {columns}, MIN({SAMPLE_KEY_COLUMN}) AS "
+                f"{SAMPLE_KEY_COLUMN} FROM {table} GROUP BY {columns}"
+            )
+        else:
+            query = f"SELECT DISTINCT {columns} FROM {table}"
+
+        df = pd.read_sql(query, connectable)
+
+        return cls(df)
+
+    def __len__(self) -> int:
+        return len(self._sentiment_codes)
+
+    def select(
+            self,
+            column_name: str,
+            column_value: Union[str, int],
+            limit: int = 5,
+            sentiment: Optional[str] = None,
+            topic: Optional[int] = None,
+            seed: Optional[int] = None
+    ) -> pd.DataFrame:
+        if limit < 1:
+            raise ValueError(f'limit must be positive, got {limit}')
+
+        order, offsets = self._indexes[column_name]
+        start, end = offsets.get(column_value, (0, 0))
+        rows = order[start:end]
+
+        if sentiment is not None:
+            code = self._sentiments.get_indexer([sentiment])[0]
+            rows = rows[self._sentiment_codes[rows] == code] if code >= 0 \
+                else rows[:0]
+
+        if topic is not None and column_name != 'topic':
+            rows = rows[self._columns['topic'][rows] == topic]
+
+        if topic is not None:
+            rows = rows[:limit]
+        elif len(rows) > limit:
+            shifted = (self._sample_keys[rows] - sample_start(seed)) \
+                % SAMPLE_KEY_RANGE
+            smallest = np.argpartition(shifted, limit - 1)[:limit]
+            rows = rows[smallest[np.argsort(shifted[smallest])]]
+
+        return pd.DataFrame({
+            column: values[rows] for column, values in self._columns.items()
+        })
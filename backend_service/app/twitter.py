@@ -1,12 +1,21 @@
 import os
+import time
 
 from TwitterAPI import TwitterAPI
 
+from metrics import OUTBOUND_DURATION
+
 CONSUMER_KEY = os.getenv('CONSUMER_KEY')
 CONSUMER_SECRET = os.getenv('CONSUMER_SECRET')
 ACCESS_TOKEN_KEY = os.getenv('ACCESS_TOKEN_KEY')
 ACCESS_TOKEN_SECRET = os.getenv('ACCESS_TOKEN_SECRET')
 
+# 'api' talks to Twitter, 'fake' returns placeholder data without network
+TWITTER_CLIENT = os.getenv('TWITTER_CLIENT', 'api')
+
+DEFAULT_PROFILE_PHOTO = \
+    'https://abs.twimg.com/sticky/default_profile_images/default_profile.png'
+
 
 def get_twitter_api_instance() -> TwitterAPI:
     api = TwitterAPI(CONSUMER_KEY, CONSUMER_SECRET, ACCESS_TOKEN_KEY, ACCESS_TOKEN_SECRET)
@@ -21,3 +30,44 @@ def get_profile_photo(api: TwitterAPI, username: str) -> str:
     url = user_data['profile_image_url_https'].replace("_normal", "")
 
     return url
+
+
+class TwitterClient:
+    def __init__(self, api: TwitterAPI):
+        self.api = api
+
+    def get_profile_photo(self, username: str) -> str:
+        start = time.perf_counter()
+        outcome = 'error'
+
+        try:
+            url = get_profile_photo(self.api, username)
+            outcome = 'ok'
+        finally:
+            OUTBOUND_DURATION.observe(
+                time.perf_counter() - start, service='twitter',
+                operation='users/show', outcome=outcome)
+
+        return url
+
+
+class FakeTwitterClient:
+    """Offline stand-in for `TwitterClient`, records requested usernames."""
+
+    def __init__(self, photo_url: str = DEFAULT_PROFILE_PHOTO):
+        self.photo_url = photo_url
+        self.requests = []
+
+    def get_profile_photo(self, username: str) -> str:
+        self.requests.append(username)
+
+        return self.photo_url
+
+
+def get_twitter_client(kind: str = TWITTER_CLIENT):
+    if kind == 'fake':
+        return FakeTwitterClient()
+    elif kind == 'api':
+        return TwitterClient(get_twitter_api_instance())
+    else:
+        raise ValueError(f'Unknown Twitter client: {kind}')
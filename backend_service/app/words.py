@@ -0,0 +1,136 @@
+"""Compact storage of per-entity word counts.
+
+Words are interned into a vocabulary shared by all entities, and each
+entity keeps two parallel arrays, vocabulary ids and counts, sorted by
+descending count. Optionally only the `top_k` most frequent words of every
+entity are retained.
+"""
+
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from settings import WORDS_TOP_K
+
+
+def to_float(value: np.float32) -> float:
+    """Shortest float equal to the stored float32, e.g. 0.02 not 0.0199..."""
+    return float(str(value))
+
+
+class InternedVocabulary:
+    def __init__(self):
+        self._words: List[str] = []
+        self._ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def __getitem__(self, word_id: int) -> str:
+        return self._words[word_id]
+
+    def intern(self, word: str) -> int:
+        word_id = self._ids.get(word)
+
+        if word_id is None:
+            word_id = len(self._words)
+            self._words.append(word)
+            self._ids[word] = word_id
+
+        return word_id
+
+
+class WordCountsRow(Sequence):
+    """Word counts of one entity, sorted by descending value.
+
+    Indexing or slicing only decodes the requested words, so `row[:limit]`
+    costs `limit` lookups no matter how many words the entity has.
+    """
+
+    def __init__(self, vocabulary, ids: np.ndarray, values: np.ndarray):
+        self._vocabulary = vocabulary
+        self._ids = ids
+        self._values = values
+
+    @property
+    def vocabulary(self):
+        return self._vocabulary
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values
+
+    def _entry(self, position: int) -> Dict[str, Any]:
+        return {
+            'text': self._vocabulary[self._ids[position]],
+            'value': to_float(self._values[position])
+        }
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._entry(i) for i in range(*index.indices(len(self)))]
+        else:
+            return self._entry(range(len(self))[index])
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class WordCountsStore(Mapping):
+    """In-memory mapping from entity key to its `WordCountsRow`."""
+
+    def __init__(
+            self,
+            vocabulary: Optional[InternedVocabulary] = None,
+            top_k: Optional[int] = WORDS_TOP_K
+    ):
+        self.vocabulary = vocabulary if vocabulary is not None \
+            else InternedVocabulary()
+        self._top_k = top_k
+        self._rows: Dict[Hashable, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def from_lists(
+            cls,
+            per_entity: Dict[Hashable, List[Dict[str, Any]]],
+            vocabulary: Optional[InternedVocabulary] = None,
+            top_k: Optional[int] = WORDS_TOP_K
+    ) -> 'WordCountsStore':
+        store = cls(vocabulary, top_k)
+
+        for key, entries in per_entity.items():
+            store.add(key, entries)
+
+        return store
+
+    def add(self, key: Hashable, entries: List[Dict[str, Any]]):
+        """Store `entries`, a list of `{'text': word, 'value': count}`."""
+        values = np.fromiter(
+            (entry['value'] for entry in entries),
+            dtype=np.float32, count=len(entries))
+
+        # only the kept words enter the shared vocabulary
+        order = np.argsort(-values, kind='stable')[:self._top_k]
+        ids = np.fromiter(
+            (self.vocabulary.intern(entries[i]['text']) for i in order),
+            dtype=np.int32, count=len(order))
+        self._rows[key] = (ids, values[order])
+
+    def __getitem__(self, key: Hashable) -> WordCountsRow:
+        ids, values = self._rows[key]
+
+        return WordCountsRow(self.vocabulary, ids, values)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._rows
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
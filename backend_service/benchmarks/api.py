@@ -0,0 +1,284 @@
+"""In-process benchmark of the API against a data directory.
+
+Imports the app (timing the startup and its `load_*` phases), then sends
+requests straight to the ASGI application, without a server or network,
+and reports latency percentiles and throughput per endpoint:
+
+    python benchmarks/generate_data.py /tmp/bench-data
+    python benchmarks/api.py --data-directory /tmp/bench-data
+
+Twitter is replaced by the fake client, so no credentials are needed.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+from os.path import abspath, dirname, join
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+APP_DIRECTORY = join(dirname(dirname(abspath(__file__))), 'app')
+
+# method, path with query string and JSON body
+BenchmarkRequest = Tuple[str, str, Optional[dict]]
+
+
+def current_rss_mb() -> Optional[float]:
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def peak_rss_mb() -> float:
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+
+async def call(
+        app,
+        method: str,
+        path: str,
+        body: Optional[dict] = None
+) -> Tuple[int, bytes]:
+    """Run one request through the ASGI `app`, return status and body."""
+    path, _, query = path.partition('?')
+    content = json.dumps(body).encode() if body is not None else b''
+    headers = [(b'host', b'benchmark')]
+    if body is not None:
+        headers.append((b'content-type', b'application/json'))
+
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'root_path': '',
+        'query_string': query.encode(),
+        'headers': headers,
+        'client': ('127.0.0.1', 0),
+        'server': ('benchmark', 80),
+    }
+    received = False
+    status = 500
+    chunks = []
+
+    async def receive():
+        nonlocal received
+
+        if received:
+            await asyncio.sleep(3600)
+        received = True
+
+        return {'type': 'http.request', 'body': content, 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body':
+            chunks.append(message.get('body', b''))
+
+    await app(scope, receive, send)
+
+    return status, b''.join(chunks)
+
+
+def build_endpoints(main) -> Dict[str, Callable[[], BenchmarkRequest]]:
+    """Request factories per endpoint, each request picks random entities."""
+    data = main.datasets.current
+    usernames = [user.username for user in data.users]
+    party_ids = [party.party_id for party in data.parties]
+    coalition_ids = [coalition.coalition_id for coalition in data.coalitions]
+    topics = list(data.words_per_topic.keys())
+    clusters = [
+        cluster.cluster_id for cluster in data.clusters.get_clusters('kmeans')
+    ]
+    words = [entry['text'] for entry in data.words_per_topic[topics[0]][:50]]
+
+    def get(path: str, **params) -> BenchmarkRequest:
+        query = f'?{urlencode(params)}' if params else ''
+        return 'GET', f'{path}{query}', None
+
+    def viewport():
+        x, y = random.uniform(-10, 10), random.uniform(-10, 10)
+        return get('/graph/2/viewport', x_min=x - 2, x_max=x + 2,
+                   y_min=y - 2, y_max=y + 2, limit=200)
+
+    return {
+        'GET /user': lambda: get('/user'),
+        'GET /user?limit=50':
+            lambda: get('/user', limit=50, fields='username'),
+        'GET /user/{username}':
+            lambda: get(f'/user/{random.choice(usernames)}'),
+        'GET /user/{username}/topic':
+            lambda: get(f'/user/{random.choice(usernames)}/topic'),
+        'GET /user/{username}/sentiment':
+            lambda: get(f'/user/{random.choice(usernames)}/sentiment'),
+        'GET /user/{username}/word':
+            lambda: get(f'/user/{random.choice(usernames)}/word'),
+        'GET /user/{username}/tweets':
+            lambda: get(f'/user/{random.choice(usernames)}/tweets'),
+        'GET /user/{username}/neighbors':
+            lambda: get(f'/user/{random.choice(usernames)}/neighbors', k=10),
+        'GET /party/{party_id}/tweets':
+            lambda: get(f'/party/{random.choice(party_ids)}/tweets'),
+        'GET /party/{party_id}/word':
+            lambda: get(f'/party/{random.choice(party_ids)}/word'),
+        'GET /coalition/{coalition_id}/tweets':
+            lambda: get(f'/coalition/{random.choice(coalition_ids)}/tweets'),
+        'GET /topic/{topic_id}/tweets':
+            lambda: get(f'/topic/{random.choice(topics)}/tweets'),
+        'GET /topic/{topic_id}/word':
+            lambda: get(f'/topic/{random.choice(topics)}/word'),
+        'GET /graph/2/viewport': viewport,
+        'GET /cluster/kmeans/{cluster_id}/word':
+            lambda: get(f'/cluster/kmeans/{random.choice(clusters)}/word'),
+        'GET /tweets/search':
+            lambda: get('/tweets/search', q=random.choice(words), limit=20),
+        'POST /batch': lambda: ('POST', '/batch', {
+            'usernames': random.sample(usernames, min(10, len(usernames))),
+            'party_ids': party_ids[:2]
+        }),
+    }
+
+
+async def run_endpoint(
+        app,
+        make_request: Callable[[], BenchmarkRequest],
+        requests: int,
+        concurrency: int
+) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors = 0
+    queue = [make_request() for _ in range(requests)]
+
+    async def worker():
+        nonlocal errors
+
+        while queue:
+            method, path, body = queue.pop()
+            start = time.perf_counter()
+            status, _ = await call(app, method, path, body)
+            latencies.append(time.perf_counter() - start)
+
+            if status >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        position = min(len(latencies) - 1, int(p * len(latencies)))
+        return latencies[position] * 1000
+
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput': requests / elapsed,
+        'p50_ms': percentile(0.5),
+        'p90_ms': percentile(0.9),
+        'p99_ms': percentile(0.99),
+        'max_ms': latencies[-1] * 1000,
+        'mean_ms': statistics.mean(latencies) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data-directory', default=None)
+    parser.add_argument('--requests', type=int, default=500,
+                        help='requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=20,
+                        help='untimed requests per endpoint')
+    parser.add_argument('--endpoint', action='append', default=None,
+                        help='only run endpoints containing this text')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None,
+                        help='also write the results to this file')
+    args = parser.parse_args()
+
+    if args.data_directory is not None:
+        os.environ['DATA_DIRECTORY'] = abspath(args.data_directory)
+    os.environ.setdefault('TWITTER_CLIENT', 'fake')
+
+    sys.path.insert(0, APP_DIRECTORY)
+    random.seed(args.seed)
+
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    import main as app_main
+    startup = time.perf_counter() - start
+    rss_after = current_rss_mb()
+
+    from metrics import STARTUP_PHASE_DURATION
+
+    results = {
+        'startup_s': startup,
+        'startup_phases_s': {
+            phase: seconds
+            for (phase,), seconds in STARTUP_PHASE_DURATION.values().items()
+        },
+        'rss_before_startup_mb': rss_before,
+        'rss_after_startup_mb': rss_after,
+        'endpoints': {}
+    }
+
+    print(f'startup {startup:.3f} s, RSS {rss_before or 0:.0f} -> '
+          f'{rss_after or 0:.0f} MB')
+    for phase, seconds in results['startup_phases_s'].items():
+        print(f'  {phase:32} {seconds * 1000:10.1f} ms')
+
+    endpoints = build_endpoints(app_main)
+    if args.endpoint:
+        endpoints = {
+            name: factory for name, factory in endpoints.items()
+            if any(text in name for text in args.endpoint)
+        }
+
+    print(f"\n{'endpoint':40} {'req/s':>9} {'p50 ms':>8} {'p90 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8} {'errors':>6}")
+
+    loop = asyncio.get_event_loop()
+
+    for name, factory in endpoints.items():
+        loop.run_until_complete(
+            run_endpoint(app_main.app, factory, args.warmup, 1))
+        stats = loop.run_until_complete(run_endpoint(
+            app_main.app, factory, args.requests, args.concurrency))
+        results['endpoints'][name] = stats
+
+        print(f"{name:40} {stats['throughput']:9.1f} {stats['p50_ms']:8.2f} "
+              f"{stats['p90_ms']:8.2f} {stats['p99_ms']:8.2f} "
+              f"{stats['max_ms']:8.2f} {stats['errors']:6d}")
+
+    results['rss_peak_mb'] = peak_rss_mb()
+    print(f"\npeak RSS {results['rss_peak_mb']:.0f} MB")
+
+    loop.run_until_complete(app_main.app.router.shutdown())
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""Synthetic data directory in the formats `data.py` expects.
+
+Writes the CSV files, the pickled distributions and word counts and
+`tweets.sqlite`, optionally also a snapshot:
+
+    python benchmarks/generate_data.py OUTPUT [--users N] [--tweets N] ...
+
+Users are spread over clusters forming blobs in the graph coordinates and
+words follow a Zipf distribution, so indexes and caches see roughly the
+shapes of the real data.
+"""
+
+import argparse
+import os
+import pickle as pkl
+import sqlite3
+import sys
+from os.path import abspath, dirname, join
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+APP_DIRECTORY = join(dirname(dirname(abspath(__file__))), 'app')
+
+SENTIMENTS = ['negative', 'neutral', 'positive', 'ambiguous']
+TWEETS_CHUNK_SIZE = 100000
+
+
+def distribution(rng: np.random.Generator, size: int) -> np.ndarray:
+    return rng.dirichlet(np.full(size, 0.5))
+
+
+def topics_list(rng: np.random.Generator, topics: int) -> List[Dict]:
+    return [
+        {'topic': topic, 'part': float(part)}
+        for topic, part in enumerate(distribution(rng, topics))
+    ]
+
+
+def sentiment_list(rng: np.random.Generator) -> List:
+    return list(zip(SENTIMENTS, distribution(rng, len(SENTIMENTS)).tolist()))
+
+
+def words_list(
+        rng: np.random.Generator,
+        vocabulary: List[str],
+        word_weights: np.ndarray,
+        size: int
+) -> List[Dict]:
+    size = min(size, len(vocabulary))
+    ids = rng.choice(len(vocabulary), size, replace=False, p=word_weights)
+    values = np.sort(rng.zipf(1.5, size).astype(float))[::-1]
+
+    return [
+        {'text': vocabulary[word_id], 'value': value}
+        for word_id, value in zip(ids.tolist(), values.tolist())
+    ]
+
+
+def generate(
+        output: str,
+        users_count: int = 500,
+        parties_count: int = 8,
+        coalitions_count: int = 4,
+        tweets_count: int = 100000,
+        vocabulary_size: int = 20000,
+        topics: int = 20,
+        words_per_entity: int = 1000,
+        clusters: int = 10,
+        seed: int = 0
+):
+    rng = np.random.default_rng(seed)
+    os.makedirs(output, exist_ok=True)
+
+    coalitions = [f'Coalition {i}' for i in range(coalitions_count)]
+    parties = [f'Party {i}' for i in range(parties_count)]
+    party_coalitions = [coalitions[i % coalitions_count]
+                        for i in range(parties_count)]
+
+    pd.DataFrame({
+        'id': range(parties_count),
+        'party': parties,
+        'coalition': party_coalitions
+    }).to_csv(join(output, 'parties.csv'), index=False)
+
+    members = {
+        coalition: [party for party, party_coalition
+                    in zip(parties, party_coalitions)
+                    if party_coalition == coalition]
+        for coalition in coalitions
+    }
+    longest = max(len(names) for names in members.values())
+    pd.DataFrame({
+        coalition: names + [None] * (longest - len(names))
+        for coalition, names in members.items()
+    }).to_csv(join(output, 'coalitions.csv'), index=False)
+
+    usernames = [f'user{i}' for i in range(users_count)]
+    user_parties = rng.integers(parties_count, size=users_count)
+    user_tweets = rng.integers(1, 2 * tweets_count // users_count + 2,
+                               size=users_count)
+
+    pd.DataFrame({
+        'username': usernames,
+        'party': [parties[i] for i in user_parties],
+        'coalition': [party_coalitions[i] for i in user_parties],
+        'pozycja': 'poseł',
+        'name': [f'Name {i}' for i in range(users_count)],
+        'tweets_count': user_tweets
+    }).to_csv(join(output, 'users.csv'), index=False)
+
+    user_clusters = rng.integers(clusters, size=users_count)
+    centers = rng.uniform(-10, 10, size=(clusters, 5))
+    positions = centers[user_clusters] + rng.normal(size=(users_count, 5))
+
+    pd.DataFrame({
+        'username': usernames,
+        '2D_x': positions[:, 0],
+        '2D_y': positions[:, 1],
+        '3D_x': positions[:, 2],
+        '3D_y': positions[:, 3],
+        '3D_z': positions[:, 4]
+    }).to_csv(join(output, 'graph_umap.csv'), index=False)
+
+    pd.DataFrame({
+        'username': usernames,
+        'mean_shift_cluster': user_clusters,
+        'kmeans_cluster': (user_clusters + 1) % clusters,
+        'gmm_cluster': user_clusters // 2
+    }).to_csv(join(output, 'clusters.csv'), index=False)
+
+    groups = {
+        'per_user': usernames,
+        'per_party': parties,
+        'per_coalition': coalitions
+    }
+
+    topics_dist = {
+        group: {key: topics_list(rng, topics) for key in keys}
+        for group, keys in groups.items()
+    }
+    sentiment_dist = {
+        group: {key: sentiment_list(rng) for key in keys}
+        for group, keys in groups.items()
+    }
+    sentiment_dist['per_topic'] = {
+        topic: sentiment_list(rng) for topic in range(topics)
+    }
+
+    vocabulary = [f'word{i}' for i in range(vocabulary_size)]
+    word_weights = 1 / np.arange(1, vocabulary_size + 1)
+    word_weights /= word_weights.sum()
+
+    words_per_topic = {
+        topic: words_list(rng, vocabulary, word_weights, words_per_entity)
+        for topic in range(topics)
+    }
+    words_counts = {
+        group: {
+            key: words_list(rng, vocabulary, word_weights, words_per_entity)
+            for key in keys
+        }
+        for group, keys in groups.items()
+    }
+
+    for filename, content in (
+            ('topics_distributions.pkl.gz', topics_dist),
+            ('sentiment_distributions.pkl.gz', sentiment_dist),
+            ('words_per_topic.pkl.gz', words_per_topic),
+            ('words_counts.pkl.gz', words_counts)
+    ):
+        with open(join(output, filename), 'wb') as f:
+            pkl.dump(content, f)
+
+    db_path = join(output, 'tweets.sqlite')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    tweet_users = rng.choice(
+        users_count, tweets_count, p=user_tweets / user_tweets.sum())
+    words = np.array(vocabulary)
+
+    with sqlite3.connect(db_path) as connection:
+        for start in range(0, tweets_count, TWEETS_CHUNK_SIZE):
+            end = min(start + TWEETS_CHUNK_SIZE, tweets_count)
+            chunk_users = tweet_users[start:end]
+            text_words = words[rng.choice(
+                vocabulary_size, (end - start, 12), p=word_weights)]
+
+            pd.DataFrame({
+                'id': np.arange(start, end) + 10 ** 18,
+                'tweet': [' '.join(row) for row in text_words],
+                'link': [
+                    f'https://twitter.com/{usernames[user]}/status/{i}'
+                    for i, user in zip(range(start, end), chunk_users)
+                ],
+                'username': [usernames[user] for user in chunk_users],
+                'party': [parties[user_parties[user]] for user in chunk_users],
+                'coalition': [
+                    party_coalitions[user_parties[user]]
+                    for user in chunk_users
+                ],
+                'topic': rng.integers(topics, size=end - start),
+                'topic_proba': rng.uniform(size=end - start),
+                'sentiment': rng.choice(SENTIMENTS, size=end - start)
+            }, index=pd.RangeIndex(start, end)).to_sql(
+                'tweets', connection, if_exists='append')
+
+    return topics_dist, sentiment_dist, words_per_topic, words_counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--parties', type=int, default=8)
+    parser.add_argument('--coalitions', type=int, default=4)
+    parser.add_argument('--tweets', type=int, default=100000)
+    parser.add_argument('--vocabulary', type=int, default=20000)
+    parser.add_argument('--topics', type=int, default=20)
+    parser.add_argument('--words-per-entity', type=int, default=1000)
+    parser.add_argument('--clusters', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--snapshot', action='store_true',
+        help='also write the memory-mapped snapshot of the pickles')
+    args = parser.parse_args()
+
+    distributions = generate(
+        args.output,
+        users_count=args.users,
+        parties_count=args.parties,
+        coalitions_count=args.coalitions,
+        tweets_count=args.tweets,
+        vocabulary_size=args.vocabulary,
+        topics=args.topics,
+        words_per_entity=args.words_per_entity,
+        clusters=args.clusters,
+        seed=args.seed
+    )
+
+    if args.snapshot:
+        sys.path.insert(0, APP_DIRECTORY)
+        from snapshot import write_snapshot
+
+        write_snapshot(join(args.output, 'snapshot'), *distributions)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Startup-time benchmark of the data loaders.
+
+Times every `load_*` function from `data.py` against a data directory:
+
+    python benchmarks/startup.py [--data-directory DIR] [--repeat N]
+
+`load_users` and `load_parties` are timed both with and without pydantic
+validation.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import timeit
+from functools import partial
+from os.path import abspath, dirname, join
+
+APP_DIRECTORY = join(dirname(dirname(abspath(__file__))), 'app')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data-directory', default=None)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.data_directory is not None:
+        os.environ['DATA_DIRECTORY'] = abspath(args.data_directory)
+
+    sys.path.insert(0, APP_DIRECTORY)
+
+    import data
+
+    def uncached(loader):
+        data.get_snapshot.cache_clear()
+        data.get_vocabulary.cache_clear()
+        return loader()
+
+    loaders = [
+        ('load_users', partial(data.load_users, validate=False)),
+        ('load_users (validated)', partial(data.load_users, validate=True)),
+        ('load_parties', partial(data.load_parties, validate=False)),
+        ('load_parties (validated)', partial(data.load_parties, validate=True)),
+        ('load_coalitions', data.load_coalitions),
+        ('load_topics_distributions',
+         partial(uncached, data.load_topics_distributions)),
+        ('load_sentiment_distributions',
+         partial(uncached, data.load_sentiment_distributions)),
+        ('load_words_per_topic', partial(uncached, data.load_words_per_topic)),
+        ('load_words_counts', partial(uncached, data.load_words_counts)),
+    ]
+
+    print(f"{'loader':32} {'min [ms]':>10} {'median [ms]':>12}")
+
+    for name, loader in loaders:
+        timings = timeit.repeat(loader, number=1, repeat=args.repeat)
+        print(f'{name:32} {min(timings) * 1000:10.1f} '
+              f'{statistics.median(timings) * 1000:12.1f}')
+
+
+if __name__ == '__main__':
+    main()
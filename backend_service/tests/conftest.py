@@ -0,0 +1,53 @@
+import sys
+from os.path import abspath, dirname, join
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+# the app imports its modules by bare name, as when run from its directory
+sys.path.insert(0, join(dirname(dirname(abspath(__file__))), 'app'))
+
+from queries import add_sample_keys, create_tweets_indexes  # noqa: E402
+
+USERS = ['user0', 'user1', 'user2', 'user3']
+SENTIMENTS = ['negative', 'neutral', 'positive']
+
+
+@pytest.fixture
+def tweets() -> pd.DataFrame:
+    rows = []
+
+    for i in range(120):
+        username = USERS[i % len(USERS)]
+        rows.append({
+            'id': i,
+            'link': f'https://twitter.com/{username}/status/{i}',
+            'username': username,
+            'party': f'party{i % 2}',
+            'coalition': 'coalition0',
+            'topic': i % 3,
+            'topic_proba': (i * 37 % 100) / 100,
+            'sentiment': SENTIMENTS[i % 5 % 3],
+            'tweet': f'tweet {i} about topic {i % 3}',
+        })
+
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def tweets_engine(tmp_path, tweets):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tweets.db'}")
+    columns = ', '.join(tweets.columns)
+    placeholders = ', '.join('?' * len(tweets.columns))
+
+    with engine.begin() as connection:
+        connection.execute(f"CREATE TABLE tweets ({columns})")
+        connection.execute(
+            f"INSERT INTO tweets VALUES ({placeholders})",
+            list(tweets.itertuples(index=False, name=None)))
+
+    add_sample_keys(engine)
+    create_tweets_indexes(engine)
+
+    return engine
@@ -0,0 +1,80 @@
+import pytest
+
+from clients import ClientAccount, ClientStore
+from models import User
+
+
+def make_account(username: str, word: str = 'word') -> ClientAccount:
+    user = User(
+        username=username, party=None, coalition=None, role=None, name=None,
+        tweets_count=10, x_graph2d=1, y_graph2d=2, x_graph3d=1, y_graph3d=2,
+        z_graph3d=3, cluster_mean_shift_id=0, cluster_kmeans_id=1,
+        cluster_gmm_id=2)
+
+    return ClientAccount(
+        user=user,
+        topics=[{'topic': 0, 'part': 1.0}],
+        sentiment=[('positive', 1.0)],
+        words=[{'text': word, 'value': 3}])
+
+
+@pytest.fixture
+def path(tmp_path) -> str:
+    return str(tmp_path / 'clients.sqlite')
+
+
+@pytest.fixture
+def stores(path):
+    # two workers sharing the database
+    writer, reader = ClientStore(path), ClientStore(path)
+    yield writer, reader
+    writer.close()
+    reader.close()
+
+
+def test_sync_reads_accounts_of_other_processes(stores):
+    writer, reader = stores
+    assert reader.sync() == []
+
+    writer.add(make_account('Client'))
+    added = reader.sync()
+
+    assert [account.user.username for account in added] == ['Client']
+    assert added[0].sentiment == [('positive', 1.0)]
+    assert reader.get('CLIENT') == added[0]
+    assert reader.words['client'][:] == [{'text': 'word', 'value': 3.0}]
+    assert reader.sync() == []
+
+
+def test_existing_accounts_are_not_replaced(stores):
+    writer, reader = stores
+    writer.add(make_account('client', 'first'))
+    writer.add(make_account('Client', 'second'))
+    writer.add(make_account('other'))
+
+    assert [a.user.username for a in reader.sync()] == ['client', 'other']
+    assert reader.get('client').words[0]['text'] == 'first'
+    assert len(reader) == 2
+
+
+def test_new_store_reads_all_accounts(stores, path):
+    writer, _ = stores
+    writer.add(make_account('client'))
+
+    store = ClientStore(path)
+    try:
+        assert len(store.sync()) == 1
+        assert [a.user.username for a in store] == ['client']
+    finally:
+        store.close()
+
+
+def test_sync_sees_prepared_tweets(stores, tweets):
+    writer, reader = stores
+    reader.sync()
+    assert not reader.sampled and not reader.searchable
+
+    writer.add_tweets(tweets.head(10))
+    reader.sync()
+
+    assert reader.sampled and reader.searchable
@@ -0,0 +1,85 @@
+import pytest
+
+from clusters import ClusterIndex
+from models import User
+from words import InternedVocabulary, WordCountsStore
+
+
+def make_user(username: str, tweets_count: int, cluster_id: int) -> User:
+    return User(
+        username=username, party=None, coalition=None, role=None, name=None,
+        tweets_count=tweets_count, x_graph2d=0, y_graph2d=0, x_graph3d=0,
+        y_graph3d=0, z_graph3d=0, cluster_mean_shift_id=0,
+        cluster_kmeans_id=cluster_id, cluster_gmm_id=cluster_id)
+
+
+USERS = [make_user('a', 1, 0), make_user('b', 3, 0), make_user('c', 2, 1)]
+TOPICS = {
+    'a': [{'topic': 0, 'part': 1.0}],
+    'b': [{'topic': 0, 'part': 0.5}, {'topic': 1, 'part': 0.5}],
+    'c': [{'topic': 1, 'part': 1.0}],
+}
+SENTIMENT = {
+    'a': [('positive', 1.0)],
+    'b': [('positive', 0.0), ('negative', 1.0)],
+}
+WORDS = {
+    'a': [{'text': 'x', 'value': 1}, {'text': 'y', 'value': 4}],
+    'b': [{'text': 'x', 'value': 5}],
+    'c': [{'text': 'z', 'value': 2}],
+}
+
+
+@pytest.fixture
+def index() -> ClusterIndex:
+    words = WordCountsStore.from_lists(WORDS, InternedVocabulary(), None)
+    return ClusterIndex(USERS, TOPICS, SENTIMENT, words)
+
+
+def test_members_of_every_method(index):
+    assert [c.cluster_id for c in index.get_clusters('kmeans')] == [0, 1]
+    assert index.get_cluster('kmeans', 0).usernames == ['a', 'b']
+    assert len(index.get_cluster('mean_shift', 0)) == 3
+    assert index.get_clusters('dbscan') is None
+    assert index.get_cluster('kmeans', 7) is None
+
+
+def test_distributions_are_weighted_by_tweets(index):
+    cluster = index.get_cluster('kmeans', 0)
+
+    assert cluster.topics() == [
+        {'topic': 0, 'part': pytest.approx(2.5 / 4)},
+        {'topic': 1, 'part': pytest.approx(1.5 / 4)},
+    ]
+    assert dict(cluster.sentiment()) == {
+        'positive': pytest.approx(0.25), 'negative': pytest.approx(0.75)
+    }
+    # users without a sentiment do not dilute it
+    assert index.get_cluster('kmeans', 1).sentiment() == []
+
+
+def test_words_are_summed_per_cluster(index):
+    assert index.get_words('kmeans', 0)[:] == [
+        {'text': 'x', 'value': 6.0}, {'text': 'y', 'value': 4.0}
+    ]
+    assert index.get_words('gmm', 1)[:] == [{'text': 'z', 'value': 2.0}]
+    assert index.get_words('kmeans', 7) == []
+
+
+def test_added_users_join_their_clusters(index):
+    user = make_user('d', 4, 1)
+    index.add_user(user, [{'topic': 0, 'part': 1.0}], [('neutral', 1.0)])
+    index.add_user_words(user, [
+        {'text': 'z', 'value': 1}, {'text': 'w', 'value': 5}
+    ])
+
+    cluster = index.get_cluster('kmeans', 1)
+    assert cluster.usernames == ['c', 'd']
+    assert cluster.topics() == [
+        {'topic': 1, 'part': pytest.approx(2 / 6)},
+        {'topic': 0, 'part': pytest.approx(4 / 6)},
+    ]
+    assert index.get_words('kmeans', 1)[:] == [
+        {'text': 'w', 'value': 5.0}, {'text': 'z', 'value': 3.0}
+    ]
+    assert index.get_words('kmeans', 0)[0] == {'text': 'x', 'value': 6.0}
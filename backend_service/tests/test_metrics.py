@@ -0,0 +1,84 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from metrics import Counter, Gauge, Histogram, Metric, MetricsRegistry
+
+
+def finished_pid() -> int:
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+
+    return process.pid
+
+
+def test_metric_is_abstract():
+    with pytest.raises(TypeError):
+        Metric('metric', 'Documentation.')
+
+
+def test_counters_are_summed():
+    counter = Counter('requests_total', 'Requests.', ('route',))
+
+    assert counter.merge(
+        [{('/a',): 1, ('/b',): 2}, {('/a',): 3}], [True, False]
+    ) == {('/a',): 4, ('/b',): 2}
+
+
+def test_gauges_are_the_maximum_of_live_processes():
+    gauge = Gauge('loaded', 'Loaded.')
+
+    assert gauge.merge(
+        [{(): 1}, {(): 3}, {(): 7}], [True, True, False]) == {(): 3}
+
+
+def test_histograms_are_summed_per_bucket():
+    histogram = Histogram('duration', 'Duration.', buckets=(0.1, 1))
+    histogram.observe(0.05)
+    histogram.observe(5)
+    merged = histogram.merge(
+        [histogram.snapshot(), {(): ([0, 2, 0], 1.0)}], [True, True])
+
+    assert merged == {(): ([1, 2, 1], pytest.approx(6.05))}
+    assert list(histogram.samples(merged)) == [
+        'duration_bucket{le="0.1"} 1',
+        'duration_bucket{le="1"} 3',
+        'duration_bucket{le="+Inf"} 4',
+        'duration_sum 6.05',
+        'duration_count 4',
+    ]
+
+
+def test_registry_merges_the_files_of_all_workers(tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    counter = registry.register(Counter('rows_total', 'Rows.', ('query',)))
+    gauge = registry.register(Gauge('loaded', 'Loaded.'))
+    counter.inc(2, query='select')
+    gauge.set(1)
+
+    # a worker that has exited still counts, its gauges do not
+    (tmp_path / f'{finished_pid()}.json').write_text(json.dumps({
+        'rows_total': [[['select'], 3], [['search'], 1]],
+        'loaded': [[[], 5]],
+    }))
+
+    rendered = registry.render()
+
+    assert 'rows_total{query="select"} 5' in rendered
+    assert 'rows_total{query="search"} 1' in rendered
+    assert 'loaded 1' in rendered
+
+
+def test_counts_are_dropped_after_fork():
+    registry = MetricsRegistry(None)
+    counter = registry.register(Counter('rows_total', 'Rows.'))
+    gauge = registry.register(Gauge('loaded', 'Loaded.'))
+    counter.inc()
+    gauge.set(2)
+
+    registry.reset_after_fork()
+
+    assert counter.get() == 0
+    assert gauge.get() == 2
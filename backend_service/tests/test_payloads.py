@@ -0,0 +1,14 @@
+from os.path import abspath, dirname, join
+
+REPOSITORY = dirname(dirname(dirname(abspath(__file__))))
+
+
+def read_payloads(service: str) -> bytes:
+    with open(join(REPOSITORY, service, 'app', 'payloads.py'), 'rb') as f:
+        return f.read()
+
+
+def test_services_share_the_serializer():
+    # each image is built from its own directory, so both keep a copy
+    assert read_payloads('backend_service') == \
+        read_payloads('celery_service')
@@ -0,0 +1,119 @@
+from functools import partial
+
+import pandas as pd
+import pytest
+
+from queries import build_batch_tweets_query, build_tweets_query, \
+    chunk_entities, select_batch_tweets, select_tweets
+
+
+def read(engine, query, params) -> pd.DataFrame:
+    with engine.connect() as connection:
+        return pd.read_sql(query, connection, params=params)
+
+
+def test_topic_query_ranks_by_topic_probability(tweets_engine, tweets):
+    query, params = build_tweets_query('username', 'user1', limit=3, topic=1)
+    selected = read(tweets_engine, query, params)
+
+    expected = tweets[(tweets.username == 'user1') & (tweets.topic == 1)] \
+        .nlargest(3, 'topic_proba')
+    assert selected['id'].tolist() == expected['id'].tolist()
+
+
+def test_filters_are_bound_parameters(tweets_engine):
+    query, params = build_tweets_query(
+        'username', "user1' OR '1' = '1", sentiment='positive')
+
+    assert "OR '1'" not in query
+    assert read(tweets_engine, query, params).empty
+
+
+@pytest.mark.parametrize('sample_keys', [True, False])
+def test_sample_matches_filters(tweets_engine, tweets, sample_keys):
+    query, params = build_tweets_query(
+        'party', 'party0', limit=10, sentiment='neutral', seed=3,
+        sample_keys=sample_keys)
+    selected = read(tweets_engine, query, params)
+
+    matching = tweets[(tweets.party == 'party0') &
+                      (tweets.sentiment == 'neutral')]
+    assert len(selected) == 10
+    assert selected['id'].is_unique
+    assert set(selected['id']) <= set(matching['id'])
+
+
+def test_sample_is_repeated_for_a_seed(tweets_engine):
+    with tweets_engine.connect() as connection:
+        first = select_tweets(connection, 'username', 'user2', seed=7)
+        second = select_tweets(connection, 'username', 'user2', seed=7)
+        other = select_tweets(connection, 'username', 'user2', seed=8)
+
+    assert first['id'].tolist() == second['id'].tolist()
+    assert first['id'].tolist() != other['id'].tolist()
+
+
+def test_sample_wraps_around_the_key_range(tweets_engine, tweets):
+    # all tweets of a user, whichever sample key the sample starts at
+    expected = set(tweets[tweets.username == 'user3']['id'])
+
+    with tweets_engine.connect() as connection:
+        for seed in range(5):
+            selected = select_tweets(
+                connection, 'username', 'user3', limit=100, seed=seed)
+            assert set(selected['id']) == expected
+
+
+@pytest.mark.parametrize('topic', [None, 2])
+def test_batch_query_matches_single_queries(tweets_engine, topic):
+    values_by_column = {'username': ['user0', 'user3'], 'party': ['party1']}
+    query, params = build_batch_tweets_query(
+        values_by_column, limit=4, topic=topic, seed=5)
+    selected = read(tweets_engine, query, params)
+
+    for column_name, values in values_by_column.items():
+        for value in values:
+            rows = selected[(selected.entity_column == column_name) &
+                            (selected.entity_value == value)]
+            single, single_params = build_tweets_query(
+                column_name, value, limit=4, topic=topic, seed=5)
+            expected = read(tweets_engine, single, single_params)
+
+            assert rows['id'].tolist() == expected['id'].tolist()
+
+
+def test_batch_is_read_in_chunks(tweets_engine, monkeypatch):
+    values_by_column = {'username': ['user0', 'user1', 'user2'],
+                        'topic': [0, 1]}
+
+    assert list(chunk_entities(values_by_column, 2)) == [
+        {'username': ['user0', 'user1']},
+        {'username': ['user2'], 'topic': [0]},
+        {'topic': [1]},
+    ]
+
+    with tweets_engine.connect() as connection:
+        whole = select_batch_tweets(connection, values_by_column, seed=1)
+
+        monkeypatch.setattr(
+            'queries.chunk_entities', partial(chunk_entities, size=2))
+        chunked = select_batch_tweets(connection, values_by_column, seed=1)
+
+    assert len(whole) == 25
+    assert whole.equals(chunked)
+
+
+def test_empty_batch_selects_nothing(tweets_engine):
+    with tweets_engine.connect() as connection:
+        selected = select_batch_tweets(connection, {})
+
+    assert selected.empty
+    assert {'entity_column', 'entity_value', 'id'} <= set(selected.columns)
+
+
+def test_unknown_column_or_table_is_rejected():
+    with pytest.raises(ValueError):
+        build_tweets_query('tweet', 'x')
+
+    with pytest.raises(ValueError):
+        build_tweets_query('username', 'x', table='users')
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from spatial import GridIndex, downsample
+
+
+def make_points(dimensions: int) -> np.ndarray:
+    rng = np.random.default_rng(dimensions)
+    # a dense cluster and a few far outliers, to skip many empty cells
+    return np.concatenate((
+        rng.normal(size=(300, dimensions)),
+        rng.uniform(-100, 100, size=(5, dimensions)),
+    ))
+
+
+def brute_force_box(points, lower, upper):
+    inside = np.all((points >= lower) & (points <= upper), axis=1)
+    return set(np.flatnonzero(inside).tolist())
+
+
+def brute_force_nearest(points, point, k, excluded=()):
+    distances = np.linalg.norm(points - point, axis=1)
+    order = [i for i in np.argsort(distances) if i not in excluded]
+    return order[:k]
+
+
+@pytest.mark.parametrize('dimensions', [2, 3])
+def test_box_query_matches_brute_force(dimensions):
+    points = make_points(dimensions)
+    index = GridIndex(points, range(len(points)))
+    rng = np.random.default_rng(0)
+
+    for _ in range(50):
+        corners = rng.uniform(-3, 3, size=(2, dimensions))
+        lower, upper = corners.min(axis=0), corners.max(axis=0)
+
+        assert set(index.query_box(lower, upper)) == \
+            brute_force_box(points, lower, upper)
+
+    everything = index.query_box([-np.inf] * dimensions, [np.inf] * dimensions)
+    assert sorted(everything) == list(range(len(points)))
+
+
+@pytest.mark.parametrize('dimensions', [2, 3])
+def test_nearest_matches_brute_force(dimensions):
+    points = make_points(dimensions)
+    index = GridIndex(points, range(len(points)))
+    rng = np.random.default_rng(1)
+
+    for k in (1, 5, 20):
+        for point in rng.uniform(-150, 150, size=(20, dimensions)):
+            assert index.nearest(point, k) == \
+                brute_force_nearest(points, point, k)
+
+    assert len(index.nearest(np.zeros(dimensions), 1000)) == len(points)
+
+
+def test_nearest_skips_excluded_items():
+    points = make_points(2)
+    index = GridIndex(points, range(len(points)))
+    excluded = set(brute_force_nearest(points, points[0], 3))
+
+    assert index.nearest(points[0], 4, exclude=excluded.__contains__) == \
+        brute_force_nearest(points, points[0], 4, excluded)
+
+
+def test_added_points_are_found():
+    points = make_points(2)
+    index = GridIndex(points[:10], range(10))
+
+    for position in range(10, len(points)):
+        index.add(points[position], position)
+
+    assert len(index) == len(points)
+    assert set(index.query_box([-1, -1], [1, 1])) == \
+        brute_force_box(points, [-1, -1], [1, 1])
+    assert index.nearest([50, 50], 3) == \
+        brute_force_nearest(points, [50, 50], 3)
+
+
+def test_downsample_keeps_the_highest_priority_of_every_area():
+    points = make_points(2)
+    items = list(range(len(points)))
+    lower, upper = points.min(axis=0), points.max(axis=0)
+
+    selected = downsample(items, points, lower, upper, 16, lambda i: -i)
+
+    assert 0 < len(selected) <= 16
+    assert selected == sorted(selected)
+    assert 0 in selected
+    assert downsample(items[:10], points[:10], lower, upper, 16,
+                      lambda i: i) == items[:10]
@@ -0,0 +1,42 @@
+import pytest
+
+from queries import select_tweets
+from tweets_store import ColumnarTweetStore
+
+
+@pytest.fixture
+def store(tweets_engine) -> ColumnarTweetStore:
+    return ColumnarTweetStore.from_sql(tweets_engine)
+
+
+def test_store_holds_all_tweets(store, tweets):
+    assert len(store) == len(tweets)
+
+
+@pytest.mark.parametrize('column_name, column_value', [
+    ('username', 'user0'), ('party', 'party1'), ('topic', 2)
+])
+@pytest.mark.parametrize('sentiment', [None, 'positive'])
+@pytest.mark.parametrize('topic', [None, 1])
+@pytest.mark.parametrize('seed', [0, 11])
+def test_select_matches_the_database(tweets_engine, store, column_name,
+                                     column_value, sentiment, topic, seed):
+    selected = store.select(
+        column_name, column_value, 4, sentiment, topic, seed)
+
+    with tweets_engine.connect() as connection:
+        expected = select_tweets(
+            connection, column_name, column_value, 4, sentiment, topic,
+            seed=seed)
+
+    assert selected['id'].tolist() == expected['id'].tolist()
+
+
+def test_unknown_values_select_nothing(store):
+    assert store.select('username', 'nobody').empty
+    assert store.select('username', 'user0', sentiment='angry').empty
+
+
+def test_limit_must_be_positive(store):
+    with pytest.raises(ValueError):
+        store.select('username', 'user0', limit=0)
@@ -0,0 +1,69 @@
+import pytest
+
+from words import InternedVocabulary, WordCountsStore
+
+ENTRIES = [
+    {'text': 'b', 'value': 2},
+    {'text': 'a', 'value': 5},
+    {'text': 'c', 'value': 0.02},
+    {'text': 'd', 'value': 2},
+]
+
+
+def test_row_is_sorted_by_descending_value():
+    store = WordCountsStore(top_k=None)
+    store.add('user', ENTRIES)
+
+    assert store['user'][:] == [
+        {'text': 'a', 'value': 5.0},
+        {'text': 'b', 'value': 2.0},
+        {'text': 'd', 'value': 2.0},
+        {'text': 'c', 'value': 0.02},
+    ]
+    assert store['user'][-1] == {'text': 'c', 'value': 0.02}
+    assert len(store['user']) == 4
+
+
+def test_top_k_keeps_the_most_frequent_words():
+    vocabulary = InternedVocabulary()
+    store = WordCountsStore(vocabulary, top_k=2)
+    store.add('user', ENTRIES)
+
+    # ties keep their order, and dropped words are not interned
+    assert [entry['text'] for entry in store['user']] == ['a', 'b']
+    assert len(vocabulary) == 2
+
+
+def test_entities_share_the_vocabulary():
+    store = WordCountsStore.from_lists({
+        'user0': ENTRIES,
+        'user1': [{'text': 'a', 'value': 1}, {'text': 'e', 'value': 3}],
+    }, top_k=None)
+
+    assert len(store.vocabulary) == 5
+    assert store['user1'][:] == [
+        {'text': 'e', 'value': 3.0}, {'text': 'a', 'value': 1.0}
+    ]
+    assert set(store) == {'user0', 'user1'}
+
+
+def test_adding_replaces_the_row_of_a_key():
+    store = WordCountsStore(top_k=None)
+    store.add('user', ENTRIES)
+    store.add('user', [{'text': 'e', 'value': 1}])
+
+    assert store['user'][:] == [{'text': 'e', 'value': 1.0}]
+
+
+def test_missing_entities_and_words():
+    store = WordCountsStore(top_k=None)
+    store.add('user', [])
+
+    assert store['user'][:5] == []
+    assert 'other' not in store
+
+    with pytest.raises(KeyError):
+        store['other']
+
+    with pytest.raises(IndexError):
+        store['user'][0]
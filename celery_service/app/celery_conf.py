@@ -1,3 +1,8 @@
-accept_content = ["json", "pickle"]
-task_serializer = "pickle"
-result_serializer = "pickle"
+import os
+
+from payloads import ARROW_SERIALIZER
+
+accept_content = ["json", "pickle", ARROW_SERIALIZER]
+# 'arrow' sends data frames as Arrow streams instead of pickles
+task_serializer = os.getenv('CELERY_SERIALIZER', ARROW_SERIALIZER)
+result_serializer = os.getenv('CELERY_SERIALIZER', ARROW_SERIALIZER)
@@ -23,7 +23,12 @@ def clean_tweets(self, df: pd.DataFrame) -> pd.DataFrame:
 
     df.loc[:, "tweet_length"] = df["tweet"].apply(len)
     df = df[df["tweet_length"] >= 20]
-    df.drop(columns="tweet_length")
+    # the next stages only need the text
+    df = df[["id", "tweet"]]
+
+    if len(df) == 0:
+        # nothing to analyse, the next stages of the canvas are not sent
+        self.request.chain = None
 
     LOG.info(f'Cleaning - done, left with {len(df)}')
     return df
@@ -1,3 +1,6 @@
+import os
+from typing import Iterator, List
+
 import torch
 from transformers import AutoTokenizer, AutoModel
 
@@ -6,10 +9,32 @@ import pandas as pd
 import numpy as np
 
 import celery_conf
+from embedding_cache import EmbeddingCache, normalize_text
 from logger import get_logger
 
-tokenizer = AutoTokenizer.from_pretrained("allegro/herbert-base-cased")
-model = AutoModel.from_pretrained("allegro/herbert-base-cased")
+# intra-op threads of torch, 0 keeps its default of one per core
+TORCH_THREADS = int(os.getenv('TORCH_THREADS', 0))
+# tokens in a padded batch, i.e. its size times its longest tweet
+BATCH_TOKENS = int(os.getenv('EMBEDDING_BATCH_TOKENS', 8192))
+MAX_BATCH_SIZE = int(os.getenv('EMBEDDING_MAX_BATCH_SIZE', 256))
+# embeddings of single tweets are cached in this SQLite file when it is set
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH')
+# about 5 kB on disk per cached tweet
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', 200000))
+
+MODEL_NAME = "allegro/herbert-base-cased"
+
+if TORCH_THREADS > 0:
+    torch.set_num_threads(TORCH_THREADS)
+
+tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+model = AutoModel.from_pretrained(MODEL_NAME)
+
+if EMBEDDING_CACHE_PATH:
+    cache = EmbeddingCache(
+        EMBEDDING_CACHE_PATH, MODEL_NAME, EMBEDDING_CACHE_SIZE)
+else:
+    cache = None
 
 app = Celery()
 app.config_from_object(celery_conf)
@@ -17,28 +42,85 @@ app.config_from_object(celery_conf)
 LOG = get_logger('EMBEDDING')
 
 
-def chunks(lst, n):
-    """Yield successive n-sized chunks from lst."""
-    for i in range(0, len(lst), n):
-        yield lst[i: i + n]
+def token_budget_batches(
+        lengths: List[int],
+        max_tokens: int = BATCH_TOKENS,
+        max_size: int = MAX_BATCH_SIZE
+) -> Iterator[List[int]]:
+    """Yield indices of texts with `lengths` in batches of similar length.
 
+    Texts are taken from the shortest, so a batch is padded to little more
+    than its own texts, and a batch grows while its size times its longest
+    text fits `max_tokens`. A text longer than that is a batch of its own.
+    """
+    batch: List[int] = []
+
+    for index in sorted(range(len(lengths)), key=lengths.__getitem__):
+        if batch and (len(batch) == max_size
+                      or (len(batch) + 1) * lengths[index] > max_tokens):
+            yield batch
+            batch = []
+
+        batch.append(index)
+
+    if batch:
+        yield batch
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Pooled HerBERT output for every text, in the order of `texts`."""
+    encoded = tokenizer(texts, add_special_tokens=True, truncation=True)
+    lengths = [len(input_ids) for input_ids in encoded['input_ids']]
+    embeddings = np.empty(
+        (len(texts), model.config.hidden_size), dtype=np.float32)
+    batches = 0
 
-def embed_tweets(tweets_data: pd.DataFrame) -> np.ndarray:
-    tweet_texts = tweets_data["tweet"].tolist()
-    tweet_embeddings = []
     with torch.no_grad():
-        for idx, batch in enumerate(chunks(tweet_texts, 150)):
-            LOG.info(f'{idx + 1}, {150}')
-            tokenized_text = tokenizer.batch_encode_plus(
-                batch, padding="longest", add_special_tokens=True,
+        for batch in token_budget_batches(lengths):
+            padded = tokenizer.pad(
+                {key: [values[i] for i in batch]
+                 for key, values in encoded.items()},
                 return_tensors="pt"
             )
-            outputs = model(**tokenized_text)
-            batch_embeddings = outputs[1].cpu().numpy()
-            tweet_embeddings.extend(batch_embeddings)
+            outputs = model(**padded)
+            embeddings[batch] = outputs[1].cpu().numpy()
+            batches += 1
+
+    LOG.info(f'Embedded {len(texts)} texts in {batches} batches')
+
+    return embeddings
 
-    all_embeddings = np.vstack(tweet_embeddings)
-    account_embedding = np.mean(all_embeddings, axis=0).astype(np.float)
+
+def embed_cached(texts: List[str]) -> np.ndarray:
+    """Like `embed_texts`, running the model only for uncached texts."""
+    texts = [normalize_text(text) for text in texts]
+    keys = [cache.key(text) for text in texts]
+    vectors = cache.get_many(set(keys))
+    missing = {}
+
+    for key, text in zip(keys, texts):
+        if key not in vectors:
+            missing.setdefault(key, text)
+
+    LOG.info(f'{len(missing)} texts to embed for {len(texts)} tweets')
+
+    if missing:
+        fresh = dict(zip(missing, embed_texts(list(missing.values()))))
+        cache.put_many(fresh)
+        vectors.update(fresh)
+
+    return np.vstack([vectors[key] for key in keys])
+
+
+def embed_tweets(tweets_data: pd.DataFrame) -> np.ndarray:
+    texts = tweets_data["tweet"].tolist()
+
+    if cache is None:
+        tweet_embeddings = embed_texts(texts)
+    else:
+        tweet_embeddings = embed_cached(texts)
+
+    account_embedding = np.mean(tweet_embeddings, axis=0).astype(np.float)
 
     return account_embedding
 
@@ -50,5 +132,3 @@ def calc_embedding(self, tweets: pd.DataFrame) -> np.ndarray:
     LOG.info('Embedding calculation - done')
 
     return res
-
-
@@ -0,0 +1,162 @@
+"""Embeddings of single texts kept on disk across tasks and restarts."""
+
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from logger import get_logger
+
+LOG = get_logger('EMB_CACHE')
+
+CREATE_EMBEDDINGS = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key BLOB PRIMARY KEY,
+    vector BLOB NOT NULL,
+    used_at REAL NOT NULL
+) WITHOUT ROWID
+"""
+CREATE_USED_AT_INDEX = """
+CREATE INDEX IF NOT EXISTS ix_embeddings_used_at ON embeddings (used_at)
+"""
+
+# bound parameters per statement, older SQLite builds allow 999
+QUERY_CHUNK = 500
+# a hit refreshes used_at only when it is older than this, in seconds
+TOUCH_INTERVAL = 60
+# eviction leaves the cache this full, so puts until the limit is reached
+# again do not need to count the rows
+EVICT_TO = 0.9
+
+
+def normalize_text(text: str) -> str:
+    # the tokenizer splits on any whitespace, so this keeps the tokens
+    return ' '.join(text.split())
+
+
+def chunked(items: List, size: int = QUERY_CHUNK) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class EmbeddingCache:
+    """float32 vectors keyed by the SHA-256 of the model id and the text.
+
+    Holds about `max_entries` vectors, the least recently used are evicted
+    first. The database can be shared by several workers, each of them
+    counts the rows it adds since its last eviction check, so the limit can
+    be exceeded by the puts of the other workers until they check. Errors
+    of the database or its file are logged and treated as misses, the
+    cache never fails a task.
+    """
+
+    def __init__(self, path: str, model_id: str, max_entries: int):
+        self._path = path
+        self._prefix = f'{model_id}\0'.encode()
+        self._max_entries = max_entries
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid: Optional[int] = None
+        self._count = 0
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha256(self._prefix + text.encode()).digest()
+
+    def _connect(self) -> sqlite3.Connection:
+        # a connection opened before the worker forked is not shared
+        if self._connection is None or self._connection_pid != os.getpid():
+            directory = os.path.dirname(self._path)
+
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            connection = sqlite3.connect(self._path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+
+            with connection:
+                connection.execute(CREATE_EMBEDDINGS)
+                connection.execute(CREATE_USED_AT_INDEX)
+
+            self._count = connection.execute(
+                "SELECT count(*) FROM embeddings").fetchone()[0]
+            self._connection = connection
+            self._connection_pid = os.getpid()
+
+        return self._connection
+
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, np.ndarray]:
+        keys = list(keys)
+        found: Dict[bytes, np.ndarray] = {}
+        stale: List[bytes] = []
+        now = time.time()
+
+        try:
+            connection = self._connect()
+
+            for chunk in chunked(keys):
+                placeholders = ', '.join('?' * len(chunk))
+                rows = connection.execute(
+                    f"SELECT key, vector, used_at FROM embeddings "
+                    f"WHERE key IN ({placeholders})", chunk)
+
+                for key, vector, used_at in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+
+                    if used_at < now - TOUCH_INTERVAL:
+                        stale.append(key)
+
+            if not stale:
+                return found
+
+            with connection:
+                for chunk in chunked(stale):
+                    placeholders = ', '.join('?' * len(chunk))
+                    connection.execute(
+                        f"UPDATE embeddings SET used_at = ? "
+                        f"WHERE key IN ({placeholders})", [now, *chunk])
+        except (OSError, sqlite3.Error) as e:
+            LOG.warning(f'Could not read cached embeddings: {e}')
+
+        return found
+
+    def put_many(self, vectors: Dict[bytes, np.ndarray]):
+        now = time.time()
+
+        try:
+            connection = self._connect()
+
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, used_at) "
+                    "VALUES (?, ?, ?)",
+                    ((key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                     for key, vector in vectors.items()))
+
+                # replaced keys are counted too, the check recounts
+                self._count += len(vectors)
+
+                if self._count > self._max_entries:
+                    self._evict(connection)
+        except (OSError, sqlite3.Error) as e:
+            LOG.warning(f'Could not store embeddings: {e}')
+
+    def _evict(self, connection: sqlite3.Connection):
+        count = connection.execute(
+            "SELECT count(*) FROM embeddings").fetchone()[0]
+
+        if count > self._max_entries:
+            keep = int(self._max_entries * EVICT_TO)
+            connection.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                "SELECT key FROM embeddings ORDER BY used_at LIMIT ?)",
+                (count - keep,))
+            count = keep
+
+        self._count = count
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
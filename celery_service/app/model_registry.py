@@ -0,0 +1,122 @@
+"""Models used by the tasks, loaded once per worker and kept warm."""
+
+import os
+import pickle as pkl
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Tuple
+
+from logger import get_logger
+
+LOG = get_logger('MODELS')
+
+FileVersion = Tuple[int, int]
+
+
+class LoadedModel(NamedTuple):
+    model: Any
+    version: FileVersion
+    loaded_at: float
+    load_time: float
+
+
+def load_pickle(path: str) -> Any:
+    with open(path, 'rb') as f:
+        return pkl.load(f)
+
+
+def file_version(path: str) -> FileVersion:
+    stat = os.stat(path)
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ModelRegistry:
+    """Models loaded from files, reloaded only when their file changes.
+
+    `load_all` is meant to run when the worker starts, before it takes any
+    task, so a running worker is ready. `get` then costs a `stat` of the
+    file. A model whose new file cannot be loaded, e.g. while it is still
+    being copied, keeps being served from the previous version.
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, Tuple[str, Callable[[str], Any]]] = {}
+        self._models: Dict[str, LoadedModel] = {}
+        self._failed: Dict[str, FileVersion] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, path: str,
+                 loader: Callable[[str], Any] = load_pickle):
+        self._sources[name] = (path, loader)
+
+    @property
+    def ready(self) -> bool:
+        return all(name in self._models for name in self._sources)
+
+    def load_all(self):
+        for name in self._sources:
+            self.get(name)
+
+        LOG.info(f'Models ready: {", ".join(self._models)}')
+
+    def _load(self, name: str, version: FileVersion) -> LoadedModel:
+        path, loader = self._sources[name]
+        start = time.perf_counter()
+        model = loader(path)
+        load_time = time.perf_counter() - start
+        LOG.info(f'Loaded {name} from {path} in {load_time:.2f}s')
+
+        return LoadedModel(model, version, time.time(), load_time)
+
+    def get(self, name: str) -> Any:
+        path, _ = self._sources[name]
+        loaded = self._models.get(name)
+
+        try:
+            version = file_version(path)
+        except OSError:
+            # replaced right now, or removed, the loaded one is still fine
+            if loaded is None:
+                raise
+            return loaded.model
+
+        if loaded is not None and loaded.version == version:
+            return loaded.model
+
+        with self._lock:
+            loaded = self._models.get(name)
+
+            if loaded is not None and (
+                    loaded.version == version
+                    or self._failed.get(name) == version):
+                return loaded.model
+
+            try:
+                self._models[name] = self._load(name, version)
+            except Exception as e:
+                if loaded is None:
+                    raise
+
+                self._failed[name] = version
+                LOG.error(f'Could not reload {name} from {path}, '
+                          f'keeping the previous version: {e}')
+                return loaded.model
+
+            self._failed.pop(name, None)
+
+            return self._models[name].model
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        status = {}
+
+        for name, (path, _) in self._sources.items():
+            loaded = self._models.get(name)
+            status[name] = {
+                'path': path,
+                'loaded': loaded is not None,
+                'loaded_at': loaded.loaded_at if loaded else None,
+                'load_time': loaded.load_time if loaded else None
+            }
+
+        return status
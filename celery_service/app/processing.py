@@ -1,7 +1,7 @@
 from typing import Dict, List, Tuple
-import pickle as pkl
 
 from celery import Celery
+from celery.signals import worker_init
 import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import CountVectorizer
@@ -11,27 +11,48 @@ import fasttext
 
 import celery_conf
 from logger import get_logger
+from model_registry import ModelRegistry
 
 app = Celery()
 app.config_from_object(celery_conf)
 
 LOG = get_logger('PROCESSING')
 
-sentiment_model = fasttext.load_model('models/sentiment.bin')
+models = ModelRegistry()
+models.register('clusters', 'models/cluster_models.pkl.gz')
+models.register('umap_2d', 'models/umap_2d.pkl.gz')
+models.register('umap_3d', 'models/umap_3d.pkl.gz')
+models.register('vectorizer', 'models/vectorizer.pkl.gz')
+models.register('lda', 'models/lda.pkl.gz')
+models.register('sentiment', 'models/sentiment.bin', fasttext.load_model)
+
+
+@worker_init.connect
+def load_models(**kwargs):
+    # in the main process, so the pool processes forked from it share them
+    models.load_all()
+
+
+@app.task(bind=True, name='processing_models', queue='processing')
+def models_status(self) -> Dict[str, Dict]:
+    """Readiness of the worker, the loaded models and when they were."""
+    return {
+        'ready': models.ready,
+        'models': models.status()
+    }
 
 
 @app.task(bind=True, name='clustering')
 def calc_clustering(self, embedding: np.ndarray) -> Dict[str, int]:
     LOG.info('Clusters calculations - started')
 
-    with open('models/cluster_models.pkl.gz', 'rb') as f:
-        models = pkl.load(f)
+    cluster_models = models.get('clusters')
 
     reshaped = embedding.reshape(1, -1)
 
-    kmeans_cluster = models['k_means'].predict(reshaped)
-    gmm_cluster = models['gmm'].predict(reshaped)
-    mean_shift_cluster = models['mean_shift'].predict(reshaped)
+    kmeans_cluster = cluster_models['k_means'].predict(reshaped)
+    gmm_cluster = cluster_models['gmm'].predict(reshaped)
+    mean_shift_cluster = cluster_models['mean_shift'].predict(reshaped)
 
     LOG.info('Clusters calculations - done')
 
@@ -46,10 +67,8 @@ def calc_clustering(self, embedding: np.ndarray) -> Dict[str, int]:
 def calc_graph_pos(self, embedding: np.ndarray) -> Dict[str, float]:
     LOG.info('Graph calculations - started')
 
-    with open('models/umap_2d.pkl.gz', 'rb') as f:
-        umap_2d: UMAP = pkl.load(f)
-    with open('models/umap_3d.pkl.gz', 'rb') as f:
-        umap_3d: UMAP = pkl.load(f)
+    umap_2d: UMAP = models.get('umap_2d')
+    umap_3d: UMAP = models.get('umap_3d')
 
     reshaped = embedding.reshape(1, -1)
 
@@ -70,10 +89,8 @@ def calc_graph_pos(self, embedding: np.ndarray) -> Dict[str, float]:
 def calc_topics(self, lemmatized_tweets: pd.DataFrame) -> Tuple[pd.DataFrame, List[Dict]]:
     LOG.info('Topics calculations - started')
 
-    with open('models/vectorizer.pkl.gz', 'rb') as f:
-        vectorizer: CountVectorizer = pkl.load(f)
-    with open('models/lda.pkl.gz', 'rb') as f:
-        lda: LatentDirichletAllocation = pkl.load(f)
+    vectorizer: CountVectorizer = models.get('vectorizer')
+    lda: LatentDirichletAllocation = models.get('lda')
 
     tweets_text = lemmatized_tweets['tweet'].tolist()
     counts = vectorizer.transform(tweets_text)
@@ -110,7 +127,7 @@ def calc_sentiment(self, emojied_tweets: pd.DataFrame) -> Tuple[pd.DataFrame, Li
     emojied_tweets.loc[:, 'tweet'] = emojied_tweets['tweet'].apply(str.lower)
     tweets_text = emojied_tweets['tweet'].tolist()
 
-    predictions = sentiment_model.predict(tweets_text)[0]
+    predictions = models.get('sentiment').predict(tweets_text)[0]
     predictions = [label for sublist in predictions for label in sublist]
 
     emojied_tweets['sentiment'] = predictions
@@ -141,8 +158,7 @@ def calc_sentiment(self, emojied_tweets: pd.DataFrame) -> Tuple[pd.DataFrame, Li
 def count_words(self, lemmatized_tweets: pd.DataFrame) -> List[Dict[str, float]]:
     LOG.info('Words count - started')
 
-    with open('models/vectorizer.pkl.gz', 'rb') as f:
-        vectorizer: CountVectorizer = pkl.load(f)
+    vectorizer: CountVectorizer = models.get('vectorizer')
 
     tweets_text = lemmatized_tweets['tweet'].tolist()
     counts = vectorizer.transform(tweets_text)
@@ -0,0 +1,171 @@
+"""CPU throughput of the HerBERT embedding, fixed chunks against buckets.
+
+"before" feeds the tweets in arrival order in chunks of 150, padded to the
+longest tweet of the chunk, as `embed_tweets` used to. "after" is the
+current `embed_texts`, with batches of similar length sized by a token
+budget. Both run on the same tweets for every number of torch threads:
+
+    python benchmarks/embedding.py --tweets 1000 --threads 1 --threads 4
+    python benchmarks/embedding.py --input tweets.csv
+
+The model is downloaded on first use. Without `--input` the tweets are
+random words with a long-tailed length, like those of an account.
+"""
+
+import argparse
+import json
+import random
+import string
+import sys
+import time
+from os.path import abspath, dirname, join
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+APP_DIRECTORY = join(dirname(dirname(abspath(__file__))), 'app')
+
+CHUNK_SIZE = 150
+
+
+def synthetic_tweets(count: int) -> List[str]:
+    letters = string.ascii_lowercase + 'ąćęłńóśźż'
+    words = [
+        ''.join(random.choices(letters, k=random.randint(2, 12)))
+        for _ in range(5000)
+    ]
+
+    return [
+        ' '.join(random.choices(
+            words, k=min(60, max(3, int(random.lognormvariate(2.5, 0.6))))))
+        for _ in range(count)
+    ]
+
+
+def read_tweets(path: str, count: int) -> List[str]:
+    import pandas as pd
+
+    return pd.read_csv(path)['tweet'].astype(str).head(count).tolist()
+
+
+def embed_in_chunks(embedding, texts: List[str]) -> np.ndarray:
+    """The previous batching, fixed size chunks in arrival order."""
+    embeddings = []
+
+    with embedding.torch.no_grad():
+        for start in range(0, len(texts), CHUNK_SIZE):
+            tokenized = embedding.tokenizer.batch_encode_plus(
+                texts[start:start + CHUNK_SIZE], padding="longest",
+                add_special_tokens=True, truncation=True, return_tensors="pt"
+            )
+            outputs = embedding.model(**tokenized)
+            embeddings.append(outputs[1].cpu().numpy())
+
+    return np.vstack(embeddings)
+
+
+def padded_tokens(embedding, texts: List[str]) -> Tuple[int, int, int]:
+    """Tokens of `texts`, and once padded in chunks and in buckets."""
+    encoded = embedding.tokenizer(
+        texts, add_special_tokens=True, truncation=True)
+    lengths = [len(input_ids) for input_ids in encoded['input_ids']]
+    chunks = sum(
+        len(chunk) * max(chunk)
+        for chunk in (lengths[start:start + CHUNK_SIZE]
+                      for start in range(0, len(lengths), CHUNK_SIZE))
+    )
+    buckets = sum(
+        len(batch) * max(lengths[i] for i in batch)
+        for batch in embedding.token_budget_batches(lengths)
+    )
+
+    return sum(lengths), chunks, buckets
+
+
+def timed(run: Callable[[], np.ndarray], repeat: int
+          ) -> Tuple[float, np.ndarray]:
+    best = float('inf')
+    result = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - start)
+
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tweets', type=int, default=1000)
+    parser.add_argument('--input', default=None,
+                        help='CSV file with a tweet column')
+    parser.add_argument('--threads', type=int, action='append', default=None,
+                        help='torch threads, can be repeated')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per variant, the fastest is reported')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None,
+                        help='also write the results to this file')
+    args = parser.parse_args()
+
+    sys.path.insert(0, APP_DIRECTORY)
+    random.seed(args.seed)
+
+    import embedding
+
+    if args.input is not None:
+        texts = read_tweets(args.input, args.tweets)
+    else:
+        texts = synthetic_tweets(args.tweets)
+
+    real_tokens, chunk_tokens, bucket_tokens = padded_tokens(embedding, texts)
+    # the first batches of a process are slower
+    embedding.embed_texts(texts[:32])
+
+    print(f'{len(texts)} tweets, {real_tokens} tokens, padded to '
+          f'{chunk_tokens} before and {bucket_tokens} after, batch budget '
+          f'{embedding.BATCH_TOKENS} tokens')
+    print(f"\n{'threads':>7} {'before tweets/s':>16} {'after tweets/s':>15} "
+          f"{'speedup':>8} {'max diff':>9}")
+
+    results: Dict = {
+        'tweets': len(texts),
+        'tokens': real_tokens,
+        'padded_tokens_before': chunk_tokens,
+        'padded_tokens_after': bucket_tokens,
+        'batch_tokens': embedding.BATCH_TOKENS,
+        'runs': []
+    }
+
+    for threads in args.threads or [embedding.torch.get_num_threads()]:
+        embedding.torch.set_num_threads(threads)
+
+        before, before_embeddings = timed(
+            lambda: embed_in_chunks(embedding, texts), args.repeat)
+        after, after_embeddings = timed(
+            lambda: embedding.embed_texts(texts), args.repeat)
+        difference = float(np.abs(
+            before_embeddings.mean(axis=0) - after_embeddings.mean(axis=0)
+        ).max())
+
+        run = {
+            'threads': threads,
+            'before_tweets_per_s': len(texts) / before,
+            'after_tweets_per_s': len(texts) / after,
+            'speedup': before / after,
+            'account_embedding_max_diff': difference
+        }
+        results['runs'].append(run)
+
+        print(f"{threads:7d} {run['before_tweets_per_s']:16.1f} "
+              f"{run['after_tweets_per_s']:15.1f} {run['speedup']:7.2f}x "
+              f"{difference:9.2e}")
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+import sys
+from os.path import abspath, dirname, join
+
+# the workers import their modules by bare name, as when run from app
+sys.path.insert(0, join(dirname(dirname(abspath(__file__))), 'app'))
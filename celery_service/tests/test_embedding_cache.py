@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+import embedding_cache
+from embedding_cache import EmbeddingCache, normalize_text
+
+
+@pytest.fixture
+def path(tmp_path) -> str:
+    return str(tmp_path / 'embeddings' / 'cache.sqlite')
+
+
+def vectors(cache: EmbeddingCache, texts) -> dict:
+    return {
+        cache.key(text): np.full(4, i, dtype=np.float32)
+        for i, text in enumerate(texts)
+    }
+
+
+def count_rows(cache: EmbeddingCache) -> int:
+    return cache._connect().execute(
+        "SELECT count(*) FROM embeddings").fetchone()[0]
+
+
+def test_vectors_are_read_back(path):
+    cache = EmbeddingCache(path, 'model', 100)
+    stored = vectors(cache, ['a', 'b'])
+    cache.put_many(stored)
+
+    found = cache.get_many([cache.key('a'), cache.key('b'), cache.key('c')])
+
+    assert set(found) == {cache.key('a'), cache.key('b')}
+    np.testing.assert_array_equal(found[cache.key('b')], stored[cache.key('b')])
+
+
+def test_keys_depend_on_the_model(path):
+    first = EmbeddingCache(path, 'model', 100)
+    second = EmbeddingCache(path, 'other', 100)
+    first.put_many(vectors(first, ['a']))
+
+    assert second.get_many([second.key('a')]) == {}
+    assert normalize_text(' a \n b\t') == 'a b'
+
+
+def test_least_recently_used_are_evicted(path, monkeypatch):
+    times = iter(range(1000, 100000, 100))
+    monkeypatch.setattr(embedding_cache.time, 'time', lambda: next(times))
+    cache = EmbeddingCache(path, 'model', 10)
+    texts = [f'text{i}' for i in range(10)]
+
+    for text in texts:
+        cache.put_many(vectors(cache, [text]))
+
+    # a hit keeps the oldest vector
+    assert len(cache.get_many([cache.key('text0')])) == 1
+    cache.put_many(vectors(cache, ['newest']))
+
+    # eviction leaves room for the next puts
+    assert count_rows(cache) == 9
+    kept = cache.get_many(cache.key(text) for text in texts)
+    assert set(kept) == {cache.key(text) for text in texts[:1] + texts[3:]}
+
+
+def test_row_count_is_kept_between_puts(path):
+    cache = EmbeddingCache(path, 'model', 10)
+    cache.put_many(vectors(cache, ['a', 'b']))
+    # a replaced key is counted until the limit makes the cache recount
+    cache.put_many(vectors(cache, ['a']))
+
+    assert cache._count == 3
+
+    other = EmbeddingCache(path, 'model', 10)
+    other._connect()
+    assert other._count == 2
+
+
+def test_recent_hits_are_not_written(path):
+    cache = EmbeddingCache(path, 'model', 10)
+    cache.put_many(vectors(cache, ['a']))
+    connection = cache._connect()
+    used_at = connection.execute("SELECT used_at FROM embeddings").fetchone()
+
+    cache.get_many([cache.key('a')])
+
+    assert connection.execute(
+        "SELECT used_at FROM embeddings").fetchone() == used_at
+
+
+def test_errors_are_misses(tmp_path):
+    # the cache file can not be created inside a regular file
+    (tmp_path / 'file').write_text('')
+    cache = EmbeddingCache(str(tmp_path / 'file' / 'cache.sqlite'), 'm', 10)
+
+    cache.put_many({cache.key('a'): np.zeros(4)})
+    assert cache.get_many([cache.key('a')]) == {}